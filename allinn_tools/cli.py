@@ -1,52 +1,348 @@
 """CLI entry point for AllInn Tools using Fire."""
 
+import os
+
 import fire
-from typing import Dict, Type
 
-from .commands.shinkansen import ShinkansenCommand
-from .core.base_command import BaseCommand
+from .commands import COMMANDS, load_command
 
 
 class AllInnCLI:
-    """Main CLI class for AllInn Tools."""
+    """Main CLI class for AllInn Tools.
+    
+    Command modules are imported only when their command runs, so listing
+    commands and --help stay fast.
     
-    def __init__(self):
-        self._commands: Dict[str, Type[BaseCommand]] = {
-            'shinkansen': ShinkansenCommand,
+    The constructor flags apply to every command, e.g.
+    ``allinn shinkansen --profile --log_level DEBUG``.
+    """
+    
+    def __init__(self,
+                 log_level: str = None,
+                 profile: bool = False,
+                 metrics_output: str = None,
+                 profile_output: str = None):
+        """
+        Args:
+            log_level: ログレベル（DEBUG / INFO / WARNING / ERROR。環境変数 ALLINN_LOG_LEVEL からも指定可能）
+            profile: 終了時に段階別の所要時間・転送量・キャッシュヒット率などのサマリーを表示
+            metrics_output: 段階ごとの計測値を JSON Lines で書き出すファイル
+            profile_output: プロファイラの出力先（.prof: cProfile、.html: pyinstrument）
+        """
+        self._log_level = log_level
+        self._instrumentation = {
+            'profile': profile,
+            'metrics_output': metrics_output,
+            'profile_output': profile_output,
         }
     
+    def _create(self, name: str):
+        """コマンドを読み込み、ログレベルを適用してインスタンス化"""
+        if self._log_level:
+            # ワーカープロセスにも引き継ぐため環境変数にも設定
+            os.environ['ALLINN_LOG_LEVEL'] = self._log_level
+        cmd = load_command(name)()
+        if self._log_level:
+            cmd.set_log_level(self._log_level)
+        return cmd
+    
     def list_commands(self) -> None:
         """List all available commands."""
         print("Available commands:")
-        for name, command_class in self._commands.items():
-            cmd = command_class()
-            print(f"  {name}: {cmd.description}")
+        for name, spec in COMMANDS.items():
+            print(f"  {name}: {spec.description}")
     
     def shinkansen(self, 
                    output: str = 'shinkansen_population_density.csv',
                    route_filter: str = None,
                    sleep: float = 0.5,
-                   api_key: str = None) -> str:
+                   api_key: str = None,
+                   cache_dir: str = None,
+                   cache_ttl_days: float = 7.0,
+                   refresh: bool = False,
+                   offline: bool = False,
+                   concurrency: int = 4,
+                   fetch_mode: str = 'auto',
+                   years: str = None,
+                   layout: str = 'long',
+                   indicators: str = None,
+                   timeout: float = 30.0,
+                   retries: int = 4,
+                   deadline: float = None,
+                   check_updates: bool = False,
+                   fuzzy: bool = False,
+                   catchment_km: str = None,
+                   mesh_data: str = None,
+                   mesh_value_column: str = 'population',
+                   stations: str = None,
+                   stations_format: str = None,
+                   chunk_size: int = None,
+                   workers: int = None,
+                   summary: bool = False,
+                   top_n: int = 10) -> str:
         """
         新幹線停車駅の人口・面積・人口密度CSVを生成（e-Stat API使用）
         
         Args:
-            output: 出力CSVファイルパス
+            output: 出力ファイルパス（カンマ区切りで複数指定可。拡張子 .csv / .csv.gz / .parquet / .feather / .jsonl から形式を判定）
             route_filter: 対象路線をカンマ区切りで指定（例: '東海道,山陽'）
             sleep: リクエスト間隔（秒）
             api_key: e-Stat API キー（環境変数 ESTAT_API_KEY からも取得可能）
+            cache_dir: 永続キャッシュのディレクトリ（環境変数 ALLINN_CACHE_DIR からも取得可能）
+            cache_ttl_days: キャッシュの有効期限（日）
+            refresh: キャッシュを無視して e-Stat API から再取得
+            offline: ネットワークアクセスせずキャッシュのみを使用
+            concurrency: e-Stat API への最大同時リクエスト数
+            fetch_mode: 取得方式（'auto': 自動選択、'targeted': cdArea 指定、'full': 全件取得）
+            years: 時系列モードの取得年（例: '2000,2005,2010' / '2000-2020:5'）。省略時は最新年のみ
+            layout: 時系列モードの出力形式（'long': 駅 × 年の行、'wide': 年別の列）
+            indicators: 追加で取得する SSDS 指標コード（例: 'A1301,A6108'。総人口・総面積は常に取得）
+            timeout: 1リクエストのタイムアウト（秒）
+            retries: 一時的な失敗（接続エラー・5xx・e-Stat のサーバーエラー）の再試行回数
+            deadline: e-Stat からの取得全体の制限時間（秒）。省略時は無制限
+            check_updates: 統計表の更新日（UPDATED_DATE）を確認し、更新された統計表のみ再取得（変化した自治体をログ出力）
+            fuzzy: 自治体名を前方一致・あいまい一致（1〜2文字の表記ゆれ）でも解決（置き換えごとに警告を出力）
+            catchment_km: 駅勢圏モード。駅から半径 N km 圏内のメッシュ人口を集計（例: '5' / '3,5,10'）
+            mesh_data: 地域メッシュ人口の CSV（カンマ区切りで複数指定可。e-Stat 統計GIS のダウンロードファイルも可）
+            mesh_value_column: メッシュ人口の列名（統計GIS のファイルは人口総数の項目コードを指定）
+            stations: 駅・地点データのファイル（.json / .jsonl / .csv / .csv.gz / .parquet、'-' で標準入力）。省略時は同梱の新幹線駅データ
+            stations_format: stations の形式（json / jsonl / csv / parquet）。省略時は拡張子から判定（標準入力は jsonl）
+            chunk_size: ストリーミングモード。stations をこの行数ずつ処理して逐次書き出す（出力は入力順）
+            workers: 2 以上で分割処理モード。stations を都道府県ごとに分割してこのプロセス数で並列に処理（出力は都道府県コード順）
+            summary: 路線・都道府県・全国の集計と人口密度上位の駅を表示（集計はキャッシュに保存し、変化した分だけ再計算）
+            top_n: summary で表示する人口密度上位の駅数
         
         Returns:
             出力ファイルパス
         """
-        cmd = ShinkansenCommand()
+        cmd = self._create('shinkansen')
         
         # route_filter をリストに変換
         route_list = None
         if route_filter:
             route_list = [r.strip() for r in route_filter.split(',')]
         
-        return cmd.run(output=output, route_filter=route_list, sleep=sleep, api_key=api_key)
+        return cmd.execute(
+            **self._instrumentation,
+            output=output,
+            route_filter=route_list,
+            sleep=sleep,
+            api_key=api_key,
+            cache_dir=cache_dir,
+            cache_ttl_days=cache_ttl_days,
+            refresh=refresh,
+            offline=offline,
+            concurrency=concurrency,
+            fetch_mode=fetch_mode,
+            years=years,
+            layout=layout,
+            indicators=indicators,
+            timeout=timeout,
+            retries=retries,
+            deadline=deadline,
+            check_updates=check_updates,
+            fuzzy=fuzzy,
+            catchment_km=catchment_km,
+            mesh_data=mesh_data,
+            mesh_value_column=mesh_value_column,
+            stations=stations,
+            stations_format=stations_format,
+            chunk_size=chunk_size,
+            workers=workers,
+            summary=summary,
+            top_n=top_n
+        )
+    
+    def build_index(self,
+                    output: str = None,
+                    stats_data_id: str = '0000020201',
+                    api_key: str = None,
+                    cache_dir: str = None) -> str:
+        """
+        e-Stat メタ情報（getMetaInfo の地域分類）から自治体コードインデックスを再生成
+        
+        Args:
+            output: 出力先パス（デフォルト: キャッシュディレクトリの municipality_index.json）
+            stats_data_id: 地域分類を取得する統計表ID
+            api_key: e-Stat API キー（環境変数 ESTAT_API_KEY からも取得可能）
+            cache_dir: 出力先のキャッシュディレクトリ（shinkansen / serve の --cache_dir と同じ値を指定）
+        
+        Returns:
+            出力ファイルパス
+        """
+        cmd = self._create('build-index')
+        return cmd.execute(**self._instrumentation, output=output, stats_data_id=stats_data_id, api_key=api_key,
+                           cache_dir=cache_dir)
+    
+    def batch(self,
+              manifest: str,
+              workers: int = None,
+              api_key: str = None,
+              refresh: bool = False,
+              offline: bool = False) -> str:
+        """
+        マニフェスト（YAML / JSON）に記述した複数の shinkansen ジョブを一括実行
+        
+        全ジョブで必要な統計表を1回ずつ取得して共有し、結合・出力を複数プロセスで実行する。
+        
+        Args:
+            manifest: マニフェストファイルのパス
+            workers: 結合・出力を行うプロセス数（デフォルト: CPU 数）
+            api_key: e-Stat API キー（環境変数 ESTAT_API_KEY からも取得可能）
+            refresh: キャッシュを無視して e-Stat API から再取得
+            offline: ネットワークアクセスせずキャッシュのみを使用
+        
+        Returns:
+            出力ファイルパス（カンマ区切り）
+        """
+        cmd = self._create('batch')
+        outputs = cmd.execute(
+            **self._instrumentation,
+            manifest=manifest,
+            workers=workers,
+            api_key=api_key,
+            refresh=refresh,
+            offline=offline
+        )
+        return ','.join(outputs)
+
+    
+    def bench(self,
+              scenarios: str = None,
+              extra_areas: int = 0,
+              years: str = None,
+              indicators: str = None,
+              station_scale: int = 100,
+              latency: float = 0.0,
+              repeat: int = 3,
+              baseline: str = None,
+              save_baseline: bool = False,
+              tolerance: float = 0.2) -> dict:
+        """
+        ローカルの e-Stat 代替サーバーで取得・結合・エンドツーエンドの性能とピーク RSS を計測
+        
+        Args:
+            scenarios: 実行するシナリオをカンマ区切りで指定（fetch / join / end_to_end / startup。デフォルト: 全て）
+            extra_areas: 代替サーバーに追加する合成自治体数（セル数 = 地域数 × 指標数 × 年数）
+            years: 取得年（例: '2000-2020:5'）。省略時は最新年のみ
+            indicators: 追加で取得する SSDS 指標コード
+            station_scale: join シナリオで駅リストを複製する倍数
+            latency: 代替サーバーの応答遅延（秒）
+            repeat: 各シナリオの試行回数
+            baseline: ベースラインファイル（デフォルト: キャッシュディレクトリの bench_baseline.json）
+            save_baseline: 計測結果をベースラインとして保存
+            tolerance: 回帰とみなす悪化率（0.2 = 20%）。超えた場合はエラー終了
+        
+        Returns:
+            計測結果
+        """
+        cmd = self._create('bench')
+        
+        # scenarios をリストに変換
+        scenario_list = None
+        if scenarios:
+            if isinstance(scenarios, str):
+                scenarios = scenarios.split(',')
+            scenario_list = [s.strip() for s in scenarios]
+        
+        return cmd.execute(
+            **self._instrumentation,
+            scenarios=scenario_list,
+            extra_areas=extra_areas,
+            years=years,
+            indicators=indicators,
+            station_scale=station_scale,
+            latency=latency,
+            repeat=repeat,
+            baseline=baseline,
+            save_baseline=save_baseline,
+            tolerance=tolerance
+        )
+
+    
+    def serve(self,
+              host: str = '127.0.0.1',
+              port: int = 8765,
+              refresh_interval: float = 3600.0,
+              sleep: float = 0.5,
+              api_key: str = None,
+              cache_dir: str = None,
+              cache_ttl_days: float = 7.0,
+              offline: bool = False,
+              concurrency: int = 4,
+              fetch_mode: str = 'full',
+              years: str = None,
+              indicators: str = None,
+              timeout: float = 30.0,
+              retries: int = 4,
+              check_updates: bool = False,
+              fuzzy: bool = False) -> None:
+        """
+        統計データをメモリに常駐させ、駅・自治体の人口密度照会と CSV 出力を返すローカル HTTP/JSON サーバーを起動
+        
+        エンドポイント: GET /health, /stations, /stations.csv, /municipality、POST /refresh
+        
+        Args:
+            host: 待ち受けるアドレス
+            port: 待ち受けるポート
+            refresh_interval: バックグラウンド再取得の間隔（秒）。0 以下で無効
+            sleep: リクエスト間隔（秒）
+            api_key: e-Stat API キー（環境変数 ESTAT_API_KEY からも取得可能）
+            cache_dir: 永続キャッシュのディレクトリ（環境変数 ALLINN_CACHE_DIR からも取得可能）
+            cache_ttl_days: キャッシュの有効期限（日）
+            offline: ネットワークアクセスせずキャッシュのみを使用
+            concurrency: e-Stat API への最大同時リクエスト数
+            fetch_mode: 取得方式（デフォルト: 'full'。任意の自治体を照会できるよう全件取得）
+            years: 取得年（例: '2015,2020'）。省略時は最新年のみ
+            indicators: 追加で取得する SSDS 指標コード
+            timeout: 1リクエストのタイムアウト（秒）
+            retries: 一時的な失敗の再試行回数
+            check_updates: 再取得時に統計表の更新日を確認し、更新された統計表のみ再取得
+            fuzzy: /municipality で自治体名を前方一致・あいまい一致でも解決（応答の method に解決方法を返す）
+        """
+        cmd = self._create('serve')
+        cmd.execute(
+            **self._instrumentation,
+            host=host,
+            port=port,
+            refresh_interval=refresh_interval,
+            sleep=sleep,
+            api_key=api_key,
+            cache_dir=cache_dir,
+            cache_ttl_days=cache_ttl_days,
+            offline=offline,
+            concurrency=concurrency,
+            fetch_mode=fetch_mode,
+            years=years,
+            indicators=indicators,
+            timeout=timeout,
+            retries=retries,
+            check_updates=check_updates,
+            fuzzy=fuzzy
+        )
+
+    def resolve(self,
+                input: str,
+                output: str = 'resolved_municipalities.csv',
+                index_path: str = None,
+                cache_dir: str = None,
+                fuzzy: bool = False) -> str:
+        """
+        自治体名を一括で自治体コードに名寄せ（NFKC 正規化・旧市町村名・前方一致・表記ゆれ）
+
+        Args:
+            input: municipality 列（任意で prefecture 列）を持つファイル（.csv / .csv.gz / .jsonl / .parquet、'-' で標準入力の CSV）
+            output: 出力ファイルパス（area_code / resolved_name / method / candidates 列を追加）
+            index_path: 自治体コードインデックス（省略時は cache_dir にある build-index の生成物または同梱のもの）
+            cache_dir: build-index の出力先と同じキャッシュディレクトリ（環境変数 ALLINN_CACHE_DIR からも取得可能）
+            fuzzy: 前方一致・表記ゆれ（1〜2文字違い）によるあいまい一致も行う（置き換えは method 列に prefix / fuzzy と出力）
+
+        Returns:
+            出力ファイルパス
+        """
+        cmd = self._create('resolve')
+        return cmd.execute(**self._instrumentation, input=input, output=output, index_path=index_path,
+                           cache_dir=cache_dir, fuzzy=fuzzy)
 
 
 def main():
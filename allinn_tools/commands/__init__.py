@@ -1 +1,51 @@
-"""Command modules for AllInn Tools."""
\ No newline at end of file
+"""Command modules for AllInn Tools.
+
+Commands are registered with static metadata so the CLI can list them
+without importing their modules (which pull in pandas, requests, ...).
+A command module is imported only when the command is run.
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Dict, NamedTuple, Type
+
+if TYPE_CHECKING:
+    from ..core.base_command import BaseCommand
+
+
+class CommandSpec(NamedTuple):
+    """Where a command class lives and its help text."""
+    module: str
+    class_name: str
+    description: str
+
+
+COMMANDS: Dict[str, CommandSpec] = {
+    'shinkansen': CommandSpec(
+        'shinkansen', 'ShinkansenCommand', "新幹線停車駅の人口・面積・人口密度CSVを生成（e-Stat API使用）"
+    ),
+    'build-index': CommandSpec(
+        'build_index', 'BuildIndexCommand', "e-Stat メタ情報から自治体コードインデックスを再生成"
+    ),
+    'batch': CommandSpec(
+        'batch', 'BatchCommand', "マニフェストに記述した複数の shinkansen ジョブを取得共有で一括実行"
+    ),
+    'bench': CommandSpec(
+        'bench', 'BenchCommand', "ローカルの e-Stat 代替サーバーで性能を計測しベースラインと比較"
+    ),
+    'serve': CommandSpec(
+        'serve', 'ServeCommand', "統計データを常駐させて駅・自治体の人口密度を返すローカル HTTP/JSON サーバーを起動"
+    ),
+    'resolve': CommandSpec(
+        'resolve', 'ResolveCommand', "自治体名を一括で自治体コードに名寄せ（旧市町村名・表記ゆれ・あいまい一致に対応）"
+    ),
+}
+
+
+def load_command(name: str) -> Type['BaseCommand']:
+    """Import and return the command class registered under name."""
+    try:
+        spec = COMMANDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown command {name!r}; choose from {sorted(COMMANDS)}") from None
+    module = importlib.import_module(f"{__name__}.{spec.module}")
+    return getattr(module, spec.class_name)
@@ -0,0 +1,252 @@
+"""
+マニフェストに記述した複数の shinkansen ジョブを一括実行
+
+Usage via CLI:
+    allinn batch manifest.yaml --workers 4
+
+Manifest (YAML or JSON):
+    settings:                 # e-Stat 取得設定（全ジョブ共通）
+      fetch_mode: auto
+      cache_ttl_days: 1
+    jobs:
+      - name: tokaido
+        output: outputs/tokaido.csv,outputs/tokaido.parquet
+        route_filter: 東海道,山陽
+      - name: trends
+        output: outputs/trends.csv
+        years: 2000-2020:5
+        layout: wide
+        indicators: A1303,A6108
+"""
+
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import yaml
+
+from ..core.base_command import BaseCommand
+from ..core.cache import DEFAULT_TTL_DAYS, StatsCache
+from ..core.env import resolve_api_key
+from ..core.indicators import parse_indicators
+from ..core.municipality_index import load_municipality_index
+from ..core.output import split_outputs
+from ..core.stats_store import StatsStore
+from .shinkansen import (
+    DEFAULT_RETRIES,
+    DEFAULT_TIMEOUT,
+    DEFAULT_YEAR,
+    TIMESERIES_LAYOUTS,
+    EStatAPIClient,
+    ShinkansenCommand,
+    parse_years,
+)
+
+JOB_KEYS = {'name', 'output', 'route_filter', 'years', 'layout', 'indicators'}
+SETTING_KEYS = {
+    'sleep', 'cache_dir', 'cache_ttl_days', 'refresh', 'offline', 'concurrency', 'fetch_mode', 'base_url',
+    'timeout', 'retries', 'deadline', 'check_updates', 'fuzzy',
+}
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    """マニフェスト（.yaml / .yml / .json）を読み込み"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith('.json'):
+            manifest = json.load(f)
+        else:
+            manifest = yaml.safe_load(f)
+    if not isinstance(manifest, dict) or not manifest.get('jobs'):
+        raise ValueError(f"Manifest {path} must define a non-empty 'jobs' list")
+    return manifest
+
+
+def _split_list(value: Any) -> Optional[List[str]]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def _run_job(job: Dict[str, Any], station_data: List[Dict], store_dir: str) -> List[str]:
+    """1ジョブ分の結合・出力（プロセスプールのワーカーで実行、統計データはメモリマップで共有）"""
+    cmd = ShinkansenCommand()
+    cmd.logger.info(f"[{job['name']}] Building {len(station_data)} stations")
+
+    client = EStatAPIClient(
+        api_key=None,
+        offline=True,
+        years=job['years'] or [DEFAULT_YEAR],
+        indicators=job['indicators'],
+        municipality_index=load_municipality_index(cache_dir=job['index_dir']),
+        fuzzy=job['fuzzy']
+    )
+    client.load_store(StatsStore.load(store_dir, mmap=True))
+
+    df = cmd._generate(station_data, client, timeseries=bool(job['years']), layout=job['layout'])
+    for path in job['outputs']:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+    cmd._write_outputs(df, job['outputs'])
+    cmd._log_statistics(df, suffix=f"_{client.years[-1]}" if job['years'] and job['layout'] == 'wide' else '')
+    return job['outputs']
+
+
+class BatchCommand(BaseCommand):
+    """マニフェストの全ジョブを計画し、e-Stat 取得を共有して一括実行するコマンド"""
+
+    @property
+    def name(self) -> str:
+        return "batch"
+
+    @property
+    def description(self) -> str:
+        return "マニフェストに記述した複数の shinkansen ジョブを取得共有で一括実行"
+
+    def _plan_jobs(self, manifest: Dict[str, Any], base_dir: Path) -> List[Dict[str, Any]]:
+        """ジョブ定義を検証・正規化（出力パスはマニフェストからの相対パスで解決）"""
+        jobs = []
+        for i, raw in enumerate(manifest['jobs']):
+            unknown = set(raw) - JOB_KEYS
+            if unknown:
+                raise ValueError(f"Job #{i}: unknown keys {sorted(unknown)}")
+            if not raw.get('output'):
+                raise ValueError(f"Job #{i}: 'output' is required")
+
+            layout = raw.get('layout', 'long')
+            if layout not in TIMESERIES_LAYOUTS:
+                raise ValueError(f"Job #{i}: layout must be one of {TIMESERIES_LAYOUTS}, got {layout!r}")
+
+            jobs.append({
+                'name': raw.get('name', f"job{i}"),
+                'outputs': [str(base_dir / path) for path in split_outputs(raw['output'])],
+                'route_filter': _split_list(raw.get('route_filter')),
+                'years': parse_years(raw.get('years')),
+                'layout': layout,
+                'indicators': parse_indicators(raw.get('indicators')),
+            })
+        return jobs
+
+    def run(self,
+            manifest: str,
+            workers: Optional[int] = None,
+            api_key: Optional[str] = None,
+            refresh: bool = False,
+            offline: bool = False) -> List[str]:
+        """
+        マニフェストのジョブを一括実行
+
+        全ジョブが必要とする自治体・年・指標を合算して e-Stat の統計表を1回ずつ（並列に）取得し、
+        各ジョブの結合・出力をプロセスプールで実行する。
+
+        Args:
+            manifest: マニフェストファイル（YAML / JSON）
+            workers: 結合・出力を行うプロセス数（デフォルト: CPU 数）
+            api_key: e-Stat API キー（環境変数 ESTAT_API_KEY からも取得可能）
+            refresh: キャッシュを無視して e-Stat API から再取得（マニフェストの設定より優先）
+            offline: ネットワークアクセスせずキャッシュのみを使用（マニフェストの設定より優先）
+
+        Returns:
+            出力ファイルパスのリスト
+        """
+        document = load_manifest(manifest)
+        settings = dict(document.get('settings') or {})
+        unknown = set(settings) - SETTING_KEYS
+        if unknown:
+            raise ValueError(f"Unknown settings {sorted(unknown)}")
+        refresh = refresh or settings.get('refresh', False)
+        offline = offline or settings.get('offline', False)
+        if refresh and offline:
+            raise ValueError("refresh and offline cannot be used together")
+
+        jobs = self._plan_jobs(document, Path(manifest).resolve().parent)
+        shinkansen = ShinkansenCommand()
+        api_key = resolve_api_key(api_key, offline)
+
+        # ジョブごとの駅リスト（駅マスターは1回だけ読み込む）
+        all_stations = shinkansen._load_station_data()
+        job_stations = [
+            shinkansen._filter_by_routes(all_stations, job['route_filter']) if job['route_filter'] else all_stations
+            for job in jobs
+        ]
+
+        # 全ジョブで必要な自治体・年・指標を合算し、統計表の取得を1回にまとめる
+        years = sorted({year for job in jobs for year in (job['years'] or [DEFAULT_YEAR])})
+        indicators = list(dict.fromkeys(spec for job in jobs for spec in job['indicators']))
+        client = EStatAPIClient(
+            api_key=api_key,
+            sleep_time=settings.get('sleep', 0.5),
+            stats_cache=StatsCache(
+                cache_dir=settings.get('cache_dir'),
+                ttl_days=settings.get('cache_ttl_days', DEFAULT_TTL_DAYS)
+            ),
+            refresh=refresh,
+            offline=offline,
+            concurrency=settings.get('concurrency', 4),
+            fetch_mode=settings.get('fetch_mode', 'auto'),
+            years=years,
+            indicators=indicators,
+            base_url=settings.get('base_url'),
+            timeout=settings.get('timeout', DEFAULT_TIMEOUT),
+            retries=settings.get('retries', DEFAULT_RETRIES),
+            deadline=settings.get('deadline'),
+            check_updates=settings.get('check_updates', False),
+            fuzzy=settings.get('fuzzy', False),
+            metrics=self.metrics
+        )
+        client.ensure_municipality_index(self.logger)
+        for job in jobs:
+            job.update(fuzzy=client.fuzzy, index_dir=client.index_dir)
+        pairs = {(s['municipality'], s['prefecture']) for stations in job_stations for s in stations}
+        area_codes = {client._get_municipality_code(m, p) for m, p in pairs} - {None}
+        self.logger.info(
+            f"Planned {len(jobs)} jobs: {len(area_codes)} municipalities, years {years}"
+        )
+        if not client._fetch_all_data(self.logger, area_codes=area_codes):
+            raise RuntimeError("Failed to fetch data from e-Stat API")
+        if client.changed_areas:
+            changed = sorted(m for m, p in pairs if client._get_municipality_code(m, p) in client.changed_areas)
+            self.logger.info(f"Values changed since the last fetch for {len(changed)} station municipalities: {changed}")
+
+        # 取得結果を .npy に書き出し、各ワーカーは同じファイルをメモリマップして参照する
+        workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+        outputs: List[str] = []
+        failed: List[str] = []
+        with tempfile.TemporaryDirectory(prefix='allinn-batch-') as workdir, self.metrics.span('jobs'):
+            store_dir = str(client.store.save(workdir))
+
+            # 結合・出力をプロセスプールで実行
+            if workers == 1:
+                results = []
+                for job, stations in zip(jobs, job_stations):
+                    try:
+                        results.append((job, _run_job(job, stations, store_dir), None))
+                    except Exception as e:
+                        results.append((job, None, e))
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        (job, executor.submit(_run_job, job, stations, store_dir))
+                        for job, stations in zip(jobs, job_stations)
+                    ]
+                    results = []
+                    for job, future in futures:
+                        try:
+                            results.append((job, future.result(), None))
+                        except Exception as e:
+                            results.append((job, None, e))
+
+        for job, job_outputs, error in results:
+            if error is not None:
+                self.logger.error(f"Job {job['name']} failed: {error}")
+                failed.append(job['name'])
+            else:
+                outputs.extend(job_outputs)
+
+        self.logger.info(f"Completed {len(jobs) - len(failed)}/{len(jobs)} jobs with {workers} worker(s)")
+        if failed:
+            raise RuntimeError(f"{len(failed)} job(s) failed: {failed}")
+        return outputs
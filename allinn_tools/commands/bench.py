@@ -0,0 +1,240 @@
+"""
+ローカルの e-Stat 代替サーバーを使ったオフラインベンチマーク
+
+Usage via CLI:
+    allinn bench --extra_areas 20000 --years 2000-2020:5 --save_baseline
+    allinn bench --baseline benchmarks/baseline.json --tolerance 0.2
+    allinn bench --scenarios startup
+"""
+
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..core.base_command import BaseCommand
+from ..core.cache import default_cache_dir
+from ..testing.fake_estat import FakeEStatServer
+from .shinkansen import EStatAPIClient, ShinkansenCommand, parse_years
+
+SCENARIOS = ('fetch', 'join', 'end_to_end', 'startup')
+# CLI の起動だけでは読み込まれないはずのモジュール（startup シナリオで検査）
+HEAVY_MODULES = ('pandas', 'numpy', 'requests', 'dotenv', 'yaml')
+PACKAGE_ROOT = Path(__file__).resolve().parent.parent.parent
+BASELINE_FILE_NAME = 'bench_baseline.json'
+COMPARED_METRICS = ('seconds', 'peak_rss_mb')
+
+
+def _quiet(command: BaseCommand) -> logging.Logger:
+    command.logger.setLevel(logging.WARNING)
+    return command.logger
+
+
+# CLI を import し、重いモジュール数とピーク RSS（KiB）を出力するスクリプト
+# （fork 元の RSS を引き継ぐ ru_maxrss ではなく、exec 後のプロセス自身の VmHWM を読む）
+_STARTUP_PROBE = f"""
+import json, resource, sys
+import allinn_tools.cli
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+try:
+    with open('/proc/self/status') as f:
+        peak = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+except (OSError, StopIteration):
+    pass
+print(json.dumps({{'heavy_modules': sum(name in sys.modules for name in {HEAVY_MODULES!r}), 'peak_kb': peak}}))
+"""
+
+
+def _measure_startup() -> Dict[str, float]:
+    """`allinn list_commands` の起動時間と、CLI の import で読み込まれる重いモジュール数・メモリを計測"""
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-m', 'allinn_tools', 'list_commands'],
+        cwd=PACKAGE_ROOT, check=True, stdout=subprocess.DEVNULL
+    )
+    seconds = time.perf_counter() - started
+
+    probe = json.loads(subprocess.run(
+        [sys.executable, '-c', _STARTUP_PROBE], cwd=PACKAGE_ROOT, check=True, capture_output=True, text=True
+    ).stdout)
+    return {
+        'seconds': seconds,
+        'heavy_modules': float(probe['heavy_modules']),
+        'peak_rss_mb': probe['peak_kb'] / 1024,
+    }
+
+
+def _run_scenario(scenario: str, url: str, params: Dict[str, Any], workdir: str) -> Dict[str, float]:
+    """1シナリオを計測（ピーク RSS を分離するため新しいプロセスで実行）"""
+    if scenario == 'startup':
+        return _measure_startup()
+    cmd = ShinkansenCommand()
+    logger = _quiet(cmd)
+    years = parse_years(params['years'])
+    result: Dict[str, float] = {}
+
+    if scenario == 'end_to_end':
+        started = time.perf_counter()
+        cmd.run(
+            output=str(Path(workdir) / 'bench.csv'),
+            api_key='bench',
+            sleep=0,
+            cache_dir=str(Path(workdir) / 'cache'),
+            years=years or None,
+            indicators=params['indicators'],
+            base_url=url
+        )
+        result['seconds'] = time.perf_counter() - started
+    else:
+        client = EStatAPIClient(
+            api_key='bench',
+            sleep_time=0,
+            fetch_mode='full',
+            years=years,
+            indicators=params['indicators'],
+            base_url=url
+        )
+        started = time.perf_counter()
+        if not client._fetch_all_data(logger):
+            raise RuntimeError("Fetching from the fake e-Stat server failed")
+        fetch_seconds = time.perf_counter() - started
+
+        if scenario == 'fetch':
+            cells = int(np.count_nonzero(~np.isnan(client.store.values)))
+            result['seconds'] = fetch_seconds
+            result['cells_per_second'] = cells / fetch_seconds
+        else:
+            stations = cmd._load_station_data() * params['station_scale']
+            started = time.perf_counter()
+            cmd._create_csv(stations, client)
+            result['seconds'] = time.perf_counter() - started
+            result['stations'] = len(stations)
+
+    # Linux の ru_maxrss は KiB 単位
+    result['peak_rss_mb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+class BenchCommand(BaseCommand):
+    """取得・パース・結合・エンドツーエンドの性能を計測し、ベースラインと比較するコマンド"""
+
+    @property
+    def name(self) -> str:
+        return "bench"
+
+    @property
+    def description(self) -> str:
+        return "ローカルの e-Stat 代替サーバーで性能を計測しベースラインと比較"
+
+    def _compare(self, metrics: Dict[str, Dict[str, float]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+        """ベースラインから tolerance を超えて悪化した指標を返す"""
+        regressions = []
+        for scenario, values in metrics.items():
+            reference = baseline['metrics'].get(scenario, {})
+            for metric in COMPARED_METRICS:
+                if metric not in values or not reference.get(metric):
+                    continue
+                ratio = values[metric] / reference[metric]
+                self.logger.info(f"{scenario}.{metric}: {values[metric]:.3f} (baseline {reference[metric]:.3f}, x{ratio:.2f})")
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{scenario}.{metric} x{ratio:.2f}")
+        return regressions
+
+    def run(self,
+            scenarios: Optional[List[str]] = None,
+            extra_areas: int = 0,
+            years: Optional[str] = None,
+            indicators: Optional[str] = None,
+            station_scale: int = 100,
+            latency: float = 0.0,
+            repeat: int = 3,
+            baseline: Optional[str] = None,
+            save_baseline: bool = False,
+            tolerance: float = 0.2) -> Dict[str, Any]:
+        """
+        ベンチマークを実行
+
+        Args:
+            scenarios: 実行するシナリオ（'fetch': 取得・パース、'join': 結合、'end_to_end': run 全体、
+                'startup': CLI の起動時間）
+            extra_areas: 代替サーバーに追加する合成自治体数（セル数 = 地域数 × 指標数 × 年数）
+            years: 取得年（例: '2000-2020:5'）。省略時は最新年のみ
+            indicators: 追加で取得する SSDS 指標コード
+            station_scale: join シナリオで駅リストを複製する倍数
+            latency: 代替サーバーの応答遅延（秒）
+            repeat: 各シナリオの試行回数（所要時間は中央値、RSS は最大値）
+            baseline: ベースラインファイル（デフォルト: キャッシュディレクトリの bench_baseline.json）
+            save_baseline: 計測結果をベースラインとして保存
+            tolerance: 回帰とみなす悪化率（0.2 = 20%）
+
+        Returns:
+            計測結果
+        """
+        scenarios = list(scenarios or SCENARIOS)
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise ValueError(f"Unknown scenarios {sorted(unknown)}; choose from {SCENARIOS}")
+        params = {
+            'extra_areas': extra_areas,
+            'years': years,
+            'indicators': indicators,
+            'station_scale': station_scale,
+            'latency': latency,
+        }
+        baseline_path = Path(baseline) if baseline else default_cache_dir() / BASELINE_FILE_NAME
+
+        metrics: Dict[str, Dict[str, float]] = {}
+        context = multiprocessing.get_context('spawn')
+        with FakeEStatServer(extra_areas=extra_areas, latency=latency) as server, \
+                tempfile.TemporaryDirectory() as workdir:
+            self.logger.info(f"Fake e-Stat server at {server.url} ({len(server.area_codes)} areas)")
+            for scenario in scenarios:
+                runs = []
+                for i in range(repeat):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        runs.append(executor.submit(
+                            _run_scenario, scenario, server.url, params, str(Path(workdir) / f"{scenario}{i}")
+                        ).result())
+                metrics[scenario] = {
+                    key: max(run[key] for run in runs) if key == 'peak_rss_mb'
+                    else statistics.median(run[key] for run in runs)
+                    for key in runs[0]
+                }
+                self.logger.info(f"{scenario}: {metrics[scenario]}")
+            if metrics.get('startup', {}).get('heavy_modules'):
+                self.logger.warning(f"Importing the CLI loads heavy modules (one of {HEAVY_MODULES})")
+
+        report = {'params': params, 'python': platform.python_version(), 'metrics': metrics}
+
+        if save_baseline:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(baseline_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.logger.info(f"Baseline saved to {baseline_path}")
+            return report
+
+        if not baseline_path.exists():
+            self.logger.warning(f"No baseline at {baseline_path}; run with --save_baseline to record one")
+            return report
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        if stored.get('params') != params:
+            self.logger.warning(f"Baseline parameters differ ({stored.get('params')}); skipping comparison")
+            return report
+
+        regressions = self._compare(metrics, stored, tolerance)
+        if regressions:
+            raise RuntimeError(f"Performance regression beyond {tolerance:.0%}: {', '.join(regressions)}")
+        self.logger.info("No regressions against baseline")
+        return report
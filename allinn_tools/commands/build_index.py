@@ -0,0 +1,54 @@
+"""
+e-Stat メタ情報から自治体コードインデックスを生成
+
+Usage via CLI:
+    allinn build-index --output municipality_index.json --api-key YOUR_API_KEY
+"""
+
+from typing import Optional
+
+from ..core.base_command import BaseCommand
+from ..core.env import resolve_api_key
+from ..core.municipality_index import INDEX_STATS_DATA_ID, generated_index_path
+from .shinkansen import EStatAPIClient
+
+
+class BuildIndexCommand(BaseCommand):
+    """getMetaInfo の地域分類から自治体コードインデックスを再生成するコマンド"""
+
+    @property
+    def name(self) -> str:
+        return "build-index"
+
+    @property
+    def description(self) -> str:
+        return "e-Stat メタ情報から自治体コードインデックスを再生成"
+
+    def run(self,
+            output: Optional[str] = None,
+            stats_data_id: str = INDEX_STATS_DATA_ID,
+            api_key: Optional[str] = None,
+            cache_dir: Optional[str] = None,
+            base_url: Optional[str] = None) -> str:
+        """
+        自治体コードインデックスを生成
+
+        Args:
+            output: 出力先パス（デフォルト: キャッシュディレクトリの municipality_index.json）
+            stats_data_id: 地域分類を取得する統計表ID
+            api_key: e-Stat API キー（環境変数 ESTAT_API_KEY からも取得可能）
+            cache_dir: 出力先のキャッシュディレクトリ（shinkansen / serve の --cache_dir と同じ値を指定）
+            base_url: e-Stat API の接続先（環境変数 ESTAT_API_URL からも取得可能）
+
+        Returns:
+            出力ファイルパス
+        """
+        api_key = resolve_api_key(api_key)
+        output = output or str(generated_index_path(cache_dir))
+
+        self.logger.info(f"Fetching area classes of {stats_data_id} from e-Stat API...")
+        client = EStatAPIClient(api_key=api_key, base_url=base_url)
+        count = client.build_municipality_index(output, stats_data_id)
+        self.logger.info(f"Wrote {count} municipalities to {output}")
+
+        return output
@@ -0,0 +1,98 @@
+"""
+自治体名を一括で自治体コードに名寄せし、解決方法・曖昧な候補を出力
+
+Usage via CLI:
+    allinn resolve --input names.csv --output resolved.csv
+"""
+
+import sys
+import time
+from typing import Optional
+
+import pandas as pd
+
+from ..core.base_command import BaseCommand
+from ..core.municipality_index import load_municipality_index
+from ..core.output import detect_format, write_frame
+from ..core.station_input import STDIN_PATH
+
+
+class ResolveCommand(BaseCommand):
+    """自治体名（と都道府県名）のリストを自治体コードに一括変換するコマンド"""
+
+    @property
+    def name(self) -> str:
+        return "resolve"
+
+    @property
+    def description(self) -> str:
+        return "自治体名を一括で自治体コードに名寄せ（旧市町村名・表記ゆれ・あいまい一致に対応）"
+
+    def _read_names(self, path: str) -> pd.DataFrame:
+        """municipality（と任意の prefecture）列を持つ CSV / JSON Lines / Parquet を読み込む"""
+        fmt = detect_format(path)
+        if path == STDIN_PATH or fmt in ('csv', 'csv.gz'):
+            frame = pd.read_csv(sys.stdin if path == STDIN_PATH else path, dtype=str, encoding='utf-8')
+        elif fmt == 'jsonl':
+            frame = pd.read_json(path, lines=True, dtype=False)
+        elif fmt == 'parquet':
+            frame = pd.read_parquet(path)
+        else:
+            raise ValueError(f"Unsupported input format for {path}; use .csv / .csv.gz / .jsonl / .parquet")
+        if 'municipality' not in frame.columns:
+            raise ValueError(f"Input {path} needs a municipality column; found {list(frame.columns)[:10]}")
+        return frame
+
+    def run(self,
+            input: str,
+            output: str = 'resolved_municipalities.csv',
+            index_path: Optional[str] = None,
+            cache_dir: Optional[str] = None,
+            fuzzy: bool = False) -> str:
+        """
+        自治体名を一括で名寄せ
+
+        Args:
+            input: municipality 列（任意で prefecture 列）を持つファイル（.csv / .csv.gz / .jsonl / .parquet、
+                '-' で標準入力の CSV）
+            output: 出力ファイルパス。入力の列に area_code / resolved_name / method / candidates を追加
+            index_path: 自治体コードインデックス（省略時は cache_dir にある build-index の生成物または同梱のもの）
+            cache_dir: build-index の出力先と同じキャッシュディレクトリ（環境変数 ALLINN_CACHE_DIR からも取得可能）
+            fuzzy: 前方一致・表記ゆれ（1〜2文字違い）によるあいまい一致も行う
+
+        Returns:
+            出力ファイルパス
+        """
+        index = load_municipality_index(index_path, cache_dir)
+        frame = self._read_names(input)
+        self.logger.info(f"Loaded {len(frame)} names from {input} (index {index.version}, {len(index)} municipalities)")
+
+        with self.metrics.span('resolve'):
+            started = time.perf_counter()
+            municipalities = frame['municipality'].tolist()
+            prefectures = frame['prefecture'].tolist() if 'prefecture' in frame.columns else None
+            resolutions = index.resolve_many(municipalities, prefectures, fuzzy=fuzzy)
+            seconds = time.perf_counter() - started
+
+        frame['area_code'] = [resolution.code for resolution in resolutions]
+        frame['resolved_name'] = [index.display.get(resolution.code) for resolution in resolutions]
+        frame['method'] = [resolution.method if resolution.code else None for resolution in resolutions]
+        frame['candidates'] = [
+            ';'.join(index.describe(code) for code in resolution.candidates) or None for resolution in resolutions
+        ]
+        write_frame(frame, output)
+
+        counts = frame['method'].value_counts().to_dict()
+        ambiguous = sum(resolution.ambiguous for resolution in resolutions)
+        unresolved = int(frame['area_code'].isna().sum()) - ambiguous
+        rate = len(frame) / seconds if seconds > 0 else float('inf')
+        self.logger.info(f"Resolved {len(frame) - ambiguous - unresolved}/{len(frame)} names {counts} "
+                         f"({rate:,.0f} names/s)")
+        if ambiguous:
+            self.logger.warning(f"{ambiguous} names are ambiguous; see the candidates column in {output}")
+        if unresolved:
+            self.logger.warning(f"{unresolved} names could not be resolved")
+        self.metrics.incr('names', len(frame))
+        self.metrics.gauge('names_per_second', rate)
+        self.logger.info(f"Saved to {output}")
+        return output
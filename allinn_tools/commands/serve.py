@@ -0,0 +1,402 @@
+"""
+統計データを常駐させて駅・自治体の人口密度を返すローカル HTTP/JSON サーバー
+
+Usage via CLI:
+    allinn serve --port 8765 --years 2015,2020 --refresh_interval 3600
+
+Endpoints:
+    GET  /health                          読み込み状況
+    GET  /stations?route=東海道&year=2020  駅ごとの指標（JSON、route はカンマ区切りの部分一致）
+    GET  /stations.csv?route=東海道,山陽    同じ内容を CSV で出力
+    GET  /municipality?name=静岡市&prefecture=静岡県 または ?code=22100
+                                          自治体の全取得年の指標（派生指標を含む）
+    GET  /aggregates?level=route&year=2020 路線（route）・都道府県（prefecture）・全国（national）の集計
+    GET  /top?n=10&year=2020               人口密度上位の駅（全路線）
+    POST /refresh                         バックグラウンドでキャッシュを使わずに再取得
+"""
+
+import io
+import json
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+
+from ..core.aggregates import DEFAULT_TOP_N, ROLLUP_LEVELS, AggregateStore
+from ..core.base_command import BaseCommand
+from ..core.cache import DEFAULT_TTL_DAYS, StatsCache
+from ..core.env import resolve_api_key
+from ..core.indicators import evaluate_derived
+from ..core.stats_store import widen_float32_columns
+from .shinkansen import (
+    DEFAULT_RETRIES,
+    DEFAULT_TIMEOUT,
+    EStatAPIClient,
+    ShinkansenCommand,
+    parse_years,
+)
+
+DEFAULT_PORT = 8765
+DEFAULT_REFRESH_INTERVAL = 3600.0  # バックグラウンド再取得の間隔（秒）
+RESPONSE_CACHE_SIZE = 256          # スナップショットごとに保持する応答数
+STATION_FILTERS = ('route', 'station', 'municipality', 'prefecture', 'year')
+
+
+class Snapshot(NamedTuple):
+    """ある時点の取得結果（リクエスト処理中は差し替えられても参照を保持し続ける）"""
+    client: EStatAPIClient
+    stations: pd.DataFrame
+    loaded_at: float
+    view_key: str  # 集計ビュー（AggregateStore）のキー
+
+
+class StatsService:
+    """取得済みデータのスナップショットを保持し、照会・再取得を行う
+
+    再取得は新しいクライアントで行い、完了後にスナップショットの参照を差し替えるため、
+    照会はロックなしで古いスナップショットから応答し続けられる。
+    """
+
+    def __init__(self, client_options: Dict[str, Any], years: List[int], logger):
+        self.client_options = client_options
+        self.years = years
+        self.logger = logger
+        self.command = ShinkansenCommand()
+        self.station_data = self.command._load_stations(None)
+        self.aggregates = AggregateStore(client_options['stats_cache'].cache_dir)
+        self.snapshot: Optional[Snapshot] = None
+        self.last_error: Optional[str] = None
+        self._refresh_lock = threading.Lock()
+        self._responses: 'OrderedDict[Tuple, Tuple[str, bytes]]' = OrderedDict()
+        self._responses_lock = threading.Lock()
+
+    def load(self, refresh: bool = False) -> bool:
+        """データを取得してスナップショットを差し替える（同時に1回のみ実行）
+
+        refresh=True ではキャッシュを使わず e-Stat から取得し直す（オフライン時はキャッシュを読み直す）。
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            self.logger.info("Refresh already in progress")
+            return False
+        client = None
+        try:
+            started = time.perf_counter()
+            options = dict(self.client_options)
+            if refresh and not options.get('offline'):
+                options['refresh'] = True
+            client = EStatAPIClient(**options)
+            stations = self.command._generate(
+                self.station_data, client, timeseries=bool(self.years), layout='long'
+            )
+            view_key = self.command._materialize_aggregates(
+                stations, client, timeseries=bool(self.years), layout='long', store=self.aggregates
+            )
+            previous, self.snapshot = self.snapshot, Snapshot(client, stations.reset_index(drop=True), time.time(), view_key)
+            with self._responses_lock:
+                self._responses.clear()
+            if previous is not None:
+                # 差し替えたクライアントの接続プールを解放（照会はスナップショットのデータだけを使う）
+                previous.client.session.close()
+            self.last_error = None
+            self.logger.info(
+                f"Loaded {len(client.store)} municipalities and {len(stations)} station rows "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            self.logger.error(f"Refresh failed, keeping the previous data: {e}")
+            if client is not None:
+                client.session.close()
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def refresh_in_background(self) -> bool:
+        """別スレッドで再取得を開始（実行中の場合は False）"""
+        if self._refresh_lock.locked():
+            return False
+        threading.Thread(target=self.load, kwargs={'refresh': True}, name='allinn-refresh', daemon=True).start()
+        return True
+
+    def refresh_periodically(self, interval: float, stop: threading.Event) -> None:
+        """interval 秒ごとに e-Stat から再取得"""
+        while not stop.wait(interval):
+            self.load(refresh=True)
+
+    def health(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "status": "ok" if snapshot else "loading",
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "municipalities": len(snapshot.client.store) if snapshot else 0,
+            "station_rows": len(snapshot.stations) if snapshot else 0,
+            "years": snapshot.client.years if snapshot else self.years,
+            "indicators": snapshot.client.columns if snapshot else [],
+            "refreshing": self._refresh_lock.locked(),
+            "last_error": self.last_error,
+        }
+
+    def _cached(self, key: Tuple, build) -> Tuple[str, bytes]:
+        """スナップショット内で同じ照会の応答を再利用（LRU）"""
+        with self._responses_lock:
+            if key in self._responses:
+                self._responses.move_to_end(key)
+                return self._responses[key]
+        response = build()
+        with self._responses_lock:
+            self._responses[key] = response
+            while len(self._responses) > RESPONSE_CACHE_SIZE:
+                self._responses.popitem(last=False)
+        return response
+
+    @staticmethod
+    def _filter_stations(stations: pd.DataFrame, filters: Dict[str, str]) -> pd.DataFrame:
+        """駅 DataFrame を絞り込み（route は部分一致、その他は完全一致。カンマ区切りで複数指定）"""
+        mask = pd.Series(True, index=stations.index)
+        for name, value in filters.items():
+            values = [item.strip() for item in value.split(',') if item.strip()]
+            if not values:
+                continue
+            if name == 'route':
+                routes = stations['route'].astype(str).str.lower()
+                mask &= pd.concat([routes.str.contains(v.lower(), regex=False) for v in values], axis=1).any(axis=1)
+            elif name == 'year':
+                if 'year' not in stations.columns:
+                    raise ValueError("year filter requires the server to be started with --years")
+                mask &= stations['year'].isin([int(v) for v in values])
+            else:
+                mask &= stations[name].astype(str).isin(values)
+        return stations[mask]
+
+    def stations(self, params: Dict[str, str], fmt: str = 'json') -> Tuple[str, bytes]:
+        """駅ごとの指標を JSON（レコードの配列）または CSV で返す"""
+        snapshot = self._require_snapshot()
+        filters = {name: params[name] for name in STATION_FILTERS if params.get(name)}
+
+        def build() -> Tuple[str, bytes]:
+            df = self._filter_stations(snapshot.stations, filters)
+            if fmt == 'csv':
+                buffer = io.StringIO()
+                df.to_csv(buffer, index=False)
+                return 'text/csv; charset=utf-8', buffer.getvalue().encode('utf-8')
+            df = widen_float32_columns(df)
+            return 'application/json; charset=utf-8', df.to_json(orient='records', force_ascii=False).encode('utf-8')
+
+        return self._cached((snapshot.loaded_at, 'stations', fmt, tuple(sorted(filters.items()))), build)
+
+    def municipality(self, params: Dict[str, str]) -> Tuple[str, bytes]:
+        """自治体（code または name + prefecture）の全取得年の指標を返す"""
+        snapshot = self._require_snapshot()
+        client = snapshot.client
+        code = params.get('code')
+        method = matched = None
+        if not code:
+            if not params.get('name'):
+                raise ValueError("Specify code or name (and optionally prefecture)")
+            label = f"{params['name']} {params.get('prefecture') or ''}".strip()
+            resolution = client.municipality_index.resolve(params['name'], params.get('prefecture'), fuzzy=client.fuzzy)
+            if resolution.ambiguous:
+                raise LookupError(f"Ambiguous municipality: {label} (candidates: {', '.join(resolution.candidates)})")
+            if resolution.code is None:
+                raise LookupError(f"Municipality not found: {label}")
+            code, method, matched = resolution.code, resolution.method, resolution.matched
+            if method in ('prefix', 'fuzzy'):
+                self.logger.warning(f"Substituted {label} with {client.municipality_index.describe(code)} [{method}]")
+
+        def build() -> Tuple[str, bytes]:
+            if (client.store.positions([code]) < 0).all():
+                raise LookupError(f"No data for area code {code}")
+            values = pd.DataFrame(client.get_timeseries_values([code])[0], columns=client.columns)
+            evaluate_derived(values)
+            values.insert(0, 'year', client.years)
+            body = {
+                "area_code": code,
+                "method": method,
+                "matched": matched,
+                "values": json.loads(values.to_json(orient='records', force_ascii=False)),
+            }
+            return 'application/json; charset=utf-8', json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+        return self._cached((snapshot.loaded_at, 'municipality', code, method, matched), build)
+
+    def aggregates_view(self, params: Dict[str, str]) -> Tuple[str, bytes]:
+        """集計ビューから路線・都道府県・全国の集計を返す（year 省略時は全取得年）"""
+        snapshot = self._require_snapshot()
+        level = params.get('level') or 'route'
+        if level not in ROLLUP_LEVELS:
+            raise ValueError(f"level must be one of {ROLLUP_LEVELS}, got {level!r}")
+        year = int(params['year']) if params.get('year') else None
+
+        def build() -> Tuple[str, bytes]:
+            frame = self.aggregates.rollups(snapshot.view_key, level, year)
+            return 'application/json; charset=utf-8', frame.to_json(orient='records', force_ascii=False).encode('utf-8')
+
+        return self._cached((snapshot.loaded_at, 'aggregates', level, year), build)
+
+    def top(self, params: Dict[str, str]) -> Tuple[str, bytes]:
+        """集計ビューから人口密度上位 n 駅を返す（year 省略時は最新の取得年）"""
+        snapshot = self._require_snapshot()
+        n = int(params.get('n') or DEFAULT_TOP_N)
+        year = int(params['year']) if params.get('year') else snapshot.client.years[-1]
+
+        def build() -> Tuple[str, bytes]:
+            frame = self.aggregates.top_stations(snapshot.view_key, year, n)
+            return 'application/json; charset=utf-8', frame.to_json(orient='records', force_ascii=False).encode('utf-8')
+
+        return self._cached((snapshot.loaded_at, 'top', n, year), build)
+
+    def _require_snapshot(self) -> Snapshot:
+        snapshot = self.snapshot
+        if snapshot is None:
+            raise RuntimeError("Data is still loading")
+        return snapshot
+
+
+def _handler_class(service: StatsService):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive で高頻度の照会に対応
+
+        def log_message(self, format, *args):
+            service.logger.debug("%s " + format, self.address_string(), *args)
+
+        def _send(self, status: int, content_type: str, payload: bytes) -> None:
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+            self._send(status, 'application/json; charset=utf-8', json.dumps(body, ensure_ascii=False).encode('utf-8'))
+
+        def _dispatch(self, method: str) -> None:
+            parsed = urlparse(self.path)
+            params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+            route = (method, parsed.path.rstrip('/') or '/')
+            try:
+                if route == ('GET', '/health'):
+                    self._send_json(200, service.health())
+                elif route == ('GET', '/stations'):
+                    self._send(200, *service.stations(params))
+                elif route == ('GET', '/stations.csv'):
+                    self._send(200, *service.stations(params, fmt='csv'))
+                elif route == ('GET', '/municipality'):
+                    self._send(200, *service.municipality(params))
+                elif route == ('GET', '/aggregates'):
+                    self._send(200, *service.aggregates_view(params))
+                elif route == ('GET', '/top'):
+                    self._send(200, *service.top(params))
+                elif route == ('POST', '/refresh'):
+                    started = service.refresh_in_background()
+                    self._send_json(202, {"status": "started" if started else "already running"})
+                else:
+                    self._send_json(404, {"error": f"Unknown endpoint {method} {parsed.path}"})
+            except (ValueError, KeyError) as e:
+                self._send_json(400, {"error": str(e)})
+            except LookupError as e:
+                self._send_json(404, {"error": str(e)})
+            except RuntimeError as e:
+                self._send_json(503, {"error": str(e)})
+
+        def do_GET(self):
+            self._dispatch('GET')
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                self.rfile.read(length)
+            self._dispatch('POST')
+
+    return Handler
+
+
+class ServeCommand(BaseCommand):
+    """統計データを常駐させ、駅・自治体の照会と CSV 出力を HTTP で提供するコマンド"""
+
+    @property
+    def name(self) -> str:
+        return "serve"
+
+    @property
+    def description(self) -> str:
+        return "統計データを常駐させて駅・自治体の人口密度を返すローカル HTTP/JSON サーバーを起動"
+
+    def create_server(self,
+                      host: str = '127.0.0.1',
+                      port: int = DEFAULT_PORT,
+                      sleep: float = 0.5,
+                      api_key: Optional[str] = None,
+                      cache_dir: Optional[str] = None,
+                      cache_ttl_days: float = DEFAULT_TTL_DAYS,
+                      offline: bool = False,
+                      concurrency: int = 4,
+                      fetch_mode: str = 'full',
+                      years: Union[None, int, str, Iterable] = None,
+                      indicators: Union[None, str, Iterable[str]] = None,
+                      base_url: Optional[str] = None,
+                      timeout: float = DEFAULT_TIMEOUT,
+                      retries: int = DEFAULT_RETRIES,
+                      check_updates: bool = False,
+                      fuzzy: bool = False) -> Tuple[ThreadingHTTPServer, StatsService]:
+        """初回の取得を行い、サーバーとサービスを作成（serve_forever は呼び出し側で実行）"""
+        year_list = parse_years(years)
+        client_options = {
+            'api_key': resolve_api_key(api_key, offline),
+            'sleep_time': sleep,
+            'stats_cache': StatsCache(cache_dir=cache_dir, ttl_days=cache_ttl_days),
+            'offline': offline,
+            'concurrency': concurrency,
+            'fetch_mode': fetch_mode,
+            'years': year_list,
+            'indicators': indicators,
+            'base_url': base_url,
+            'timeout': timeout,
+            'retries': retries,
+            'check_updates': check_updates,
+            'fuzzy': fuzzy,
+            'metrics': self.metrics,
+        }
+        service = StatsService(client_options, year_list, self.logger)
+        if not service.load():
+            raise RuntimeError(f"Initial load failed: {service.last_error}")
+
+        server = ThreadingHTTPServer((host, port), _handler_class(service))
+        server.daemon_threads = True
+        return server, service
+
+    def run(self,
+            host: str = '127.0.0.1',
+            port: int = DEFAULT_PORT,
+            refresh_interval: float = DEFAULT_REFRESH_INTERVAL,
+            **options) -> None:
+        """
+        サーバーを起動（Ctrl+C で終了）
+
+        Args:
+            host: 待ち受けるアドレス
+            port: 待ち受けるポート
+            refresh_interval: バックグラウンド再取得の間隔（秒）。0 以下で無効
+            **options: create_server に渡す取得設定（years / indicators / fetch_mode など）
+        """
+        server, service = self.create_server(host=host, port=port, **options)
+        stop = threading.Event()
+        if refresh_interval > 0:
+            threading.Thread(
+                target=service.refresh_periodically, args=(refresh_interval, stop),
+                name='allinn-refresh-timer', daemon=True
+            ).start()
+
+        address, bound_port = server.server_address[:2]
+        self.logger.info(f"Serving on http://{address}:{bound_port} (refresh every {refresh_interval:g}s)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.logger.info("Shutting down")
+        finally:
+            stop.set()
+            server.server_close()
@@ -6,263 +6,622 @@ Usage via CLI:
 """
 
 import json
+import logging
+import math
+import re
+import tempfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
 import os
 
+import numpy as np
 import pandas as pd
 import requests
-from dotenv import load_dotenv
 
+from ..core.aggregates import DEFAULT_TOP_N, AggregateStore
 from ..core.base_command import BaseCommand
+from ..core.cache import DEFAULT_TTL_DAYS, StatsCache, StatsRow
+from ..core.env import load_env, resolve_api_key
+from ..core.http import Deadline, RateLimiter, RetryableError, RetryPolicy, check_estat_result, create_session
+from ..core.indicators import (
+    Indicator,
+    evaluate_derived,
+    group_by_table,
+    output_dtype,
+    parse_indicators,
+    resolve_indicators,
+)
+from ..core.json_stream import StatsDataStream
+from ..core.mesh import PointGrid, catchment_columns, load_mesh_grid, parse_radii
+from ..core.metrics import Metrics
+from ..core.municipality_index import (
+    INDEX_STATS_DATA_ID,
+    SEED_INDEX_VERSION,
+    MunicipalityIndex,
+    Resolution,
+    build_index_entries,
+    generated_index_path,
+    load_municipality_index,
+    prefecture_codes,
+    write_index,
+)
+from ..core.output import FrameWriter, detect_format, split_outputs, write_frame
+from ..core.station_input import DEFAULT_CHUNK_SIZE, load_stations, read_station_chunks, route_mask
+from ..core.stats_store import StatsStore, widen_float32_columns
 
-# .env ファイルを読み込み
-load_dotenv()
+# e-Stat API の1リクエストあたりの最大セル数
+MAX_PAGE_SIZE = 100000
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 通信の再試行・タイムアウト
+DEFAULT_TIMEOUT = 30.0  # 1リクエストのタイムアウト（秒）
+DEFAULT_RETRIES = 4     # 一時的な失敗（接続エラー・5xx・e-Stat のサーバーエラー）の再試行回数
+
+# cdArea 指定取得（ターゲット取得）のパラメータ
+FETCH_MODES = ('auto', 'targeted', 'full')
+AREA_BATCH_SIZE = 100          # 1リクエストあたりの cdArea 指定数
+ESTIMATED_AREA_COUNT = 1900    # 全件取得時の推定地域数（都道府県・市区町村・政令市の区）
+REQUEST_OVERHEAD_CELLS = 1000  # 1リクエストの固定コストをセル数換算した値
+
+DEFAULT_YEAR = 2020  # 最新利用可能年
+TIMESERIES_LAYOUTS = ('long', 'wide')
+ESTAT_API_URL = "https://api.e-stat.go.jp/rest/3.0/app/json"
+CHANGE_COLUMNS = ('population_change', 'population_change_pct', 'density_change_pct')
+_YEAR_SUFFIX = re.compile(r'_\d{4}$')
+STATIONS_PATH = Path(__file__).parent.parent.parent / "inputs" / "shinkansen" / "shinkansen_stations.json"
+
+
+def year_to_time_code(year: int) -> str:
+    """西暦年を SSDS の時間軸コード（例: 2020 → 2020100000）に変換"""
+    return f"{int(year)}100000"
+
+
+def parse_years(years: Union[None, int, str, Iterable]) -> List[int]:
+    """--years の値（'2000,2005' / '2000-2020:5' / タプル等）を西暦年のリストに変換"""
+    if years is None or years == '':
+        return []
+    if isinstance(years, int):
+        return [years]
+    if isinstance(years, str):
+        parsed: List[int] = []
+        for part in years.split(','):
+            part = part.strip()
+            if '-' in part:
+                span, _, step = part.partition(':')
+                start, end = span.split('-')
+                parsed.extend(range(int(start), int(end) + 1, int(step or 1)))
+            elif part:
+                parsed.append(int(part))
+        return sorted(set(parsed))
+    return sorted({int(year) for year in years})
 
 
 class EStatAPIClient:
     """e-Stat API を使用して統計データを取得するクライアント"""
     
-    def __init__(self, api_key: str, sleep_time: float = 0.5):
+    def __init__(self,
+                 api_key: Optional[str],
+                 sleep_time: float = 0.5,
+                 stats_cache: Optional[StatsCache] = None,
+                 refresh: bool = False,
+                 offline: bool = False,
+                 concurrency: int = 4,
+                 page_size: int = MAX_PAGE_SIZE,
+                 prefetch_pages: int = 2,
+                 fetch_mode: str = 'auto',
+                 municipality_index: Optional[MunicipalityIndex] = None,
+                 years: Optional[Iterable[int]] = None,
+                 indicators: Union[None, str, Iterable[str]] = None,
+                 base_url: Optional[str] = None,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES,
+                 deadline: Optional[float] = None,
+                 check_updates: bool = False,
+                 fuzzy: bool = False,
+                 metrics: Optional[Metrics] = None):
+        if fetch_mode not in FETCH_MODES:
+            raise ValueError(f"fetch_mode must be one of {FETCH_MODES}, got {fetch_mode!r}")
         self.api_key = api_key
+        self.fetch_mode = fetch_mode
         self.sleep_time = sleep_time
+        self.concurrency = max(1, concurrency)
+        self.page_size = min(max(1, page_size), MAX_PAGE_SIZE)
+        self.prefetch_pages = max(1, prefetch_pages)  # 同時に先読みするページ数（テーブル単位）
+        self.session = create_session(pool_size=self.concurrency * (self.prefetch_pages + 1))
+        self.rate_limiter = RateLimiter(sleep_time)  # ホスト単位のリクエスト間隔制御
+        self.timeout = timeout
+        self.retry_policy = RetryPolicy(max_retries=retries)
+        self.deadline = Deadline(deadline)  # 実行全体の時間予算（None の場合は無制限）
+        # True の場合は getMetaInfo の UPDATED_DATE を確認し、更新された統計表のみ再取得する
+        self.check_updates = check_updates
+        self.stale_tables: Set[str] = set()    # 前回取得時から更新された統計表
+        self.changed_areas: Set[str] = set()   # 前回取得時から値が変わった地域コード
+        self._new_versions: Dict[str, str] = {}
+        self.table_versions: Dict[str, str] = {}  # 確認できた統計表の現在の更新日（キャッシュ項目の版として使う）
+        self._index_checked = False
+        self.stats_cache = stats_cache  # 永続キャッシュ（None の場合は無効）
+        self.refresh = refresh          # True の場合はキャッシュを無視して再取得
+        self.offline = offline          # True の場合はネットワークアクセスしない
+        # 自治体コードインデックス（キャッシュディレクトリに生成済みのものがあれば優先）
+        self.index_dir = str(stats_cache.cache_dir) if stats_cache is not None else None
+        self.municipality_index = municipality_index or load_municipality_index(cache_dir=self.index_dir)
+        self.fuzzy = fuzzy              # True の場合は自治体名の前方一致・あいまい一致も行う
+        self.metrics = metrics or Metrics()  # 取得・パースの所要時間と転送量
         self.cache: Dict[str, Optional[Tuple[float, float, float]]] = {}
-        self.all_data_cache: Optional[Dict[str, Dict[str, float]]] = None  # 全国データキャッシュ
-        self.base_url = "https://api.e-stat.go.jp/rest/3.0/app/json"
+        self.store: Optional[StatsStore] = None  # 全国（または取得地域）データ（地域 × 指標 × 年の配列）
+        self._latest_frame: Optional[pd.DataFrame] = None
+        # 接続先（ミラーやローカルの代替サーバーは base_url または環境変数 ESTAT_API_URL で指定）
+        load_env()
+        self.base_url = (base_url or os.getenv('ESTAT_API_URL') or ESTAT_API_URL).rstrip('/')
+        
+        # SSDS 基礎データ（社会・人口統計体系 市区町村データ）の取得指標
+        # 総人口（A1101）・総面積（B1101）は常に含め、統計表ごとに cdCat01 をまとめて取得する
+        self.indicators: List[Indicator] = resolve_indicators(parse_indicators(indicators))
+        self.columns = [indicator.column for indicator in self.indicators]
         
-        # SSDS 基礎データ（社会・人口統計体系 市区町村データ）
-        self.population_stats_id = "0000020201"  # 人口データ
-        self.area_stats_id = "0000020102"        # 面積データ
-        self.population_indicator = "A1101"      # 総人口（人）
-        self.area_indicator = "B1101"            # 総面積（km²）
-        self.time_code = "2020100000"  # 2020年データ（最新利用可能）
+        # 取得年（複数年は cdTime をカンマ区切りにして1リクエストで取得）
+        self.years = sorted({int(year) for year in years}) if years else [DEFAULT_YEAR]
+        self.time_codes = [year_to_time_code(year) for year in self.years]
+        self.time_code = ",".join(self.time_codes)
         
-    def _get_municipality_code(self, municipality: str, _: str) -> Optional[str]:
+    def _get_municipality_code(self, municipality: str, prefecture: str) -> Optional[str]:
         """自治体名から統計コードを取得"""
-        # 簡易的なマッピング（実際にはより包括的な辞書が必要）
-        municipality_codes = {
-            # 東京都特別区
-            "千代田区": "13101",
-            "台東区": "13106",
-            "港区": "13103",
+        return self.municipality_index.lookup(municipality, prefecture, fuzzy=self.fuzzy)
+    
+    def fetch_meta_info(self, stats_data_id: str) -> Dict:
+        """getMetaInfo で統計表のメタ情報（分類コード一覧）を取得"""
+        if self.offline:
+            raise RuntimeError(f"Offline mode: cannot fetch meta info for {stats_data_id}")
+        url = f"{self.base_url}/getMetaInfo"
+        
+        def request() -> Dict:
+            self.rate_limiter.wait(url)
+            response = self.session.get(
+                url,
+                params={"appId": self.api_key, "statsDataId": stats_data_id},
+                timeout=self.deadline.timeout(self.timeout)
+            )
+            response.raise_for_status()
+            meta_info = response.json()
+            check_estat_result(meta_info.get("GET_META_INFO", {}).get("RESULT"))
+            return meta_info
+        
+        return self.retry_policy.call(request, deadline=self.deadline, description=f"getMetaInfo {stats_data_id}")
+    
+    def build_municipality_index(self, path: Union[str, Path], stats_data_id: str = INDEX_STATS_DATA_ID) -> int:
+        """getMetaInfo の地域分類から全自治体のインデックスを生成して path に書き出し、件数を返す"""
+        entries = build_index_entries(self.fetch_meta_info(stats_data_id))
+        write_index(entries, path, source=f"e-Stat getMetaInfo statsDataId={stats_data_id}")
+        return len(entries)
+    
+    def ensure_municipality_index(self, logger) -> None:
+        """同梱のシード版（駅の自治体のみ）を使っている場合、初回に全自治体のインデックスを生成して切り替える
+
+        生成先はキャッシュディレクトリで、次回以降の実行はそれを読み込む。オフライン時や生成に失敗した
+        場合はシード版のまま続行する。
+        """
+        if self.municipality_index.version != SEED_INDEX_VERSION or self._index_checked:
+            return
+        self._index_checked = True
+        path = generated_index_path(self.index_dir)
+        if not path.exists():
+            if self.offline or not self.api_key:
+                logger.warning(
+                    f"Using the bundled seed municipality index ({len(self.municipality_index)} municipalities); "
+                    f"run `allinn build-index` to resolve every municipality"
+                )
+                return
+            try:
+                count = self.build_municipality_index(path)
+            except Exception as e:
+                logger.warning(f"Could not build the municipality index, using the bundled seed index: {e}")
+                return
+            logger.info(f"Built municipality index with {count} municipalities: {path}")
+        self.municipality_index = load_municipality_index(str(path))
+    
+    def fetch_updated_date(self, stats_data_id: str) -> Optional[str]:
+        """統計表の更新日（getMetaInfo の TABLE_INF.UPDATED_DATE）を取得"""
+        table_inf = self.fetch_meta_info(stats_data_id)["GET_META_INFO"]["METADATA_INF"].get("TABLE_INF", {})
+        return table_inf.get("UPDATED_DATE") or table_inf.get("LAST_UPDATE")
+    
+    def _check_table_updates(self, stats_data_ids: Iterable[str], logger) -> None:
+        """統計表ごとに更新日を前回取得時と比較する
+
+        未更新の統計表は同じ更新日で取得したキャッシュだけ有効期限を延長し、更新された（または未記録の）
+        統計表はキャッシュと取得途中のページを使わずに再取得する。更新日を確認できない場合は通常の
+        有効期限に従う。更新日を確認できた統計表では、別の更新日で取得したキャッシュは使わない
+        （一部の年だけ再取得した後に、他の年の古い値が有効期限の延長で復活しないようにする）。
+        """
+        for stats_data_id in stats_data_ids:
+            try:
+                updated_date = self.fetch_updated_date(stats_data_id)
+            except Exception as e:
+                logger.warning(f"Could not check UPDATED_DATE of {stats_data_id}, using cache TTL: {e}")
+                continue
+            if not updated_date:
+                continue
+            self.table_versions[stats_data_id] = updated_date
+            known = self.stats_cache.get_version(stats_data_id)
+            if known == updated_date:
+                renewed = self.stats_cache.renew(stats_data_id, updated_date)
+                logger.info(f"{stats_data_id} unchanged since {updated_date} ({renewed} cached entries kept)")
+            else:
+                logger.info(f"{stats_data_id} updated: {known or 'not recorded'} -> {updated_date}")
+                self.stale_tables.add(stats_data_id)
+                self._new_versions[stats_data_id] = updated_date
+                self.stats_cache.clear_table_pages(stats_data_id)
+    
+    def _record_changes(self,
+                        stats_data_id: str,
+                        indicators: List[str],
+                        area_codes: Optional[List[str]],
+                        rows: List[StatsRow]) -> None:
+        """再取得した行を前回のキャッシュと比較し、値が変わった地域コードを記録"""
+        previous: Dict[Tuple[str, str, str], Optional[float]] = {}
+        for indicator in indicators:
+            key = StatsCache.make_key(stats_data_id, indicator, self.time_code, area_codes)
+            cached = self.stats_cache.get(key, record=False, ignore_ttl=True)
+            if cached is None and area_codes:
+                full_key = StatsCache.make_key(stats_data_id, indicator, self.time_code)
+                cached = self.stats_cache.get(full_key, area_codes=area_codes, record=False, ignore_ttl=True)
+            for area_code, cat01, time_code, value in cached or ():
+                previous[(area_code, cat01, time_code)] = value
+        if not previous:
+            return
+        current = {(area_code, cat01, time_code): value for area_code, cat01, time_code, value in rows}
+        self.changed_areas.update(
+            key[0] for key in previous.keys() | current.keys() if previous.get(key) != current.get(key)
+        )
+    
+    def _parse_values(self, items: Iterable[Dict], indicator: Optional[str]) -> List[StatsRow]:
+        """getStatsData の VALUE 要素を (地域コード, 指標, 時点, 値) の行に変換
+
+        indicator は @cat01 が省略された場合の指標コード（単一指標の取得時のみ）。
+        """
+        rows: List[StatsRow] = []
+        for item in items:
+            if not isinstance(item, dict):
+                continue
             
-            # 政令指定都市（例）
-            "横浜市": "14100",
-            "大阪市": "27100",
-            "名古屋市": "23100",
-            "京都市": "26100",
-            "神戸市": "28100",
-            "福岡市": "40130",
-            "さいたま市": "11100",
-            "仙台市": "04100",
-            "広島市": "34100",
-            "北九州市": "40100",
+            area_code = item.get("@area")
+            value_str = item.get("$", "")
             
-            # その他の市町村（一部例）
-            "小田原市": "14205",
-            "熱海市": "22205",
-            "三島市": "22206",
-            "富士市": "22210",
-            "静岡市": "22100",
-            "掛川市": "22213",
-            "浜松市": "22130",
-            "豊橋市": "23201",
-            "安城市": "23212",
-            "羽島市": "21207",
-            "米原市": "25213",
-            "明石市": "28204",
-            "姫路市": "28201",
-            "相生市": "28202",
-            "岡山市": "33100",
-            "倉敷市": "33202",
-            "福山市": "34207",
-            "尾道市": "34205",
-            "三原市": "34204",
-            "東広島市": "34212",
-            "岩国市": "35203",
-            "周南市": "35216",
-            "山口市": "35201",
-            "山陽小野田市": "35220",
-            "下関市": "35201",
-            "鳥栖市": "41205",
-            "久留米市": "40203",
-            "筑後市": "40210",
-            "大牟田市": "40202",
-            "玉名市": "43206",
-            "熊本市": "43100",
-            "八代市": "43202",
-            "水俣市": "43205",
-            "出水市": "46203",
-            "薩摩川内市": "46215",
-            "鹿児島市": "46201",
+            cat01 = item.get("@cat01", indicator)
+            if not area_code or not cat01:
+                continue
             
-            # 北海道・東北
-            "青森市": "02201",
-            "八戸市": "02203",
-            "盛岡市": "03201",
-            "仙台市": "04100",
-            "秋田市": "05201",
-            "山形市": "06201",
-            "福島市": "07201",
-            "郡山市": "07203",
-            "白河市": "07205",
+            try:
+                value = float(value_str) if value_str and value_str != "-" and value_str.strip() else None
+            except (ValueError, TypeError):
+                value = None
             
-            # 関東
-            "宇都宮市": "09201",
-            "小山市": "09203",
-            "那須塩原市": "09213",
-            "熊谷市": "11202",
-            "本庄市": "11206",
-            "高崎市": "10202",
-            "安中市": "10206",
-            "新潟市": "15100",
-            "長岡市": "15202",
-            "三条市": "15204",
-            "南魚沼市": "15226",
-            "上越市": "15222",
-            "糸魚川市": "15216",
+            rows.append((area_code, cat01, item.get("@time", self.time_codes[-1]), value))
+        return rows
+    
+    def _request_page(self, params: Dict, start_position: int) -> requests.Response:
+        """1ページ分のリクエストを発行（本文はストリームで後から読む）"""
+        url = f"{self.base_url}/getStatsData"
+        self.rate_limiter.wait(url)
+        response = self.session.get(
+            url,
+            params={**params, "startPosition": start_position},
+            timeout=self.deadline.timeout(self.timeout),
+            stream=True
+        )
+        response.raise_for_status()
+        return response
+    
+    def _parse_page(self, response: requests.Response, indicator: Optional[str]) -> Tuple[List[StatsRow], Dict]:
+        """レスポンス本文を逐次パースし、行と RESULT_INF を返す
+
+        e-Stat の RESULT.STATUS がエラーの場合、または本文が途中で切れている場合は例外を送出する。
+        """
+        received = 0
+        
+        def count(items: Iterable[Dict]) -> Iterable[Dict]:
+            nonlocal received
+            for item in items:
+                received += 1
+                yield item
+        
+        with self.metrics.span('parse'), response:
+            stream = StatsDataStream(response.iter_content(chunk_size=STREAM_CHUNK_SIZE))
+            rows = self._parse_values(count(stream.values()), indicator)
+            # 圧縮された転送量（urllib3 が読み込んだバイト数）
+            self.metrics.incr('bytes_downloaded', response.raw.tell() if hasattr(response.raw, 'tell') else 0)
+        self.metrics.incr('pages_fetched')
+        self.metrics.incr('cells_parsed', received)
+        check_estat_result(stream.result)
+        result_inf = stream.result_inf or {}
+        if "TO_NUMBER" in result_inf:
+            expected = int(result_inf["TO_NUMBER"]) - int(result_inf["FROM_NUMBER"]) + 1
+            if received != expected:
+                raise RetryableError(f"Truncated page: received {received} of {expected} values")
+        return rows, result_inf
+    
+    def _fetch_page(self, params: Dict, start_position: int, indicator: Optional[str], logger) -> Tuple[List[StatsRow], Dict]:
+        """1ページを取得・パース（一時的な失敗はバックオフ付きで再試行）"""
+        return self.retry_policy.call(
+            lambda: self._parse_page(self._request_page(params, start_position), indicator),
+            deadline=self.deadline,
+            description=f"{params['statsDataId']} page {start_position}",
+            logger=logger
+        )
+    
+    def _download_table(self,
+                        params: Dict,
+                        indicator: Optional[str],
+                        logger,
+                        checkpoint_key: Optional[str] = None) -> List[StatsRow]:
+        """NEXT_KEY を辿って全ページを取得（後続ページは先読みパイプラインで並行取得）
+
+        checkpoint_key を指定した場合は取得済みページを永続キャッシュに記録し、
+        中断した取得を次回の実行で途中から再開する。
+        """
+        checkpoints = self.stats_cache if checkpoint_key and self.stats_cache is not None else None
+        resumable = checkpoints and not self.refresh and params["statsDataId"] not in self.stale_tables
+        resumed = checkpoints.load_pages(checkpoint_key) if resumable else None
+        if resumed is not None:
+            rows, next_key, total = resumed
+            logger.info(f"Resuming {checkpoint_key} from position {next_key} ({len(rows)} cells checkpointed)")
+        else:
+            rows, result_inf = self._fetch_page(params, 1, indicator, logger)
+            next_key = result_inf.get("NEXT_KEY")
+            if not next_key:
+                return rows
+            total = int(result_inf.get("TOTAL_NUMBER", 0))
+            if checkpoints:
+                checkpoints.save_page(checkpoint_key, 1, int(next_key), total, rows)
+        if not next_key:
+            return rows
+        
+        logger.debug("Paginating %s: %d cells, %d per page", params['statsDataId'], total, self.page_size)
+        
+        planned = iter(range(int(next_key), total + 1, self.page_size))
+        pending: Deque[Tuple[int, Future]] = deque()
+        with ThreadPoolExecutor(max_workers=self.prefetch_pages) as executor:
+            def schedule() -> None:
+                start = next(planned, None)
+                if start is not None:
+                    pending.append((start, executor.submit(self._fetch_page, params, start, indicator, logger)))
             
-            # 中部・北陸
-            "長野市": "20201",
-            "上田市": "20203",
-            "佐久市": "20217",
-            "飯山市": "20212",
-            "富山市": "16201",
-            "高岡市": "16202",
-            "黒部市": "16205",
-            "金沢市": "17201",
+            for _ in range(self.prefetch_pages):
+                schedule()
             
-            # 町村の例
-            "湯沢町": "15482",
-            "みなかみ町": "10449",
-            "軽井沢町": "20321",
-            "今別町": "02323",
-            "木古内町": "01334",
-            "北斗市": "01234",
-            "高畠町": "06382",
-            "南陽市": "06212",
-            "上山市": "06204",
-            "天童市": "06205",
-            "東根市": "06207",
-            "村山市": "06208",
-            "新庄市": "06210",
-            "大石田町": "06428",
-            "米沢市": "06202",
-            "雫石町": "03366",
-            "仙北市": "05215",
-            "大仙市": "05213",
-            "一関市": "03209",
-            "奥州市": "03215",
-            "北上市": "03205",
-            "花巻市": "03203",
-            "岩手町": "03367",
-            "二戸市": "03207",
-            "七戸町": "02403",
-            "白石市": "04205",
-            "大崎市": "04215",
-            "栗原市": "04213"
+            try:
+                while next_key:
+                    start = int(next_key)
+                    if pending and pending[0][0] == start:
+                        _, future = pending.popleft()
+                        schedule()
+                        page_rows, result_inf = future.result()
+                    else:
+                        # 想定外の NEXT_KEY の場合は逐次取得にフォールバック
+                        page_rows, result_inf = self._fetch_page(params, start, indicator, logger)
+                    rows.extend(page_rows)
+                    next_key = result_inf.get("NEXT_KEY")
+                    if checkpoints:
+                        checkpoints.save_page(checkpoint_key, start, int(next_key) if next_key else None,
+                                              total, page_rows)
+            finally:
+                for _, future in pending:
+                    future.cancel()
+        return rows
+    
+    def _cached_values(self,
+                       stats_data_id: str,
+                       indicator: str,
+                       logger,
+                       area_codes: Optional[List[str]] = None) -> Optional[List[StatsRow]]:
+        """永続キャッシュから1指標分の行を取得（無ければ None）"""
+        if self.stats_cache is None or self.refresh or stats_data_id in self.stale_tables:
+            return None
+        
+        full_key = StatsCache.make_key(stats_data_id, indicator, self.time_code)
+        cache_key = StatsCache.make_key(stats_data_id, indicator, self.time_code, area_codes)
+        version = self.table_versions.get(stats_data_id)
+        if area_codes:
+            # 全件取得済みのキャッシュがあればそこから切り出す
+            rows = self.stats_cache.get(full_key, area_codes=area_codes, record=False, version=version)
+            if rows is not None:
+                self.stats_cache.hits += 1
+                logger.debug("Cache hit for %s (served from %s)", cache_key, full_key)
+                return rows
+        rows = self.stats_cache.get(cache_key, version=version)
+        if rows is not None:
+            logger.debug("Cache hit for %s", cache_key)
+        return rows
+    
+    def _fetch_stats_values(self,
+                            stats_data_id: str,
+                            indicators: List[str],
+                            logger,
+                            area_codes: Optional[List[str]] = None) -> List[StatsRow]:
+        """統計表から指標群を取得（永続キャッシュがあればそちらを利用）
+
+        キャッシュに無い指標のみを cdCat01 にまとめて1回で取得し、指標ごとにキャッシュする。
+        area_codes を指定した場合は cdArea で対象地域のみを取得する。
+        """
+        rows: List[StatsRow] = []
+        missing: List[str] = []
+        for indicator in indicators:
+            cached = self._cached_values(stats_data_id, indicator, logger, area_codes)
+            if cached is None:
+                missing.append(indicator)
+            else:
+                rows.extend(cached)
+        if not missing:
+            return rows
+        
+        request_key = StatsCache.make_key(stats_data_id, ",".join(missing), self.time_code, area_codes)
+        if self.offline:
+            raise RuntimeError(f"Offline mode: no cached data for {request_key}")
+        
+        logger.debug("Fetching %s from e-Stat API...", request_key)
+        params = {
+            "appId": self.api_key,
+            "statsDataId": stats_data_id,
+            "cdCat01": ",".join(missing),
+            "cdTime": self.time_code,
+            "limit": self.page_size
         }
+        if area_codes:
+            params["cdArea"] = ",".join(area_codes)
+        fetched = self._download_table(
+            params, missing[0] if len(missing) == 1 else None, logger, checkpoint_key=request_key
+        )
         
-        return municipality_codes.get(municipality)
+        if self.stats_cache is not None:
+            if stats_data_id in self.stale_tables:
+                self._record_changes(stats_data_id, missing, area_codes, fetched)
+            for indicator in missing:
+                self.stats_cache.put(
+                    StatsCache.make_key(stats_data_id, indicator, self.time_code, area_codes),
+                    [row for row in fetched if row[1] == indicator],
+                    version=self.table_versions.get(stats_data_id)
+                )
+            self.stats_cache.clear_pages(request_key)
+        return rows + fetched
     
-    def _fetch_all_data(self, logger) -> bool:
-        """全国の統計データを一度に取得してキャッシュ"""
-        if self.all_data_cache is not None:
-            return True
-            
-        logger.info("Fetching all municipality data from e-Stat API...")
+    def _plan_area_batches(self, area_codes: Optional[Iterable[str]], logger) -> List[Optional[List[str]]]:
+        """取得方式（cdArea 指定 or 全件）を決定し、リクエスト単位の地域コードリストを返す
+
+        全件取得の場合は [None] を返す。auto モードでは推定セル数とリクエスト数から
+        転送コストを見積もり、小さい方を選ぶ。
+        """
+        if area_codes is None or self.fetch_mode == 'full':
+            return [None]
         
-        try:
-            # 人口データを取得
-            logger.debug("Fetching population data...")
-            population_params = {
-                "appId": self.api_key,
-                "statsDataId": self.population_stats_id,
-                "cdCat01": self.population_indicator,
-                "cdTime": self.time_code,
-                "limit": 100000
-            }
-            
-            population_response = requests.get(f"{self.base_url}/getStatsData", params=population_params, timeout=30)
-            population_response.raise_for_status()
-            population_data = population_response.json()
+        codes = sorted(set(area_codes))
+        if not codes:
+            return [None]
+        batches = [codes[i:i + AREA_BATCH_SIZE] for i in range(0, len(codes), AREA_BATCH_SIZE)]
+        
+        if self.fetch_mode == 'auto':
+            codes_per_table = max(len(codes) for codes in group_by_table(self.indicators).values())
+            cells_per_area = len(self.time_codes) * codes_per_table
+            targeted_requests = sum(-(-len(batch) * cells_per_area // self.page_size) for batch in batches)
+            targeted_cost = len(codes) * cells_per_area + targeted_requests * REQUEST_OVERHEAD_CELLS
+            full_cells = ESTIMATED_AREA_COUNT * cells_per_area
+            full_requests = -(-full_cells // self.page_size)
+            full_cost = full_cells + full_requests * REQUEST_OVERHEAD_CELLS
+            if targeted_cost >= full_cost:
+                logger.info(f"Using full-table fetch ({len(codes)} areas requested)")
+                return [None]
+        
+        logger.info(f"Using targeted fetch for {len(codes)} areas in {len(batches)} cdArea batch(es)")
+        return batches
+    
+    def load_store(self, store: StatsStore) -> None:
+        """取得済みの StatsStore（メモリマップ可）を読み込む"""
+        self.store = store
+        self._latest_frame = None
+    
+    def get_values(self, area_codes: Iterable[Optional[str]], year: Optional[int] = None) -> pd.DataFrame:
+        """地域コードごとの指標値を返す（行は area_codes と同順、未取得の地域は NaN）"""
+        target = year if year is not None else self.years[-1]
+        codes = [indicator.code for indicator in self.indicators]
+        if self.store is None:
+            values = np.full((len(list(area_codes)), len(codes)), np.nan)
+        else:
+            values = self.store.take(area_codes, codes, [target])[:, :, 0]
+        return pd.DataFrame(values, columns=self.columns)
+    
+    def get_timeseries_values(self, area_codes: Iterable[Optional[str]]) -> np.ndarray:
+        """地域コードごとの全取得年の指標値を (地域, 年, 指標) の配列で返す"""
+        area_codes = list(area_codes)
+        if self.store is None:
+            return np.full((len(area_codes), len(self.years), len(self.indicators)), np.nan)
+        codes = [indicator.code for indicator in self.indicators]
+        return self.store.take(area_codes, codes, self.years).transpose(0, 2, 1)
+    
+    def get_population_frame(self, year: Optional[int] = None) -> pd.DataFrame:
+        """指定年（省略時は最新の取得年）のデータを指標列（population / area_km2 など）の DataFrame（地域コード索引）で返す"""
+        if self.store is None:
+            return pd.DataFrame(columns=self.columns, dtype='float64')
+        if year is None and self._latest_frame is not None:
+            return self._latest_frame
+        area_codes = self.store.area_code_strings()
+        frame = self.get_values(area_codes, year).set_axis(pd.Index(area_codes, name='area_code'))
+        if year is None:
+            self._latest_frame = frame
+        return frame
+    
+    def get_population_timeseries(self) -> pd.DataFrame:
+        """全取得年のデータを (地域コード, 年) 索引の DataFrame で返す"""
+        area_codes = self.store.area_code_strings() if self.store is not None else []
+        values = self.get_timeseries_values(area_codes)
+        index = pd.MultiIndex.from_product([area_codes, self.years], names=['area_code', 'year'])
+        return pd.DataFrame(values.reshape(-1, len(self.columns)), index=index, columns=self.columns)
+    
+    def _fetch_all_data(self, logger, area_codes: Optional[Iterable[str]] = None) -> bool:
+        """全国（または指定地域）の統計データを一度に取得してキャッシュ"""
+        if self.store is not None:
+            return True
             
-            # 面積データを取得
-            logger.debug("Fetching area data...")
-            area_params = {
-                "appId": self.api_key,
-                "statsDataId": self.area_stats_id,
-                "cdCat01": self.area_indicator,
-                "cdTime": self.time_code,
-                "limit": 100000
-            }
+        with self.metrics.span('fetch'):
+            logger.info("Fetching municipality data from e-Stat API...")
             
-            area_response = requests.get(f"{self.base_url}/getStatsData", params=area_params, timeout=30)
-            area_response.raise_for_status()
-            area_data = area_response.json()
+            # 統計表ごとに（地域バッチごとに）並列に取得
+            tables = group_by_table(self.indicators)
+            if self.check_updates and self.stats_cache is not None and not (self.refresh or self.offline):
+                self._check_table_updates(tables, logger)
+            batches = self._plan_area_batches(area_codes, logger)
+            tasks = [(table, batch) for table in tables.items() for batch in batches]
+            results: List[List[StatsRow]] = []
+            failures = 0
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(tasks))) as executor:
+                futures = [
+                    executor.submit(self._fetch_stats_values, stats_data_id, codes, logger, batch)
+                    for (stats_data_id, codes), batch in tasks
+                ]
+                # 失敗したリクエストがあっても他のリクエストは最後まで取得してキャッシュする
+                for ((stats_data_id, codes), _), future in zip(tasks, futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        failures += 1
+                        logger.error(f"Error fetching {stats_data_id} ({','.join(codes)}) from e-Stat API: {e}")
             
-            # データを整理
-            self.all_data_cache = {}
+            if failures:
+                if self.stats_cache is not None:
+                    logger.error(
+                        f"{failures}/{len(tasks)} requests failed; completed tables and pages are cached "
+                        "and the next run resumes from there"
+                    )
+                return False
             
-            # 人口データを処理
-            pop_stats_data = population_data["GET_STATS_DATA"]["STATISTICAL_DATA"]["DATA_INF"]["VALUE"]
-            for item in pop_stats_data:
-                if not isinstance(item, dict):
-                    continue
-                
-                area_code = item.get("@area")
-                value_str = item.get("$", "")
-                
-                if not area_code:
-                    continue
-                
-                try:
-                    value = float(value_str) if value_str and value_str != "-" and value_str.strip() else None
-                except (ValueError, TypeError):
-                    value = None
-                
-                if area_code not in self.all_data_cache:
-                    self.all_data_cache[area_code] = {}
-                
-                if value is not None:
-                    self.all_data_cache[area_code]["A1101"] = value
+            # 取得が完了した統計表の更新日を記録
+            for stats_data_id, updated_date in self._new_versions.items():
+                self.stats_cache.set_version(stats_data_id, updated_date)
+            if self.check_updates and self.stale_tables:
+                logger.info(f"Values changed for {len(self.changed_areas)} areas since the last fetch")
             
-            # 面積データを処理
-            area_stats_data = area_data["GET_STATS_DATA"]["STATISTICAL_DATA"]["DATA_INF"]["VALUE"]
-            for item in area_stats_data:
-                if not isinstance(item, dict):
-                    continue
-                
-                area_code = item.get("@area")
-                value_str = item.get("$", "")
-                
-                if not area_code:
-                    continue
-                
-                try:
-                    value = float(value_str) if value_str and value_str != "-" and value_str.strip() else None
-                except (ValueError, TypeError):
-                    value = None
-                
-                if area_code not in self.all_data_cache:
-                    self.all_data_cache[area_code] = {}
-                
-                if value is not None:
-                    self.all_data_cache[area_code]["B1101"] = value
+            # 地域 × 指標 × 年の配列に整理
+            self.store = StatsStore.from_rows(
+                (row for rows in results for row in rows),
+                [indicator.code for indicator in self.indicators],
+                self.years
+            )
             
-            logger.info(f"Cached data for {len(self.all_data_cache)} municipalities")
+            self._latest_frame = None
+            logger.info(
+                f"Cached data for {len(self.store)} municipalities ({len(self.years)} year(s), "
+                f"{self.store.nbytes / 1024:.0f} KiB)"
+            )
+            self.metrics.gauge('municipalities', len(self.store))
+            if self.stats_cache is not None:
+                logger.info(f"Persistent cache: {self.stats_cache.stats()}")
+                self.metrics.gauge('cache_hits', self.stats_cache.hits)
+                self.metrics.gauge('cache_misses', self.stats_cache.misses)
             
             # デバッグ: いくつかのサンプルデータを表示
-            if self.all_data_cache:
-                sample_code = list(self.all_data_cache.keys())[0]
-                sample_data = self.all_data_cache[sample_code]
-                logger.debug(f"Sample data for {sample_code}: {sample_data}")
+            if len(self.store) and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Sample data: %s", dict(zip(self.store.indicators, self.store.values[0, :, -1].tolist())))
             
             return True
-            
-        except Exception as e:
-            logger.error(f"Error fetching all data from e-Stat API: {e}")
-            return False
     
     def get_population_data(self, municipality: str, prefecture: str, logger) -> Optional[Tuple[float, float, float]]:
         """自治体の人口、面積、人口密度を取得"""
@@ -286,33 +645,37 @@ class EStatAPIClient:
         # 市区町村コードはそのまま使用（APIデータは5桁形式）
         area_code = municipality_code
         
-        logger.debug(f"Looking for data for {municipality} with area code: {area_code}")
+        logger.debug("Looking for data for %s with area code: %s", municipality, area_code)
         
         
-        # キャッシュからデータを取得
-        if area_code not in self.all_data_cache:
+        # キャッシュからデータを取得（最新の取得年）
+        frame = self.get_population_frame()
+        if area_code not in frame.index:
             logger.warning(f"No data found for {municipality} (area code: {area_code}) in cached data")
             self.cache[cache_key] = None
             return None
         
-        area_data = self.all_data_cache[area_code]
+        area_data = frame.loc[area_code].dropna()
         
-        population = area_data.get("A1101")
-        area = area_data.get("B1101")
+        population = area_data.get('population')
+        area = area_data.get('area_km2')
         
         # 人口密度を計算
         density = None
         if population is not None and area is not None and area > 0:
             density = population / area
-            logger.debug(f"Calculated density for {municipality}: {density}")
+            logger.debug("Calculated density for %s: %s", municipality, density)
         
         # 最低限人口データがあれば成功とする
         if population is not None:
             result = (population, area, density)
             self.cache[cache_key] = result
-            area_str = f"{area:.2f}km²" if area else "N/A"
-            density_str = f"{density:.1f}people/km²" if density else "N/A"
-            logger.info(f"Found data for {municipality}: population={population:,.0f}, area={area_str}, density={density_str}")
+            # 駅ごとに呼ばれるため DEBUG 以外では文字列を組み立てない
+            if logger.isEnabledFor(logging.DEBUG):
+                area_str = f"{area:.2f}km²" if area else "N/A"
+                density_str = f"{density:.1f}people/km²" if density else "N/A"
+                logger.debug("Found data for %s: population=%s, area=%s, density=%s",
+                             municipality, f"{population:,.0f}", area_str, density_str)
             return result
         
         logger.warning(f"Could not extract population data for {municipality}, {prefecture}")
@@ -334,7 +697,7 @@ class ShinkansenCommand(BaseCommand):
     
     def _load_station_data(self) -> List[Dict]:
         """駅データをJSONファイルから読み込み"""
-        json_path = Path(__file__).parent.parent.parent / "inputs" / "shinkansen" / "shinkansen_stations.json"
+        json_path = STATIONS_PATH
         try:
             with open(json_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
@@ -343,123 +706,744 @@ class ShinkansenCommand(BaseCommand):
             raise
     
     def _filter_by_routes(self, data: List[Dict], route_filters: Optional[List[str]]) -> List[Dict]:
-        """指定された路線でフィルタリング"""
+        """指定された路線でフィルタリング（路線名の部分一致、大文字小文字を区別しない）"""
         if not route_filters:
             return data
         
-        filtered = []
-        for station in data:
-            for route_filter in route_filters:
-                if route_filter.lower() in station['route'].lower():
-                    filtered.append(station)
-                    break
+        mask = route_mask([station['route'] for station in data], route_filters)
+        return [station for station, keep in zip(data, mask) if keep]
+    
+    def _resolve_area_codes(self, stations: pd.DataFrame, client: EStatAPIClient) -> pd.Series:
+        """駅ごとの自治体コードを解決（名寄せはユニークな自治体単位で1回のみ）"""
+        pairs = stations[['municipality', 'prefecture']].drop_duplicates()
+        client.ensure_municipality_index(self.logger)
+        index = client.municipality_index
+        resolutions = index.resolve_many(pairs['municipality'].tolist(), pairs['prefecture'].tolist(), fuzzy=client.fuzzy)
+        pairs['area_code'] = [resolution.code for resolution in resolutions]
+        self._report_resolutions(pairs, resolutions, index)
+        return stations.merge(pairs, on=['municipality', 'prefecture'], how='left')['area_code']
+    
+    def _report_resolutions(self, pairs: pd.DataFrame, resolutions: List[Resolution], index: MunicipalityIndex) -> None:
+        """旧市町村名・前方一致・あいまい一致で解決した自治体と、曖昧・未解決の自治体をログ出力
+
+        前方一致・あいまい一致は別の自治体を取り違えるおそれがあるため、置き換えごとに警告する。
+        """
+        matched: Dict[str, str] = {}
+        ambiguous: Dict[str, List[str]] = {}
+        unresolved: List[str] = []
+        for (municipality, prefecture), resolution in zip(pairs[['municipality', 'prefecture']].itertuples(index=False), resolutions):
+            label = f"{prefecture or ''}{municipality}"
+            if resolution.method in ('alias', 'prefix', 'fuzzy'):
+                matched[label] = f"{index.describe(resolution.code)} [{resolution.method}]"
+                if resolution.method != 'alias':
+                    self.logger.warning(f"Substituted {label} with {matched[label]}")
+            elif resolution.ambiguous:
+                ambiguous[label] = [index.describe(code) for code in resolution.candidates]
+            elif resolution.code is None:
+                unresolved.append(municipality)
+        if matched:
+            self.logger.info(f"Resolved {len(matched)} municipalities by alias / prefix / fuzzy match: {matched}")
+        if ambiguous:
+            self.logger.warning(f"Ambiguous municipality names ({len(ambiguous)}), left unresolved: {ambiguous}")
+        if unresolved:
+            self.logger.warning(f"Municipality code not found for {len(unresolved)} municipalities: {unresolved}")
+        for name, values in (('names_matched_fuzzy', matched), ('names_ambiguous', ambiguous), ('names_unresolved', unresolved)):
+            if values:
+                self.metrics.incr(name, len(values))
+    
+    def _prepare_stations(self,
+                          station_data: Union[List[Dict], pd.DataFrame],
+                          client: EStatAPIClient,
+                          extra: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """駅 DataFrame を作成し、自治体コードを解決して必要な統計データを取得
+
+        extra は入力の行ごとの追加列（駅勢圏など）で、入力と同じ順に行を持つ。
+        """
+        with self.metrics.span('resolve'):
+            df = pd.DataFrame(station_data, columns=['route', 'station', 'municipality', 'prefecture'])
+            df['area_code'] = self._resolve_area_codes(df, client).to_numpy()
+            if extra is not None:
+                df = pd.concat([df, extra.set_axis(df.index)], axis=1)
+        
+        # 必要な自治体のデータをまとめて取得（取得方式は client.fetch_mode に従う）
+        # 取得に失敗した場合は欠損だらけの出力を書かずに終了する（再実行で途中から再開）
+        if not client._fetch_all_data(self.logger, area_codes=df['area_code'].dropna().unique()):
+            raise RuntimeError("Failed to fetch data from e-Stat API")
         
-        return filtered
+        if client.changed_areas:
+            changed = df.loc[df['area_code'].isin(client.changed_areas), 'municipality'].unique()
+            self.logger.info(f"Values changed since the last fetch for {len(changed)} station municipalities: {list(changed)}")
+        return df
     
-    def _create_csv(self, station_data: List[Dict], client: EStatAPIClient) -> pd.DataFrame:
-        """CSV データを作成"""
-        records = []
+    def _compute_derived(self, df: pd.DataFrame) -> None:
+        """人口が無い自治体は面積も欠損扱いとし、人口密度などの派生指標を計算（0 除算は欠損）"""
+        df.loc[df['population'].isna(), 'area_km2'] = float('nan')
+        evaluate_derived(df)
         
-        for station in station_data:
-            data = client.get_population_data(
-                station['municipality'], 
-                station['prefecture'],
-                self.logger
-            )
-            
-            population = None
-            area = None
-            density = None
-            
-            if data:
-                population, area, density = data
-            
-            records.append({
-                'route': station['route'],
-                'station': station['station'],
-                'municipality': station['municipality'],
-                'prefecture': station['prefecture'],
-                'population': population,
-                'area_km2': area,
-                'population_density_km2': density
-            })
-        
-        df = pd.DataFrame(records)
-        
-        # 路線別にランキングを付与（人口密度ベース）
-        df['rank_in_route'] = df.groupby('route')['population_density_km2'].rank(
+        missing = df.loc[df['area_code'].notna() & df['population'].isna(), 'municipality'].unique()
+        if len(missing):
+            self.logger.warning(f"No population data found for {len(missing)} municipalities: {list(missing)}")
+    
+    def _rank_in_route(self, df: pd.DataFrame, density_column: str, by: List[str]) -> pd.Series:
+        """路線別の人口密度ランキング"""
+        return df.groupby(by)[density_column].rank(
             method='dense', 
             ascending=False,
             na_option='bottom'
         ).astype('Int64')
+    
+    def _rank_placeholder(self, df: pd.DataFrame) -> pd.Series:
+        """ストリーミング処理用の空の順位列（全件を読み終えてから埋める）"""
+        return pd.Series(pd.NA, index=df.index, dtype='Int64')
+    
+    def _create_csv(self,
+                    station_data: Union[List[Dict], pd.DataFrame],
+                    client: EStatAPIClient,
+                    rank: bool = True,
+                    extra: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """CSV データを作成（駅 DataFrame と統計 DataFrame を結合して一括計算。rank=False では順位付け・並べ替えを省略）"""
+        df = self._prepare_stations(station_data, client, extra)
+        with self.metrics.span('join'):
+            df = pd.concat([df, client.get_values(df['area_code'])], axis=1)
+            self._compute_derived(df)
+            df = df.drop(columns='area_code')
+            if not rank:
+                df['rank_in_route'] = self._rank_placeholder(df)
+                return df
+            
+            # 路線別にランキングを付与（人口密度ベース）
+            df['rank_in_route'] = self._rank_in_route(df, 'population_density_km2', ['route'])
+            
+            # 路線内で人口密度順にソート
+            df = df.sort_values(['route', 'population_density_km2'], ascending=[True, False])
+        
+        return df
+    
+    def _create_timeseries(self,
+                           station_data: Union[List[Dict], pd.DataFrame],
+                           client: EStatAPIClient,
+                           layout: str = 'long',
+                           rank: bool = True,
+                           extra: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """複数年の時系列データを作成（long: 駅 × 年の行、wide: 駅ごとに年別の列）"""
+        if layout not in TIMESERIES_LAYOUTS:
+            raise ValueError(f"layout must be one of {TIMESERIES_LAYOUTS}, got {layout!r}")
+        
+        stations = self._prepare_stations(station_data, client, extra)
+        stations['station_id'] = range(len(stations))
+        with self.metrics.span('join'):
+            return self._join_timeseries(stations, client, layout, rank=rank)
+    
+    def _join_timeseries(self, stations: pd.DataFrame, client: EStatAPIClient, layout: str, rank: bool = True) -> pd.DataFrame:
+        """駅 DataFrame に全取得年の統計値を結合し、変化量・ランキングを付与（rank=False では入力順のまま）"""
+        # 駅 × 取得年の全組み合わせに統計値を結合（駅ごとに全年分を配列から一括参照）
+        values = client.get_timeseries_values(stations['area_code'])
+        df = stations.loc[stations.index.repeat(len(client.years))].reset_index(drop=True)
+        df['year'] = np.tile(client.years, len(stations))
+        df = pd.concat([df, pd.DataFrame(values.reshape(len(df), -1), columns=client.columns)], axis=1)
+        self._compute_derived(df)
+        
+        # 前回取得年からの変化（駅単位でベクトル演算）
+        df = df.sort_values(['station_id', 'year'])
+        grouped = df.groupby('station_id', sort=False)
+        df['population_change'] = grouped['population'].diff()
+        df['population_change_pct'] = grouped['population'].pct_change(fill_method=None) * 100
+        df['density_change_pct'] = grouped['population_density_km2'].pct_change(fill_method=None) * 100
+        
+        latest = client.years[-1]
+        if layout == 'long':
+            if not rank:
+                df['rank_in_route'] = self._rank_placeholder(df)
+                return df.drop(columns=['area_code', 'station_id'])
+            df['rank_in_route'] = self._rank_in_route(df, 'population_density_km2', ['route', 'year'])
+            df = df.drop(columns='area_code')
+            df = df.sort_values(['route', 'year', 'population_density_km2'], ascending=[True, True, False])
+            return df.drop(columns='station_id')
+        
+        values = [column for column in df.columns if column not in stations.columns and column != 'year']
+        wide = df.set_index(['station_id', 'year'])[values].unstack('year')
+        wide.columns = [f"{name}_{year}" for name, year in wide.columns]
+        # 初年は変化量が定義されないため除外
+        first = client.years[0]
+        wide = wide.drop(columns=[f"{name}_{first}" for name in CHANGE_COLUMNS])
         
-        # 路線内で人口密度順にソート
-        df = df.sort_values(['route', 'population_density_km2'], ascending=[True, False])
+        df = stations.drop(columns='area_code').join(wide, on='station_id')
+        if not rank:
+            df['rank_in_route'] = self._rank_placeholder(df)
+            return df.drop(columns='station_id')
+        density_column = f"population_density_km2_{latest}"
+        df['rank_in_route'] = self._rank_in_route(df, density_column, ['route'])
+        df = df.sort_values(['route', density_column], ascending=[True, False])
+        return df.drop(columns='station_id')
+    
+    def _apply_output_types(self, df: pd.DataFrame) -> pd.DataFrame:
+        """出力用に列の型を確定（人口・世帯数などは Int64、面積・比率は float32、路線・都道府県はカテゴリ）"""
+        types = {'route': 'category', 'prefecture': 'category'}
+        for column in df.columns:
+            if column == 'year':
+                types[column] = 'Int16'
+                continue
+            name = _YEAR_SUFFIX.sub('', column)
+            if name in CHANGE_COLUMNS:
+                dtype = 'Int64' if name == 'population_change' else 'float32'
+            elif name.startswith('catchment_'):
+                dtype = 'Int64' if name.startswith('catchment_population') else 'float32'
+            else:
+                dtype = output_dtype(name)
+            if dtype == 'Int64':
+                df[column] = df[column].round()
+            if dtype:
+                types[column] = dtype
+        return df.astype(types)
+    
+    def _write_outputs(self, df: pd.DataFrame, outputs: List[str]) -> None:
+        """出力先ごとに拡張子から形式を判定して書き出し"""
+        for path in outputs:
+            fmt = detect_format(path)
+            if fmt is None:
+                self.logger.warning(f"Unknown output extension for {path}, writing CSV")
+            with self.metrics.span('write', path=path):
+                write_frame(df, path, fmt)
+            self.logger.info(f"{(fmt or 'csv').upper()} saved to {path}")
+        self.metrics.incr('rows_written', len(df) * len(outputs))
+    
+    def _load_stations(self,
+                       route_filter: Optional[List[str]],
+                       stations: Optional[str] = None,
+                       stations_format: Optional[str] = None) -> List[Dict]:
+        """駅データを読み込み、路線でフィルタリング（stations 指定時はそのファイルを読み込みながら絞り込む）"""
+        if stations:
+            with self.metrics.span('load_stations'):
+                station_data = load_stations(stations, stations_format, route_filter)
+            suffix = f" for routes: {route_filter}" if route_filter else ''
+            self.logger.info(f"Loaded {len(station_data)} stations from {stations}{suffix}")
+            return station_data
+        
+        with self.metrics.span('load_stations'):
+            station_data = self._load_station_data()
+        self.logger.info(f"Loaded {len(station_data)} stations")
         
+        if route_filter:
+            station_data = self._filter_by_routes(station_data, route_filter)
+            self.logger.info(f"Filtered to {len(station_data)} stations for routes: {route_filter}")
+        return station_data
+    
+    def _catchment_values(self,
+                          station_data: Union[List[Dict], pd.DataFrame],
+                          grid: PointGrid,
+                          radii: List[float]) -> pd.DataFrame:
+        """入力の行ごとに、緯度経度から半径 N km 圏内のメッシュ人口と人口密度（円の面積あたり）を計算
+
+        同名の駅・地点が複数あっても行ごとに計算し、結果は入力と同じ順の行で返す。
+        """
+        coords = pd.DataFrame(station_data, columns=['station', 'lat', 'lon'])
+        lat = pd.to_numeric(coords['lat'], errors='coerce').to_numpy(dtype='float64')
+        lon = pd.to_numeric(coords['lon'], errors='coerce').to_numpy(dtype='float64')
+        located = ~(np.isnan(lat) | np.isnan(lon))
+        if not located.all():
+            missing = coords.loc[~located, 'station'].tolist()
+            self.logger.warning(f"No coordinates for {len(missing)} stations, catchment left empty: {missing[:20]}")
+        
+        values = pd.DataFrame(index=coords.index)
+        with self.metrics.span('catchment'):
+            for radius in radii:
+                population_column, density_column = catchment_columns(radius)
+                values[population_column] = grid.sum_within(lat, lon, radius)
+                values[density_column] = values[population_column] / (math.pi * radius ** 2)
+        outside = coords.loc[values[population_column].isna().to_numpy() & located, 'station']
+        if len(outside):
+            self.logger.warning(f"{len(outside)} stations are outside the mesh data, catchment left empty: {outside.tolist()[:20]}")
+        return values
+    
+    def _enrich(self,
+                station_data: Union[List[Dict], pd.DataFrame],
+                client: EStatAPIClient,
+                timeseries: bool,
+                layout: str,
+                catchment: Optional[Tuple[PointGrid, List[float]]] = None,
+                rank: bool = True) -> pd.DataFrame:
+        """駅データに統計値・派生指標・駅勢圏を付与（出力用の型変換前）"""
+        # 駅勢圏は入力の行ごとに計算して駅の列として結合する（時系列の各年の行にも同じ値が入る）
+        extra = self._catchment_values(station_data, *catchment) if catchment is not None else None
+        if timeseries:
+            df = self._create_timeseries(station_data, client, layout=layout, rank=rank, extra=extra)
+        else:
+            df = self._create_csv(station_data, client, rank=rank, extra=extra)
+        if extra is not None:
+            # 駅勢圏の列は統計値・順位の後ろに置く
+            df = df[[column for column in df.columns if column not in extra.columns] + list(extra.columns)]
+        return df
+    
+    def _generate(self,
+                  station_data: List[Dict],
+                  client: EStatAPIClient,
+                  timeseries: bool,
+                  layout: str,
+                  catchment: Optional[Tuple[PointGrid, List[float]]] = None) -> pd.DataFrame:
+        """出力用 DataFrame を作成（timeseries=True の場合は時系列モード、catchment は (メッシュ, 半径) ）"""
+        df = self._enrich(station_data, client, timeseries, layout, catchment)
+        with self.metrics.span('format'):
+            df = self._apply_output_types(df)
+        self._record_rates(client, len(df))
         return df
     
+    def _rank_key(self, client: EStatAPIClient, timeseries: bool, layout: str) -> Tuple[str, List[str]]:
+        """順位付けに使う (人口密度の列, グループ化する列) を返す"""
+        if timeseries and layout == 'long':
+            return 'population_density_km2', ['route', 'year']
+        if timeseries:
+            return f"population_density_km2_{client.years[-1]}", ['route']
+        return 'population_density_km2', ['route']
+    
+    def _fetch_nationwide(self, client: EStatAPIClient) -> None:
+        """全件を読むまで必要な自治体が分からないストリーミング・分割処理用に、統計表を全国分まとめて取得"""
+        if client.fetch_mode == 'targeted':
+            self.logger.warning("--fetch_mode targeted is not used with --chunk_size / --workers; fetching nationwide tables")
+        if not client._fetch_all_data(self.logger):
+            raise RuntimeError("Failed to fetch data from e-Stat API")
+    
+    @staticmethod
+    def _merge_rank_keys(rank_table: Optional[pd.DataFrame], keys: pd.DataFrame) -> pd.DataFrame:
+        """順位付けに使う（路線, 人口密度）の組を重複なしで蓄積"""
+        keys = keys.drop_duplicates()
+        if rank_table is None:
+            return keys
+        return pd.concat([rank_table, keys], ignore_index=True).drop_duplicates()
+    
+    def _write_ranked(self,
+                      parts: List[Path],
+                      rank_table: pd.DataFrame,
+                      client: EStatAPIClient,
+                      outputs: List[str],
+                      timeseries: bool,
+                      layout: str) -> int:
+        """一時ファイルに退避した結合済みデータに全体での順位を埋め、出力に逐次書き出す（書き出した行数を返す）"""
+        density_column, by = self._rank_key(client, timeseries, layout)
+        keys = by + [density_column]
+        rank_table = rank_table.reset_index(drop=True)
+        rank_table['rank_in_route'] = self._rank_in_route(rank_table, density_column, by)
+        
+        rows = 0
+        writers = [FrameWriter(path) for path in outputs]
+        try:
+            for path in parts:
+                df = pd.read_pickle(path)
+                df['rank_in_route'] = df[keys].merge(rank_table, on=keys, how='left')['rank_in_route'].array
+                with self.metrics.span('format'):
+                    df = self._apply_output_types(df)
+                for writer in writers:
+                    with self.metrics.span('write', path=writer.path):
+                        writer.write(df)
+                rows += len(df)
+                path.unlink()
+        finally:
+            for writer in writers:
+                writer.close()
+        for writer in writers:
+            self.logger.info(f"{writer.fmt.upper()} saved to {writer.path} ({writer.rows} rows)")
+        self.metrics.incr('rows_written', rows * len(outputs))
+        self._record_rates(client, rows)
+        return rows
+    
+    def _generate_streaming(self,
+                            stations: str,
+                            stations_format: Optional[str],
+                            route_filter: Optional[List[str]],
+                            client: EStatAPIClient,
+                            outputs: List[str],
+                            timeseries: bool,
+                            layout: str,
+                            catchment: Optional[Tuple[PointGrid, List[float]]],
+                            chunk_size: int) -> int:
+        """駅データをチャンク単位で処理し、出力ファイルに逐次書き出す（書き出した行数を返す）
+        
+        路線内の順位は全件を見ないと決まらないため2パスで処理する。1パス目で各チャンクに
+        統計値を付与して一時ファイルに退避しつつ（路線, 人口密度）の組だけを集め、
+        2パス目で順位を埋めて書き出す。dense rank は値の種類だけで決まるため、
+        集める組は自治体数 × 路線数程度に収まる。出力は入力順（路線・人口密度順には並べ替えない）。
+        """
+        self._fetch_nationwide(client)
+        density_column, by = self._rank_key(client, timeseries, layout)
+        keys = by + [density_column]
+        rank_table: Optional[pd.DataFrame] = None
+        with tempfile.TemporaryDirectory(prefix='allinn-stream-') as spool_dir:
+            parts: List[Path] = []
+            rows = 0
+            chunks = read_station_chunks(stations, stations_format, route_filter, chunk_size)
+            while True:
+                with self.metrics.span('load_stations'):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    break
+                df = self._enrich(chunk, client, timeseries, layout, catchment, rank=False)
+                rank_table = self._merge_rank_keys(rank_table, df[keys])
+                path = Path(spool_dir) / f"chunk_{len(parts):06d}.pkl"
+                df.to_pickle(path)
+                parts.append(path)
+                rows += len(df)
+                self.logger.info(f"Processed chunk {len(parts)} ({rows} rows so far)")
+            
+            if not parts:
+                self.logger.warning(f"No stations read from {stations}; nothing written")
+                return 0
+            return self._write_ranked(parts, rank_table, client, outputs, timeseries, layout)
+    
+    def _partition_by_prefecture(self,
+                                 stations: str,
+                                 stations_format: Optional[str],
+                                 route_filter: Optional[List[str]],
+                                 chunk_size: int,
+                                 spool_dir: Path) -> Dict[int, List[Path]]:
+        """駅データを都道府県コード（不明は 0）ごとの一時ファイルに振り分ける"""
+        shards: Dict[int, List[Path]] = {}
+        chunks = read_station_chunks(stations, stations_format, route_filter, chunk_size)
+        for i, chunk in enumerate(chunks):
+            with self.metrics.span('partition'):
+                codes = np.asarray(prefecture_codes(chunk['prefecture']))
+                for code, part in chunk.groupby(codes, sort=False):
+                    path = spool_dir / f"input_{code:02d}_{i:06d}.pkl"
+                    part.reset_index(drop=True).to_pickle(path)
+                    shards.setdefault(int(code), []).append(path)
+        return shards
+    
+    def _generate_sharded(self,
+                          stations: str,
+                          stations_format: Optional[str],
+                          route_filter: Optional[List[str]],
+                          client: EStatAPIClient,
+                          outputs: List[str],
+                          timeseries: bool,
+                          layout: str,
+                          catchment: Optional[Tuple[PointGrid, List[float]]],
+                          chunk_size: int,
+                          workers: int,
+                          indicators: Union[None, str, Iterable[str]]) -> int:
+        """都道府県ごとに分割した駅データをプロセスプールで並列に結合し、順位を全体で付け直して書き出す
+        
+        統計データは .npy に書き出して各ワーカーがメモリマップで共有する。ワーカーは分割ごとに
+        結合済みデータを一時ファイルに書き、（路線, 人口密度）の組を返す。出力は都道府県コード順
+        （同じ都道府県内は入力順）。
+        """
+        self._fetch_nationwide(client)
+        client.ensure_municipality_index(self.logger)
+        rank_table: Optional[pd.DataFrame] = None
+        with tempfile.TemporaryDirectory(prefix='allinn-shard-') as workdir:
+            workdir = Path(workdir)
+            store_dir = str(client.store.save(workdir / 'store'))
+            shards = self._partition_by_prefecture(stations, stations_format, route_filter, chunk_size, workdir)
+            if not shards:
+                self.logger.warning(f"No stations read from {stations}; nothing written")
+                return 0
+            
+            # 大きい分割から順に投入して、ワーカー間の負荷の偏りを抑える
+            order = sorted(shards, key=lambda code: -sum(path.stat().st_size for path in shards[code]))
+            workers = max(1, min(workers, len(shards)))
+            self.logger.info(f"Enriching {len(shards)} prefecture shards with {workers} worker(s)")
+            settings = {'years': client.years, 'indicators': indicators, 'timeseries': timeseries, 'layout': layout,
+                        'fuzzy': client.fuzzy, 'index_dir': client.index_dir}
+            results: Dict[int, Tuple[List[Path], pd.DataFrame, int]] = {}
+            with self.metrics.span('shards'), ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_shard_worker,
+                initargs=(store_dir, settings, catchment)
+            ) as executor:
+                futures = {code: executor.submit(_enrich_shard, code, shards[code]) for code in order}
+                for code in order:
+                    results[code] = futures[code].result()
+                    self.logger.info(f"Shard {code:02d}: {results[code][2]} rows")
+            
+            parts: List[Path] = []
+            for code in sorted(results):
+                shard_parts, keys, _ = results[code]
+                parts.extend(shard_parts)
+                rank_table = self._merge_rank_keys(rank_table, keys)
+            return self._write_ranked(parts, rank_table, client, outputs, timeseries, layout)
+    
+    def _record_rates(self, client: EStatAPIClient, rows: int) -> None:
+        """キャッシュヒット率とスループット（セル/秒・行/秒）を記録"""
+        if client.stats_cache is not None:
+            lookups = client.stats_cache.hits + client.stats_cache.misses
+            if lookups:
+                self.metrics.gauge('cache_hit_rate', client.stats_cache.hits / lookups)
+        cells_per_second = self.metrics.rate('cells_parsed', 'parse')
+        if cells_per_second is not None:
+            self.metrics.gauge('cells_per_second', cells_per_second)
+        self.metrics.incr('output_rows', rows)
+        rows_per_second = self.metrics.rate('output_rows', 'join')
+        if rows_per_second is not None:
+            self.metrics.gauge('rows_per_second', rows_per_second)
+    
+    def _log_statistics(self, df: pd.DataFrame, suffix: str = '') -> None:
+        """欠損状況をログ出力（suffix は wide 形式の年別列の接尾辞）"""
+        total_stations = len(df)
+        missing_population = df[f'population{suffix}'].isna().sum()
+        missing_area = df[f'area_km2{suffix}'].isna().sum()
+        missing_density = df[f'population_density_km2{suffix}'].isna().sum()
+        
+        missing_percentage = (missing_density / total_stations) * 100
+        
+        self.logger.info(f"Total stations: {total_stations}")
+        self.logger.info(f"Missing population data: {missing_population}")
+        self.logger.info(f"Missing area data: {missing_area}")
+        self.logger.info(f"Missing density data: {missing_density} ({missing_percentage:.1f}%)")
+        
+        if missing_percentage > 1.0:
+            self.logger.warning(f"Missing density data exceeds 1%: {missing_percentage:.1f}%")
+    
+    def _summary_stations(self, df: pd.DataFrame, client: EStatAPIClient, timeseries: bool, layout: str) -> pd.DataFrame:
+        """出力 DataFrame から集計用の駅 × 年の行（人口・面積・人口密度）を取り出す"""
+        keys = ['route', 'station', 'municipality', 'prefecture']
+        values = ['population', 'area_km2', 'population_density_km2']
+        if timeseries and layout == 'wide':
+            frames = []
+            for year in client.years:
+                frame = df[keys + [f"{column}_{year}" for column in values]].set_axis(keys + values, axis=1)
+                frames.append(frame.assign(year=year))
+            stations = pd.concat(frames, ignore_index=True)
+        elif timeseries:
+            stations = df[keys + ['year'] + values]
+        else:
+            stations = df[keys + values].assign(year=client.years[-1])
+        return widen_float32_columns(stations)
+    
+    def _materialize_aggregates(self,
+                                df: pd.DataFrame,
+                                client: EStatAPIClient,
+                                timeseries: bool,
+                                layout: str,
+                                store: AggregateStore) -> str:
+        """集計ビューを最新の値に更新してビューのキーを返す（自治体の値が変わった場合のみ再計算）"""
+        with self.metrics.span('aggregates'):
+            key, status, counts = store.materialize(self._summary_stations(df, client, timeseries, layout))
+        if status == 'fresh':
+            self.logger.info(f"Aggregates up to date (view {key})")
+            return key
+        if status == 'built':
+            self.logger.info(f"Aggregates built (view {key}): {counts['groups_recomputed']} groups")
+        else:
+            self.logger.info(
+                f"Aggregates updated (view {key}): {counts['municipalities_changed']} municipalities changed, "
+                f"{counts['groups_recomputed']} groups recomputed, {counts['station_rows_written']} station rows rewritten"
+            )
+        self.metrics.incr('aggregate_groups_recomputed', counts['groups_recomputed'])
+        self.metrics.incr('aggregate_station_rows_written', counts['station_rows_written'])
+        return key
+    
+    def _summarize(self, df: pd.DataFrame, client: EStatAPIClient, timeseries: bool, layout: str, top_n: int) -> None:
+        """路線・都道府県・全国の集計と人口密度上位の駅をキャッシュの集計ビューから表示"""
+        store = AggregateStore(client.stats_cache.cache_dir)
+        key = self._materialize_aggregates(df, client, timeseries, layout, store)
+        
+        year = client.years[-1]
+        with self.metrics.span('summary'):
+            sections = [
+                ('national', store.rollups(key, 'national', year)),
+                ('routes', store.rollups(key, 'route', year)),
+                ('prefectures', store.rollups(key, 'prefecture', year)),
+                (f"top {top_n} stations", store.top_stations(key, year, top_n)),
+            ]
+        print(f"[{self.name}] summary ({year})")
+        for title, frame in sections:
+            print(f"\n{title}:")
+            frame = frame.drop(columns=[column for column in ('level', 'year') if column in frame.columns])
+            if title == 'national':
+                frame = frame.drop(columns='name')
+            print(frame.to_string(index=False, float_format=lambda value: f"{value:,.1f}"))
+    
     def run(self, 
-            output: str = 'shinkansen_population_density.csv',
+            output: Union[str, List[str]] = 'shinkansen_population_density.csv',
             route_filter: Optional[List[str]] = None,
             sleep: float = 0.5,
-            api_key: Optional[str] = None) -> str:
+            api_key: Optional[str] = None,
+            cache_dir: Optional[str] = None,
+            cache_ttl_days: float = DEFAULT_TTL_DAYS,
+            refresh: bool = False,
+            offline: bool = False,
+            concurrency: int = 4,
+            fetch_mode: str = 'auto',
+            years: Union[None, int, str, Iterable] = None,
+            layout: str = 'long',
+            indicators: Union[None, str, Iterable[str]] = None,
+            base_url: Optional[str] = None,
+            timeout: float = DEFAULT_TIMEOUT,
+            retries: int = DEFAULT_RETRIES,
+            deadline: Optional[float] = None,
+            check_updates: bool = False,
+            fuzzy: bool = False,
+            catchment_km: Union[None, float, str, Iterable] = None,
+            mesh_data: Union[None, str, List[str]] = None,
+            mesh_value_column: str = 'population',
+            stations: Optional[str] = None,
+            stations_format: Optional[str] = None,
+            chunk_size: Optional[int] = None,
+            workers: Optional[int] = None,
+            summary: bool = False,
+            top_n: int = DEFAULT_TOP_N) -> str:
         """
         新幹線停車駅の人口・面積・人口密度CSVを生成
         
         Args:
-            output: 出力CSVファイルパス
+            output: 出力ファイルパス（カンマ区切りまたはリストで複数指定可。
+                拡張子 .csv / .csv.gz / .parquet / .feather / .jsonl から形式を判定）
             route_filter: 対象路線を指定（例: ['東海道', '山陽']）
             sleep: リクエスト間隔（秒）
             api_key: e-Stat API キー（環境変数 ESTAT_API_KEY からも取得可能）
+            cache_dir: 永続キャッシュのディレクトリ（環境変数 ALLINN_CACHE_DIR からも取得可能）
+            cache_ttl_days: キャッシュの有効期限（日）
+            refresh: キャッシュを無視して e-Stat API から再取得
+            offline: ネットワークアクセスせずキャッシュのみを使用
+            concurrency: e-Stat API への最大同時リクエスト数
+            fetch_mode: 取得方式（'auto': 自動選択、'targeted': cdArea 指定、'full': 全件取得）
+            years: 時系列モードの取得年（例: '2000,2005,2010' / '2000-2020:5'）。省略時は最新年のみ
+            layout: 時系列モードの出力形式（'long': 駅 × 年の行、'wide': 年別の列）
+            indicators: 追加で取得する SSDS 指標コード（例: 'A1301,A6108'、'statsDataId:コード' で統計表を指定）
+            base_url: e-Stat API の接続先（環境変数 ESTAT_API_URL からも取得可能）
+            timeout: 1リクエストのタイムアウト（秒）
+            retries: 一時的な失敗の再試行回数（指数バックオフ + ジッター）
+            deadline: e-Stat からの取得全体の制限時間（秒）。省略時は無制限
+            check_updates: 統計表の更新日（UPDATED_DATE）を確認し、更新された統計表のみ再取得
+            fuzzy: 自治体名を前方一致・あいまい一致（表記ゆれ）でも解決する。置き換えた自治体はすべて警告を出力
+            catchment_km: 駅から半径 N km 圏内のメッシュ人口を集計する半径（例: 5 / '3,5,10'）
+            mesh_data: 地域メッシュ人口の CSV（カンマ区切りで複数指定可。mesh_code または KEY_CODE 列を持つ
+                独自形式、または e-Stat 統計GIS のダウンロードファイル）
+            mesh_value_column: メッシュ人口の列名（統計GIS のファイルは人口総数の項目コードを指定）
+            stations: 駅・地点データのファイル（.json / .jsonl / .csv / .csv.gz / .parquet、'-' で標準入力）。
+                route / station / municipality / prefecture 列（駅勢圏モードでは lat / lon 列）が必要。
+                省略時は同梱の新幹線駅データ
+            stations_format: stations の形式（'json' / 'jsonl' / 'csv' / 'parquet'）。省略時は拡張子から判定、
+                標準入力は jsonl
+            chunk_size: 指定時はストリーミングモード。stations をこの行数ずつ読み込んで処理し、
+                出力に逐次書き出す（出力は入力順、順位は全件を読んだ後に付与）
+            workers: 2 以上で分割処理モード。stations を都道府県ごとに分割し、このプロセス数で並列に結合する
+                （統計データはメモリマップで共有、順位は全体で付け直す。出力は都道府県コード順）
+            summary: 路線・都道府県・全国の集計（駅数・人口・人口密度の平均と百分位）と人口密度上位の駅を表示。
+                集計はキャッシュディレクトリに保存し、自治体の値が変わった路線・都道府県だけを再計算する
+            top_n: summary で表示する人口密度上位の駅数
         
         Returns:
             出力ファイルパス
         """
-        # API キーの取得
-        if not api_key:
-            api_key = os.getenv('ESTAT_API_KEY')
-        
-        if not api_key:
-            raise ValueError(
-                "e-Stat API key is required. "
-                "Provide it via --api_key parameter or ESTAT_API_KEY environment variable. "
-                "Get your API key from: https://www.e-stat.go.jp/api/"
-            )
+        if refresh and offline:
+            raise ValueError("--refresh and --offline cannot be used together")
         
-        # 駅データを読み込み
-        station_data = self._load_station_data()
-        self.logger.info(f"Loaded {len(station_data)} stations")
+        outputs = split_outputs(output)
+        if not outputs:
+            raise ValueError("At least one output path is required")
         
-        # 路線フィルタリング
-        if route_filter:
-            station_data = self._filter_by_routes(station_data, route_filter)
-            self.logger.info(f"Filtered to {len(station_data)} stations for routes: {route_filter}")
+        year_list = parse_years(years)
+        if layout not in TIMESERIES_LAYOUTS:
+            raise ValueError(f"--layout must be one of {TIMESERIES_LAYOUTS}, got {layout!r}")
+        radii = parse_radii(catchment_km)
+        if radii and not mesh_data:
+            raise ValueError("--catchment_km requires --mesh_data")
+        sharded = workers is not None and int(workers) > 1
+        streaming = chunk_size is not None or sharded
+        if summary and streaming:
+            raise ValueError("--summary cannot be used with --chunk_size / --workers")
+        
+        # API キーの取得
+        api_key = resolve_api_key(api_key, offline)
+        
+        # 駅データを読み込み・路線フィルタリング（ストリーミングモードでは処理しながら読み込む）
+        station_data = None if streaming else self._load_stations(route_filter, stations, stations_format)
         
         # e-Stat API クライアント作成
-        client = EStatAPIClient(api_key=api_key, sleep_time=sleep)
+        stats_cache = StatsCache(cache_dir=cache_dir, ttl_days=cache_ttl_days)
+        client = EStatAPIClient(
+            api_key=api_key,
+            sleep_time=sleep,
+            stats_cache=stats_cache,
+            refresh=refresh,
+            offline=offline,
+            concurrency=concurrency,
+            fetch_mode=fetch_mode,
+            years=year_list,
+            indicators=indicators,
+            base_url=base_url,
+            timeout=timeout,
+            retries=retries,
+            deadline=deadline,
+            check_updates=check_updates,
+            fuzzy=fuzzy,
+            metrics=self.metrics
+        )
+        
+        # 駅勢圏モード: メッシュ人口を空間インデックスに読み込み
+        catchment = None
+        if radii:
+            with self.metrics.span('mesh_load'):
+                grid = load_mesh_grid(mesh_data, value_column=mesh_value_column)
+            self.logger.info(f"Loaded {len(grid)} mesh cells for catchment radii {radii} km")
+            catchment = (grid, radii)
         
-        # CSV作成
         self.logger.info("Starting data collection from e-Stat API...")
-        df = self._create_csv(station_data, client)
+        if sharded:
+            self._generate_sharded(
+                stations or str(STATIONS_PATH), stations_format, route_filter, client, outputs,
+                timeseries=bool(year_list), layout=layout, catchment=catchment,
+                chunk_size=int(chunk_size or DEFAULT_CHUNK_SIZE), workers=int(workers), indicators=indicators
+            )
+            return ','.join(outputs)
+        if streaming:
+            self._generate_streaming(
+                stations or str(STATIONS_PATH), stations_format, route_filter, client, outputs,
+                timeseries=bool(year_list), layout=layout, catchment=catchment, chunk_size=int(chunk_size)
+            )
+            return ','.join(outputs)
         
-        # CSV保存
-        df.to_csv(output, index=False, encoding='utf-8')
-        self.logger.info(f"CSV saved to {output}")
+        # CSV作成（--years 指定時は時系列モード）
+        df = self._generate(station_data, client, timeseries=bool(year_list), layout=layout, catchment=catchment)
         
-        # 統計情報
-        total_stations = len(df)
-        missing_population = df['population'].isna().sum()
-        missing_area = df['area_km2'].isna().sum()
-        missing_density = df['population_density_km2'].isna().sum()
+        # 保存（出力形式は拡張子から判定）
+        self._write_outputs(df, outputs)
         
-        missing_percentage = (missing_density / total_stations) * 100
+        # 統計情報（wide 形式は最新年の列で集計）
+        suffix = f"_{client.years[-1]}" if year_list and layout == 'wide' else ''
+        self._log_statistics(df, suffix=suffix)
         
-        self.logger.info(f"Total stations: {total_stations}")
-        self.logger.info(f"Missing population data: {missing_population}")
-        self.logger.info(f"Missing area data: {missing_area}")
-        self.logger.info(f"Missing density data: {missing_density} ({missing_percentage:.1f}%)")
+        if summary:
+            self._summarize(df, client, timeseries=bool(year_list), layout=layout, top_n=int(top_n))
         
-        if missing_percentage > 1.0:
-            self.logger.warning(f"Missing density data exceeds 1%: {missing_percentage:.1f}%")
-        
-        return output
\ No newline at end of file
+        return ','.join(outputs)
+
+
+# 分割処理モードのワーカープロセスごとの状態（_init_shard_worker で1回だけ作る）
+_shard_context: Dict[str, Any] = {}
+
+
+def _init_shard_worker(store_dir: str, settings: Dict[str, Any], catchment: Optional[Tuple[PointGrid, List[float]]]) -> None:
+    """ワーカーの初期化: 親プロセスが書き出した統計データをメモリマップで読み込む"""
+    cmd = ShinkansenCommand()
+    client = EStatAPIClient(
+        api_key=None,
+        offline=True,
+        years=settings['years'],
+        indicators=settings['indicators'],
+        municipality_index=load_municipality_index(cache_dir=settings['index_dir']),
+        fuzzy=settings['fuzzy'],
+        metrics=cmd.metrics
+    )
+    client.load_store(StatsStore.load(store_dir, mmap=True))
+    _shard_context.update(settings, command=cmd, client=client, catchment=catchment)
+
+
+def _enrich_shard(code: int, paths: List[Path]) -> Tuple[List[Path], pd.DataFrame, int]:
+    """1都道府県分の駅データに統計値を付与して一時ファイルに書き、(ファイル, 順位付けの組, 行数) を返す"""
+    cmd: ShinkansenCommand = _shard_context['command']
+    client: EStatAPIClient = _shard_context['client']
+    timeseries, layout = _shard_context['timeseries'], _shard_context['layout']
+    density_column, by = cmd._rank_key(client, timeseries, layout)
+    keys = by + [density_column]
+    
+    parts: List[Path] = []
+    rank_table: Optional[pd.DataFrame] = None
+    rows = 0
+    for path in paths:
+        df = cmd._enrich(pd.read_pickle(path), client, timeseries, layout, _shard_context['catchment'], rank=False)
+        rank_table = cmd._merge_rank_keys(rank_table, df[keys])
+        part = path.with_name(path.name.replace('input_', 'enriched_', 1))
+        df.to_pickle(part)
+        path.unlink()
+        parts.append(part)
+        rows += len(df)
+    return parts, rank_table, rows
\ No newline at end of file
@@ -0,0 +1,339 @@
+"""Materialized route / prefecture / national rollups of station statistics."""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from .cache import default_cache_dir
+
+AGGREGATES_FORMAT_VERSION = 1
+ROLLUP_LEVELS = ('route', 'prefecture', 'national')
+PERCENTILES = (10, 25, 50, 75, 90)
+DEFAULT_TOP_N = 10
+
+# 集計の元になる駅 × 年の列
+STATION_KEY = ('route', 'station', 'municipality', 'prefecture')
+VALUE_COLUMNS = ('population', 'area_km2', 'population_density_km2')
+RANK_COLUMNS = ('rank_in_route', 'density_percentile', 'density_percentile_in_route')
+ROLLUP_COLUMNS = (
+    'level', 'name', 'year', 'stations', 'municipalities', 'population', 'area_km2', 'population_density_km2',
+    'density_mean', *(f"density_p{percentile}" for percentile in PERCENTILES), 'density_max',
+)
+_MUNICIPALITY_KEY = ['prefecture', 'municipality', 'year']
+_STATION_ROW_KEY = list(STATION_KEY) + ['year']
+STATION_COLUMNS = _STATION_ROW_KEY + list(VALUE_COLUMNS) + list(RANK_COLUMNS)
+
+
+def _digest(hashes: np.ndarray, *extra: object) -> str:
+    """Order-independent digest of per-row hashes plus extra identifying values."""
+    digest = hashlib.sha1(np.sort(hashes).tobytes())
+    for value in extra:
+        digest.update(repr(value).encode())
+    return digest.hexdigest()[:16]
+
+
+def view_key(stations: pd.DataFrame) -> str:
+    """Identify a station set and its years (independent of the statistics values)."""
+    hashes = pd.util.hash_pandas_object(stations[list(STATION_KEY) + ['year']], index=False).to_numpy()
+    return _digest(hashes, AGGREGATES_FORMAT_VERSION)
+
+
+def municipality_values(stations: pd.DataFrame) -> pd.DataFrame:
+    """Return one population / area row per (prefecture, municipality, year)."""
+    return stations[_MUNICIPALITY_KEY + ['population', 'area_km2']].drop_duplicates(_MUNICIPALITY_KEY)
+
+
+def data_version(stations: pd.DataFrame) -> str:
+    """Digest of the municipality values the aggregates are computed from."""
+    values = municipality_values(stations)
+    return _digest(pd.util.hash_pandas_object(values, index=False).to_numpy())
+
+
+def rank_stations(stations: pd.DataFrame) -> pd.DataFrame:
+    """Add the dense density rank within route and the national / in-route density percentiles."""
+    stations = stations.copy()
+    density = stations['population_density_km2']
+    by_route = stations.groupby(['route', 'year'], observed=True)['population_density_km2']
+    stations['rank_in_route'] = by_route.rank(method='dense', ascending=False, na_option='bottom').astype('Int64')
+    stations['density_percentile'] = density.groupby(stations['year']).rank(pct=True) * 100
+    stations['density_percentile_in_route'] = by_route.rank(pct=True) * 100
+    return stations
+
+
+def rollup(stations: pd.DataFrame, level: str) -> pd.DataFrame:
+    """Aggregate stations by route, prefecture or nationally, per year.
+
+    Population and area are summed over distinct municipalities, so a
+    municipality with several stations on one route counts once;
+    population_density_km2 is their ratio and the density_* columns
+    describe the distribution of the station densities.
+    """
+    if level not in ROLLUP_LEVELS:
+        raise ValueError(f"level must be one of {ROLLUP_LEVELS}, got {level!r}")
+    keys = ['year'] if level == 'national' else [level, 'year']
+    if stations.empty:
+        return pd.DataFrame(columns=list(ROLLUP_COLUMNS))
+
+    density = stations.groupby(keys, observed=True)['population_density_km2']
+    result = pd.DataFrame({'stations': density.size(), 'density_mean': density.mean()})
+    for percentile in PERCENTILES:
+        result[f"density_p{percentile}"] = density.quantile(percentile / 100)
+    result['density_max'] = density.max()
+
+    municipalities = stations.drop_duplicates(keys + ['prefecture', 'municipality'])
+    grouped = municipalities.groupby(keys, observed=True)
+    result['municipalities'] = grouped.size()
+    result['population'] = grouped['population'].sum(min_count=1)
+    result['area_km2'] = grouped['area_km2'].sum(min_count=1)
+    result['population_density_km2'] = result['population'] / result['area_km2'].where(result['area_km2'] > 0)
+
+    result = result.reset_index()
+    result['level'] = level
+    result['name'] = None if level == 'national' else result[level].astype(str)
+    return result[list(ROLLUP_COLUMNS)]
+
+
+def _differs(merged: pd.DataFrame, columns: Iterable[str]) -> np.ndarray:
+    """Rows of an outer merge (``_old`` / ``_new`` suffixes) where any of columns differs (NaN equals NaN)."""
+    changed = np.zeros(len(merged), dtype=bool)
+    for column in columns:
+        old, new = merged[f"{column}_old"], merged[f"{column}_new"]
+        changed |= ~((old == new) | (old.isna() & new.isna())).to_numpy(dtype=bool)
+    return changed
+
+
+def _changed_municipalities(previous: pd.DataFrame, current: pd.DataFrame) -> Set[Tuple[str, str]]:
+    """(prefecture, municipality) pairs whose population or area differ between two value tables."""
+    merged = previous.merge(current, on=_MUNICIPALITY_KEY, how='outer', suffixes=('_old', '_new'))
+    changed = _differs(merged, ('population', 'area_km2'))
+    return set(zip(merged.loc[changed, 'prefecture'], merged.loc[changed, 'municipality']))
+
+
+def _changed_stations(previous: pd.DataFrame, current: pd.DataFrame) -> Optional[pd.DataFrame]:
+    """Rows of current whose values or ranks differ from previous, or None if rows cannot be matched by key."""
+    if current.duplicated(_STATION_ROW_KEY).any() or len(previous) != len(current):
+        return None
+    columns = list(VALUE_COLUMNS) + list(RANK_COLUMNS)
+    merged = current.merge(previous, on=_STATION_ROW_KEY, how='left', suffixes=('_new', '_old'), indicator=True)
+    if (merged['_merge'] != 'both').any():
+        return None
+    return current[_differs(merged, columns)]
+
+
+class AggregateStore:
+    """SQLite-backed materialized views of station rollups, one per station set.
+
+    A view holds the ranked station rows and the route / prefecture /
+    national rollups for one station set (see ``view_key``). It is
+    recomputed only when the municipality values change (``data_version``);
+    then only the routes and prefectures containing a changed municipality
+    and the national rollup are recomputed. Ranks and percentiles are
+    recomputed in memory over all stations, but only the station rows whose
+    values or ranks changed are rewritten.
+    """
+
+    DB_NAME = 'aggregates.sqlite3'
+
+    def __init__(self, cache_dir: Optional[Union[str, Path]] = None):
+        self.cache_dir = Path(cache_dir).expanduser() if cache_dir else default_cache_dir()
+        self.db_path = self.cache_dir / self.DB_NAME
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS aggregate_views ("
+                " view_key TEXT PRIMARY KEY,"
+                " data_version TEXT NOT NULL,"
+                " format_version INTEGER NOT NULL,"
+                " computed_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS aggregate_stations ("
+                " view_key TEXT NOT NULL,"
+                " route TEXT, station TEXT, municipality TEXT, prefecture TEXT, year INTEGER,"
+                " population REAL, area_km2 REAL, population_density_km2 REAL,"
+                " rank_in_route INTEGER, density_percentile REAL, density_percentile_in_route REAL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS aggregate_stations_density"
+                " ON aggregate_stations (view_key, year, population_density_km2)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS aggregate_stations_key"
+                " ON aggregate_stations (view_key, route, station, year)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS aggregate_rollups ("
+                " view_key TEXT NOT NULL,"
+                f" {', '.join(f'{column} {_sql_type(column)}' for column in ROLLUP_COLUMNS)})"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS aggregate_rollups_level ON aggregate_rollups (view_key, level, name)"
+            )
+
+    def version(self, key: str) -> Optional[str]:
+        """Return the data version a view was computed from, or None if there is no usable view."""
+        with self._lock, closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT data_version FROM aggregate_views WHERE view_key = ? AND format_version = ?",
+                (key, AGGREGATES_FORMAT_VERSION)
+            ).fetchone()
+        return row[0] if row else None
+
+    def materialize(self, stations: pd.DataFrame) -> Tuple[str, str, Dict[str, int]]:
+        """Bring the view of stations up to date.
+
+        stations has one row per station and year with the STATION_KEY,
+        year and VALUE_COLUMNS columns. Returns (view key, status, counts)
+        where status is 'fresh' (unchanged, nothing recomputed), 'built'
+        or 'updated' and counts has the number of changed municipalities,
+        recomputed rollup groups and rewritten station rows.
+        """
+        stations = stations[list(STATION_KEY) + ['year'] + list(VALUE_COLUMNS)].reset_index(drop=True)
+        # 型を揃えて、同じ値なら入力の型（カテゴリ・Int64 など）によらず同じバージョンになるようにする
+        stations = stations.astype({
+            **{column: str for column in STATION_KEY}, 'year': 'int64', **{column: 'float64' for column in VALUE_COLUMNS}
+        })
+        key = view_key(stations)
+        version = data_version(stations)
+        known = self.version(key)
+        if known == version:
+            return key, 'fresh', {}
+
+        ranked = rank_stations(stations)
+        if known is None:
+            rollups = [rollup(ranked, level) for level in ROLLUP_LEVELS]
+            replace: Dict[str, Optional[Iterable[str]]] = {level: None for level in ROLLUP_LEVELS}
+            changed_rows: Optional[pd.DataFrame] = None
+            counts = {'municipalities_changed': len(municipality_values(stations))}
+        else:
+            # 値が変わった自治体を含む路線・都道府県だけを集計し直す（全国は常に集計し直す）
+            changed = _changed_municipalities(self._municipality_values(key), municipality_values(stations))
+            pairs = pd.Series(list(zip(ranked['prefecture'], ranked['municipality'])), dtype=object)
+            affected = ranked[pairs.isin(changed).to_numpy()]
+            replace = {
+                'route': sorted(affected['route'].astype(str).unique()),
+                'prefecture': sorted(affected['prefecture'].astype(str).unique()),
+                'national': None,
+            }
+            rollups = [
+                rollup(ranked[ranked['route'].astype(str).isin(replace['route'])], 'route'),
+                rollup(ranked[ranked['prefecture'].astype(str).isin(replace['prefecture'])], 'prefecture'),
+                rollup(ranked, 'national'),
+            ]
+            # 順位・百分位が動いた駅の行も含め、値の変わった行だけを書き直す
+            changed_rows = _changed_stations(self._station_rows(key), ranked)
+            counts = {'municipalities_changed': len(changed)}
+        counts['groups_recomputed'] = sum(len(frame) for frame in rollups)
+        counts['station_rows_written'] = len(ranked if changed_rows is None else changed_rows)
+        self._write(key, version, ranked, changed_rows, rollups, replace)
+        return key, 'built' if known is None else 'updated', counts
+
+    def _municipality_values(self, key: str) -> pd.DataFrame:
+        with self._lock, closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                "SELECT DISTINCT prefecture, municipality, year, population, area_km2"
+                " FROM aggregate_stations WHERE view_key = ?",
+                conn, params=(key,)
+            )
+
+    def _station_rows(self, key: str) -> pd.DataFrame:
+        with self._lock, closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                f"SELECT {', '.join(STATION_COLUMNS)} FROM aggregate_stations WHERE view_key = ?",
+                conn, params=(key,)
+            )
+
+    def _write(self,
+               key: str,
+               version: str,
+               ranked: pd.DataFrame,
+               changed_rows: Optional[pd.DataFrame],
+               rollups: List[pd.DataFrame],
+               replace: Dict[str, Optional[Iterable[str]]]) -> None:
+        """Replace station rows (changed_rows, or all of ranked if None) and rollup groups (None: the whole level)."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            if changed_rows is None:
+                conn.execute("DELETE FROM aggregate_stations WHERE view_key = ?", (key,))
+                rows = ranked
+            else:
+                conn.executemany(
+                    "DELETE FROM aggregate_stations WHERE view_key = ?"
+                    f" AND {' AND '.join(f'{column} = ?' for column in _STATION_ROW_KEY)}",
+                    ((key, *row) for row in _records(changed_rows[_STATION_ROW_KEY]))
+                )
+                rows = changed_rows
+            conn.executemany(
+                f"INSERT INTO aggregate_stations (view_key, {', '.join(STATION_COLUMNS)})"
+                f" VALUES (?, {', '.join('?' * len(STATION_COLUMNS))})",
+                ((key, *row) for row in _records(rows[STATION_COLUMNS]))
+            )
+            for level, names in replace.items():
+                if names is None:
+                    conn.execute("DELETE FROM aggregate_rollups WHERE view_key = ? AND level = ?", (key, level))
+                else:
+                    conn.executemany(
+                        "DELETE FROM aggregate_rollups WHERE view_key = ? AND level = ? AND name = ?",
+                        ((key, level, name) for name in names)
+                    )
+            conn.executemany(
+                f"INSERT INTO aggregate_rollups (view_key, {', '.join(ROLLUP_COLUMNS)})"
+                f" VALUES (?, {', '.join('?' * len(ROLLUP_COLUMNS))})",
+                ((key, *row) for frame in rollups for row in _records(frame))
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO aggregate_views (view_key, data_version, format_version, computed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, version, AGGREGATES_FORMAT_VERSION, time.time())
+            )
+
+    def rollups(self, key: str, level: str, year: Optional[int] = None) -> pd.DataFrame:
+        """Return the rollup rows of a level (optionally one year), ordered by name and year."""
+        if level not in ROLLUP_LEVELS:
+            raise ValueError(f"level must be one of {ROLLUP_LEVELS}, got {level!r}")
+        query = f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM aggregate_rollups WHERE view_key = ? AND level = ?"
+        params: Tuple = (key, level)
+        if year is not None:
+            query += " AND year = ?"
+            params += (int(year),)
+        with self._lock, closing(self._connect()) as conn:
+            return pd.read_sql_query(query + " ORDER BY name, year", conn, params=params)
+
+    def top_stations(self, key: str, year: int, n: int = DEFAULT_TOP_N) -> pd.DataFrame:
+        """Return the n densest stations of a year across all routes."""
+        columns = list(STATION_KEY) + list(VALUE_COLUMNS) + list(RANK_COLUMNS)
+        with self._lock, closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                f"SELECT {', '.join(columns)} FROM aggregate_stations"
+                " WHERE view_key = ? AND year = ? AND population_density_km2 IS NOT NULL"
+                " ORDER BY population_density_km2 DESC LIMIT ?",
+                conn, params=(key, int(year), int(n))
+            )
+
+
+def _sql_type(column: str) -> str:
+    if column in ('level', 'name'):
+        return 'TEXT'
+    if column in ('year', 'stations', 'municipalities'):
+        return 'INTEGER'
+    return 'REAL'
+
+
+def _records(frame: pd.DataFrame) -> Iterable[tuple]:
+    """Rows of frame as plain Python values (NaN / NA as None) for sqlite3."""
+    values = frame.astype(object).where(frame.notna(), None)
+    return (tuple(value.item() if isinstance(value, np.generic) else value for value in row)
+            for row in values.itertuples(index=False, name=None))
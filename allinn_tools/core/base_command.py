@@ -1,15 +1,25 @@
 """Base command class for extensible CLI commands."""
 
 import logging
+import os
+import sys
 from abc import ABC, abstractmethod
 from typing import Any, Dict, Optional
 
+from .env import load_env
+from .metrics import Metrics
+
+DEFAULT_LOG_LEVEL = 'INFO'
+
 
 class BaseCommand(ABC):
     """Base class for all CLI commands."""
     
     def __init__(self):
+        # .env はコマンド実行時に読み込む（モジュール読み込み時には読まない）
+        load_env()
         self.logger = self._setup_logger()
+        self.metrics = Metrics()
     
     def _setup_logger(self) -> logging.Logger:
         """Set up logger for the command."""
@@ -21,10 +31,17 @@ class BaseCommand(ABC):
             )
             handler.setFormatter(formatter)
             logger.addHandler(handler)
-            # デバッグ情報も表示するためにDEBUGレベルに設定
-            logger.setLevel(logging.DEBUG)
+            # ログレベルは環境変数 ALLINN_LOG_LEVEL（または --log_level）で変更可能
+            self.set_log_level(os.getenv('ALLINN_LOG_LEVEL') or DEFAULT_LOG_LEVEL, logger)
         return logger
     
+    def set_log_level(self, level: str, logger: Optional[logging.Logger] = None) -> None:
+        """Set the log level by name (DEBUG / INFO / WARNING / ERROR)."""
+        value = logging.getLevelName(str(level).upper())
+        if not isinstance(value, int):
+            raise ValueError(f"Unknown log level {level!r}")
+        (logger or self.logger).setLevel(value)
+    
     @property
     @abstractmethod
     def name(self) -> str:
@@ -42,6 +59,64 @@ class BaseCommand(ABC):
         """Main command execution logic."""
         pass
     
+    def execute(self,
+                *args,
+                profile: bool = False,
+                metrics_output: Optional[str] = None,
+                profile_output: Optional[str] = None,
+                **kwargs) -> Any:
+        """Run the command with instrumentation.
+        
+        profile prints the per-stage summary to stderr, metrics_output
+        writes spans and the final report as JSON lines, and
+        profile_output records a cProfile dump (.prof) or, if pyinstrument
+        is installed, an HTML report (.html).
+        """
+        sink = open(metrics_output, 'w', encoding='utf-8') if metrics_output else None
+        self.metrics = Metrics(sink)
+        profiler = _start_profiler(profile_output) if profile_output else None
+        try:
+            with self.metrics.span('total'):
+                return self.run(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                _stop_profiler(profiler, profile_output)
+                self.logger.info(f"Profile saved to {profile_output}")
+            self.metrics.close()
+            if sink is not None:
+                sink.close()
+            if profile:
+                print(f"[{self.name}] profile", file=sys.stderr)
+                for line in self.metrics.summary():
+                    print(line, file=sys.stderr)
+    
     def validate_args(self, **kwargs) -> Dict[str, Any]:
         """Validate command arguments. Override if needed."""
-        return kwargs
\ No newline at end of file
+        return kwargs
+
+
+def _start_profiler(path: str) -> Any:
+    if path.lower().endswith('.html'):
+        try:
+            from pyinstrument import Profiler
+        except ImportError as e:
+            raise ImportError(
+                "HTML profiles require pyinstrument. Install it with: pip install pyinstrument"
+            ) from e
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler: Any, path: str) -> None:
+    if path.lower().endswith('.html'):
+        profiler.stop()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        profiler.dump_stats(path)
@@ -0,0 +1,237 @@
+"""Persistent on-disk cache for e-Stat statistical tables."""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+# (area_code, cat01, time, value)
+StatsRow = Tuple[str, str, str, Optional[float]]
+
+DEFAULT_TTL_DAYS = 7.0
+
+
+def default_cache_dir() -> Path:
+    """Return the cache directory (ALLINN_CACHE_DIR or ~/.cache/allinn_tools)."""
+    env_dir = os.getenv('ALLINN_CACHE_DIR')
+    if env_dir:
+        return Path(env_dir).expanduser()
+    return Path.home() / '.cache' / 'allinn_tools'
+
+
+class StatsCache:
+    """SQLite-backed cache of getStatsData values keyed by statsDataId/cdCat01/cdTime."""
+
+    DB_NAME = 'estat_cache.sqlite3'
+
+    def __init__(self,
+                 cache_dir: Optional[Union[str, Path]] = None,
+                 ttl_days: float = DEFAULT_TTL_DAYS):
+        self.cache_dir = Path(cache_dir).expanduser() if cache_dir else default_cache_dir()
+        self.ttl_seconds = ttl_days * 24 * 60 * 60
+        self.db_path = self.cache_dir / self.DB_NAME
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._init_db()
+
+    @staticmethod
+    def make_key(stats_data_id: str,
+                 cd_cat01: str,
+                 cd_time: str,
+                 cd_area: Optional[Sequence[str]] = None) -> str:
+        """Build the cache key for a getStatsData request.
+
+        Targeted (cdArea) requests get a suffix derived from the sorted area
+        codes, so repeated runs over the same stations hit the same entry.
+        """
+        key = f"{stats_data_id}/{cd_cat01}/{cd_time}"
+        if cd_area:
+            digest = hashlib.sha1(','.join(sorted(cd_area)).encode()).hexdigest()[:16]
+            key += f"/area={digest}"
+        return key
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init_db(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats_tables ("
+                " cache_key TEXT PRIMARY KEY,"
+                " fetched_at REAL NOT NULL,"
+                " version TEXT)"
+            )
+            # version 列が無い旧形式のキャッシュに列を追加
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(stats_tables)")}
+            if 'version' not in columns:
+                conn.execute("ALTER TABLE stats_tables ADD COLUMN version TEXT")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats_values ("
+                " cache_key TEXT NOT NULL,"
+                " area_code TEXT NOT NULL,"
+                " cat01 TEXT NOT NULL,"
+                " time TEXT NOT NULL,"
+                " value REAL,"
+                " PRIMARY KEY (cache_key, area_code, cat01, time)"
+                ") WITHOUT ROWID"
+            )
+            # 取得途中のページ（中断した取得の再開用）
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS download_pages ("
+                " request_key TEXT NOT NULL,"
+                " start_position INTEGER NOT NULL,"
+                " next_key INTEGER,"
+                " total INTEGER NOT NULL,"
+                " rows TEXT NOT NULL,"
+                " saved_at REAL NOT NULL,"
+                " PRIMARY KEY (request_key, start_position))"
+            )
+            # 統計表ごとの e-Stat 側の更新日（UPDATED_DATE）
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS table_versions ("
+                " stats_data_id TEXT PRIMARY KEY,"
+                " updated_date TEXT NOT NULL,"
+                " checked_at REAL NOT NULL)"
+            )
+
+    def get(self,
+            key: str,
+            area_codes: Optional[Sequence[str]] = None,
+            record: bool = True,
+            ignore_ttl: bool = False,
+            version: Optional[str] = None) -> Optional[List[StatsRow]]:
+        """Return cached rows for key, or None if missing or expired.
+
+        area_codes restricts the result to those areas (used to serve a
+        targeted request from a cached full table). With record=False the
+        lookup is not counted in the hit/miss statistics; ignore_ttl also
+        returns expired entries. When version is given, entries fetched
+        under another table version (or none) count as missing.
+        """
+        with self._lock, closing(self._connect()) as conn:
+            entry = conn.execute(
+                "SELECT fetched_at, version FROM stats_tables WHERE cache_key = ?", (key,)
+            ).fetchone()
+            expired = entry is not None and not ignore_ttl and time.time() - entry[0] > self.ttl_seconds
+            if entry is None or expired or (version is not None and entry[1] != version):
+                if record:
+                    self.misses += 1
+                return None
+            rows = conn.execute(
+                "SELECT area_code, cat01, time, value FROM stats_values WHERE cache_key = ?",
+                (key,)
+            ).fetchall()
+            if area_codes is not None:
+                wanted = set(area_codes)
+                rows = [row for row in rows if row[0] in wanted]
+            if record:
+                self.hits += 1
+            return rows
+
+    def put(self, key: str, rows: Iterable[StatsRow], version: Optional[str] = None) -> None:
+        """Store rows for key, replacing any previous entry.
+
+        version is the table's UPDATED_DATE the rows were fetched under,
+        if known.
+        """
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM stats_values WHERE cache_key = ?", (key,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO stats_values (cache_key, area_code, cat01, time, value)"
+                " VALUES (?, ?, ?, ?, ?)",
+                ((key, *row) for row in rows)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO stats_tables (cache_key, fetched_at, version) VALUES (?, ?, ?)",
+                (key, time.time(), version)
+            )
+
+    def stats(self) -> str:
+        """Return a hit/miss summary for logging."""
+        total = self.hits + self.misses
+        rate = (self.hits / total * 100) if total else 0.0
+        return f"hits={self.hits}, misses={self.misses} ({rate:.0f}% hit rate)"
+
+    def save_page(self,
+                  request_key: str,
+                  start_position: int,
+                  next_key: Optional[int],
+                  total: int,
+                  rows: List[StatsRow]) -> None:
+        """Checkpoint one downloaded page of a paginated request."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO download_pages"
+                " (request_key, start_position, next_key, total, rows, saved_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (request_key, start_position, next_key, total, json.dumps(rows), time.time())
+            )
+
+    def load_pages(self, request_key: str) -> Optional[Tuple[List[StatsRow], Optional[int], int]]:
+        """Return (rows, next_key, total) of the checkpointed pages, or None.
+
+        Only the contiguous run of pages starting at position 1 is used,
+        and checkpoints older than the TTL are ignored.
+        """
+        with self._lock, closing(self._connect()) as conn:
+            pages = conn.execute(
+                "SELECT start_position, next_key, total, rows FROM download_pages"
+                " WHERE request_key = ? AND saved_at >= ? ORDER BY start_position",
+                (request_key, time.time() - self.ttl_seconds)
+            ).fetchall()
+        if not pages or pages[0][0] != 1:
+            return None
+        rows: List[StatsRow] = []
+        next_key: Optional[int] = 1
+        for start_position, page_next_key, total, page_rows in pages:
+            if start_position != next_key:
+                break
+            rows.extend(tuple(row) for row in json.loads(page_rows))
+            next_key = page_next_key
+        return rows, next_key, pages[0][2]
+
+    def clear_pages(self, request_key: str) -> None:
+        """Drop the checkpoints of a completed request."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM download_pages WHERE request_key = ?", (request_key,))
+
+    def clear_table_pages(self, stats_data_id: str) -> int:
+        """Drop every page checkpoint of a table (e.g. after it was updated); return the count."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            return conn.execute(
+                "DELETE FROM download_pages WHERE request_key LIKE ?", (f"{stats_data_id}/%",)
+            ).rowcount
+
+    def get_version(self, stats_data_id: str) -> Optional[str]:
+        """Return the UPDATED_DATE the cached rows of a table were fetched under."""
+        with self._lock, closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT updated_date FROM table_versions WHERE stats_data_id = ?", (stats_data_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_version(self, stats_data_id: str, updated_date: str) -> None:
+        """Record the UPDATED_DATE of a table after fetching it."""
+        with self._lock, closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO table_versions (stats_data_id, updated_date, checked_at) VALUES (?, ?, ?)",
+                (stats_data_id, updated_date, time.time())
+            )
+
+    def renew(self, stats_data_id: str, updated_date: str) -> int:
+        """Reset the TTL of the cached entries of a table fetched under updated_date; return the entry count.
+
+        Entries fetched under an older version (or before versions were
+        recorded) are left to expire, so they are never revived.
+        """
+        with self._lock, closing(self._connect()) as conn, conn:
+            return conn.execute(
+                "UPDATE stats_tables SET fetched_at = ? WHERE cache_key LIKE ? AND version = ?",
+                (time.time(), f"{stats_data_id}/%", updated_date)
+            ).rowcount
@@ -0,0 +1,37 @@
+"""Deferred loading of the .env file and environment settings."""
+
+import os
+from typing import Optional
+
+_loaded = False
+
+
+def load_env() -> None:
+    """Load .env into os.environ on first call (existing variables take precedence).
+
+    python-dotenv is imported here rather than at module import time, so
+    commands that never read the environment do not pay for it.
+    """
+    global _loaded
+    if _loaded:
+        return
+    from dotenv import load_dotenv
+    load_dotenv()
+    _loaded = True
+
+
+def resolve_api_key(api_key: Optional[str] = None, offline: bool = False) -> Optional[str]:
+    """Return the e-Stat API key from the argument or ESTAT_API_KEY.
+
+    Raises ValueError when no key is found, unless offline (cache only).
+    """
+    if not api_key:
+        load_env()
+        api_key = os.getenv('ESTAT_API_KEY')
+    if not api_key and not offline:
+        raise ValueError(
+            "e-Stat API key is required. "
+            "Provide it via --api_key parameter or ESTAT_API_KEY environment variable. "
+            "Get your API key from: https://www.e-stat.go.jp/api/"
+        )
+    return api_key
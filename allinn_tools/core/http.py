@@ -0,0 +1,158 @@
+"""Shared HTTP session, per-host rate limiting and retry handling."""
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+T = TypeVar('T')
+
+
+def create_session(pool_size: int = 4) -> requests.Session:
+    """Create a pooled keep-alive session that accepts gzip responses."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+    return session
+
+
+class RateLimiter:
+    """Enforce a minimum interval between requests to the same host.
+
+    Slots are reserved under a lock and waited for outside of it, so
+    concurrent callers are spaced out by ``interval`` seconds each.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = max(0.0, interval)
+        self._next_slot: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        """Block until a request to url's host is allowed."""
+        if self.interval <= 0:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+# 再試行する HTTP ステータス
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RetryableError(Exception):
+    """A failure that may succeed when the request is repeated."""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The overall time budget of a run was used up."""
+
+
+class EStatAPIError(RuntimeError):
+    """e-Stat rejected the request (RESULT.STATUS indicates an error)."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"e-Stat API error {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+def check_estat_result(result: Optional[Dict[str, Any]]) -> None:
+    """Raise if an e-Stat RESULT object reports an error.
+
+    STATUS 0-2 are successful (1: no matching data, 2: partially
+    successful). 100s are request errors and are not retried; 200 and
+    above are server-side errors and are retried.
+    """
+    if result is None:
+        raise RetryableError("Response has no RESULT (truncated body?)")
+    status = int(result.get("STATUS", 0))
+    if status <= 2:
+        return
+    message = result.get("ERROR_MSG", "")
+    if status >= 200:
+        raise RetryableError(f"e-Stat API error {status}: {message}")
+    raise EStatAPIError(status, message)
+
+
+class Deadline:
+    """Overall time budget shared by every request of a run."""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = time.monotonic() + seconds if seconds else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None without a deadline."""
+        if self.expires_at is None:
+            return None
+        return self.expires_at - time.monotonic()
+
+    def timeout(self, timeout: float) -> float:
+        """Clamp a per-request timeout to the remaining budget."""
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            raise DeadlineExceeded("Deadline exceeded")
+        return min(timeout, remaining)
+
+
+class RetryPolicy:
+    """Retry transient failures with exponential backoff and full jitter."""
+
+    def __init__(self, max_retries: int = 4, backoff: float = 1.0, max_backoff: float = 30.0):
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        if isinstance(error, RetryableError):
+            return True
+        if isinstance(error, requests.HTTPError):
+            return error.response is not None and error.response.status_code in RETRY_STATUSES
+        return isinstance(error, (requests.ConnectionError, requests.Timeout,
+                                  requests.exceptions.ChunkedEncodingError))
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        """Backoff before retry number attempt (Retry-After takes precedence)."""
+        response = getattr(error, 'response', None)
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def call(self,
+             func: Callable[[], T],
+             deadline: Optional[Deadline] = None,
+             description: str = 'request',
+             logger: Optional[logging.Logger] = None) -> T:
+        """Call func, retrying retryable errors until max_retries or the deadline."""
+        attempt = 0
+        while True:
+            try:
+                return func()
+            except Exception as e:
+                if attempt >= self.max_retries or not self.is_retryable(e):
+                    raise
+                delay = self.delay(attempt, e)
+                remaining = deadline.remaining() if deadline else None
+                if remaining is not None and delay >= remaining:
+                    raise DeadlineExceeded(f"Deadline exceeded while retrying {description}: {e}") from e
+                attempt += 1
+                if logger:
+                    logger.warning(f"Retrying {description} in {delay:.1f}s ({attempt}/{self.max_retries}): {e}")
+                time.sleep(delay)
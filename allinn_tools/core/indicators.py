@@ -0,0 +1,131 @@
+"""Registry of SSDS municipality indicators and derived metrics."""
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+
+class Indicator(NamedTuple):
+    """An SSDS indicator: cdCat01 code, the table it lives in and its output column."""
+    code: str
+    stats_data_id: str
+    column: str
+    kind: str = 'measure'  # 'count'（整数で出力）または 'measure'
+
+
+class DerivedMetric(NamedTuple):
+    """A metric computed from indicator columns with a DataFrame.eval expression."""
+    column: str
+    expression: str
+    requires: Tuple[str, ...]
+
+
+# SSDS 市区町村データの分野（指標コードの先頭文字）→ 統計表ID
+SSDS_TABLES = {
+    'A': '0000020201',  # 人口・世帯
+    'B': '0000020102',  # 自然環境
+    'C': '0000020203',  # 経済基盤
+    'D': '0000020204',  # 行政基盤
+    'E': '0000020205',  # 教育
+    'F': '0000020206',  # 労働
+    'G': '0000020207',  # 文化・スポーツ
+    'H': '0000020208',  # 居住
+    'I': '0000020209',  # 健康・医療
+    'J': '0000020210',  # 福祉・社会保障
+    'K': '0000020211',  # 安全
+}
+
+# 列名を定義済みの指標（未登録のコードは指標コードをそのまま列名にする）
+INDICATORS: Dict[str, Indicator] = {
+    indicator.code: indicator
+    for indicator in (
+        Indicator('A1101', SSDS_TABLES['A'], 'population', 'count'),          # 総人口
+        Indicator('A1301', SSDS_TABLES['A'], 'population_0_14', 'count'),     # 15歳未満人口
+        Indicator('A1302', SSDS_TABLES['A'], 'population_15_64', 'count'),    # 15～64歳人口
+        Indicator('A1303', SSDS_TABLES['A'], 'population_65_over', 'count'),  # 65歳以上人口
+        Indicator('A6108', SSDS_TABLES['A'], 'daytime_population', 'count'),  # 昼間人口
+        Indicator('A7101', SSDS_TABLES['A'], 'households', 'count'),          # 世帯数
+        Indicator('B1101', SSDS_TABLES['B'], 'area_km2'),                     # 総面積（km²）
+    )
+}
+
+# 出力に常に含める指標（人口密度・ランキングの計算に必要）
+BASE_INDICATORS = ('A1101', 'B1101')
+
+DERIVED_METRICS = (
+    DerivedMetric('population_density_km2', 'population / area_km2', ('population', 'area_km2')),
+    DerivedMetric('persons_per_household', 'population / households', ('population', 'households')),
+    DerivedMetric('daytime_population_ratio', 'daytime_population / population',
+                  ('daytime_population', 'population')),
+    DerivedMetric('aged_population_pct', 'population_65_over / population * 100',
+                  ('population_65_over', 'population')),
+)
+
+
+def parse_indicators(indicators: Union[None, str, Iterable[str]]) -> List[str]:
+    """--indicators の値（'A1101,A1301' / タプル等）を指標指定のリストに変換"""
+    if indicators is None or indicators == '':
+        return []
+    if isinstance(indicators, str):
+        indicators = indicators.split(',')
+    return [str(spec).strip() for spec in indicators if str(spec).strip()]
+
+
+def resolve_indicator(spec: str) -> Indicator:
+    """Resolve 'A1301' or 'statsDataId:code' to an Indicator."""
+    stats_data_id, _, code = spec.rpartition(':')
+    known = INDICATORS.get(code)
+    if known is not None:
+        return known._replace(stats_data_id=stats_data_id) if stats_data_id else known
+    stats_data_id = stats_data_id or SSDS_TABLES.get(code[:1])
+    if not stats_data_id:
+        raise ValueError(f"Unknown indicator {spec!r}: specify its table as 'statsDataId:{code}'")
+    return Indicator(code, stats_data_id, code)
+
+
+def resolve_indicators(specs: Iterable[str] = ()) -> List[Indicator]:
+    """Resolve the base indicators plus specs, dropping duplicate codes.
+
+    A spec such as 'statsDataId:A1101' moves a base indicator to another
+    table; specs that give one code two different tables are rejected.
+    """
+    resolved: Dict[str, Indicator] = {spec: resolve_indicator(spec) for spec in BASE_INDICATORS}
+    specified: Dict[str, str] = {}
+    for spec in specs:
+        indicator = resolve_indicator(spec)
+        previous = specified.setdefault(indicator.code, spec)
+        if resolved.get(indicator.code, indicator).stats_data_id != indicator.stats_data_id and previous != spec:
+            raise ValueError(
+                f"Indicator {indicator.code} is given two tables: {previous!r} and {spec!r}"
+            )
+        resolved[indicator.code] = indicator
+    return list(resolved.values())
+
+
+def group_by_table(indicators: Iterable[Indicator]) -> Dict[str, List[str]]:
+    """Group indicator codes by statsDataId so each table is fetched once."""
+    tables: Dict[str, List[str]] = {}
+    for indicator in indicators:
+        tables.setdefault(indicator.stats_data_id, []).append(indicator.code)
+    return tables
+
+
+def evaluate_derived(df: pd.DataFrame, metrics: Iterable[DerivedMetric] = DERIVED_METRICS) -> List[str]:
+    """Add every metric whose inputs are present in df; division by zero yields NaN."""
+    added = []
+    for metric in metrics:
+        if all(column in df.columns for column in metric.requires):
+            df[metric.column] = df.eval(metric.expression).replace([np.inf, -np.inf], np.nan)
+            added.append(metric.column)
+    return added
+
+
+def output_dtype(column: str) -> Optional[str]:
+    """Return the output dtype of an indicator or derived column (None if unknown)."""
+    for indicator in INDICATORS.values():
+        if indicator.column == column:
+            return 'Int64' if indicator.kind == 'count' else 'float32'
+    if any(metric.column == column for metric in DERIVED_METRICS):
+        return 'float32'
+    return None
@@ -0,0 +1,115 @@
+"""Incremental parser for e-Stat getStatsData JSON responses."""
+
+import codecs
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+_WHITESPACE = re.compile(r'[\s,]*')
+_VALUE_KEY = re.compile(r'"VALUE"\s*:\s*')
+_RESULT_INF_KEY = re.compile(r'"RESULT_INF"\s*:\s*')
+_RESULT_KEY = re.compile(r'"RESULT"\s*:\s*')
+
+# 処理済みバッファを切り詰める閾値（文字数）
+_COMPACT_THRESHOLD = 1 << 16
+
+
+class StatsDataStream:
+    """Parse a getStatsData body chunk by chunk without building the full tree.
+
+    ``values()`` yields the items of ``DATA_INF.VALUE`` one at a time.
+    ``result`` and ``result_inf`` hold the ``RESULT`` / ``RESULT_INF``
+    objects once they have been seen in the stream.
+    """
+
+    def __init__(self, chunks: Iterable[bytes], encoding: str = 'utf-8'):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._json = json.JSONDecoder()
+        self._buf = ''
+        self._eof = False
+        self.result: Optional[Dict[str, Any]] = None
+        self.result_inf: Optional[Dict[str, Any]] = None
+
+    def _fill(self) -> bool:
+        """Append the next chunk to the buffer. Return False at end of stream."""
+        if self._eof:
+            return False
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            self._buf += self._decoder.decode(b'', final=True)
+            self._eof = True
+            return False
+        self._buf += self._decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+        return True
+
+    def _decode_at(self, pos: int) -> Optional[tuple]:
+        """Decode one JSON value at pos, reading more chunks as needed."""
+        while True:
+            try:
+                return self._json.raw_decode(self._buf, pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    return None
+
+    def _scan_header(self, text: str) -> None:
+        """Pick up RESULT / RESULT_INF objects from already buffered text."""
+        for attr, pattern in (('result', _RESULT_KEY), ('result_inf', _RESULT_INF_KEY)):
+            if getattr(self, attr) is not None:
+                continue
+            match = pattern.search(text)
+            if match is None:
+                continue
+            try:
+                obj, _ = self._json.raw_decode(text, match.end())
+            except json.JSONDecodeError:
+                continue
+            setattr(self, attr, obj)
+
+    def values(self) -> Iterator[Dict[str, Any]]:
+        """Yield each item of DATA_INF.VALUE."""
+        match = _VALUE_KEY.search(self._buf)
+        while match is None:
+            if not self._fill():
+                # VALUE が無いレスポンス（エラー・該当データなし）
+                self._scan_header(self._buf)
+                return
+            match = _VALUE_KEY.search(self._buf)
+
+        self._scan_header(self._buf[:match.start()])
+        pos = match.end()
+        while pos >= len(self._buf):
+            if not self._fill():
+                return
+
+        if self._buf[pos] == '{':
+            # 要素が1件の場合は配列ではなくオブジェクトで返る
+            decoded = self._decode_at(pos)
+            if decoded is not None:
+                yield decoded[0]
+                pos = decoded[1]
+        elif self._buf[pos] == '[':
+            pos += 1
+            while True:
+                pos = _WHITESPACE.match(self._buf, pos).end()
+                if pos >= len(self._buf):
+                    if not self._fill():
+                        break
+                    continue
+                if self._buf[pos] == ']':
+                    pos += 1
+                    break
+                decoded = self._decode_at(pos)
+                if decoded is None:
+                    break
+                item, pos = decoded
+                yield item
+                if pos > _COMPACT_THRESHOLD:
+                    self._buf = self._buf[pos:]
+                    pos = 0
+
+        # 残り（末尾）に RESULT_INF 等がある場合に備えて読み切る
+        self._buf = self._buf[pos:]
+        while self._fill():
+            pass
+        self._scan_header(self._buf)
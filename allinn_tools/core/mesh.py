@@ -0,0 +1,205 @@
+"""JIS X 0410 regional mesh decoding and radius queries over mesh cells."""
+
+from pathlib import Path
+from typing import Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.0
+MESH_CODE_COLUMNS = ('mesh_code', 'KEY_CODE')  # 独自形式 / e-Stat 統計GIS のダウンロードファイル
+
+# 区画の桁数 → (緯度方向の大きさ, 経度方向の大きさ)（度）
+_FIRST = (2 / 3, 1.0)       # 第1次地域区画（約 80km）
+_SECOND = (5 / 60, 7.5 / 60)  # 第2次地域区画（約 10km）
+_THIRD = (30 / 3600, 45 / 3600)  # 基準地域メッシュ（約 1km）
+MESH_CODE_LENGTHS = (4, 6, 8, 9, 10, 11)  # 1次・2次・3次・1/2・1/4・1/8 地域メッシュ
+
+
+def mesh_to_latlon(codes: Iterable[Union[str, int]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Decode mesh codes to (center lat, center lon, cell height, cell width) in degrees.
+
+    Codes of different levels may be mixed; each must have one of the
+    lengths in MESH_CODE_LENGTHS.
+    """
+    codes = np.asarray([str(code) for code in codes])
+    lengths = np.char.str_len(codes) if len(codes) else np.zeros(0, dtype=int)
+    invalid = ~np.isin(lengths, MESH_CODE_LENGTHS)
+    if invalid.any():
+        raise ValueError(f"Invalid mesh codes (expected {MESH_CODE_LENGTHS} digits): {codes[invalid][:5].tolist()}")
+
+    # 下位の桁を 0 で埋めて整数の桁として扱う
+    padded = np.char.ljust(codes, 11, '0').astype(np.int64) if len(codes) else np.zeros(0, dtype=np.int64)
+    digits = padded[:, None] // 10 ** np.arange(10, -1, -1, dtype=np.int64) % 10
+    lat = (digits[:, 0] * 10 + digits[:, 1]) / 1.5
+    lon = (digits[:, 2] * 10 + digits[:, 3]) + 100.0
+    height = np.full(len(codes), _FIRST[0])
+    width = np.full(len(codes), _FIRST[1])
+
+    level = lengths >= 6
+    lat += np.where(level, digits[:, 4] * _SECOND[0], 0)
+    lon += np.where(level, digits[:, 5] * _SECOND[1], 0)
+    height = np.where(level, _SECOND[0], height)
+    width = np.where(level, _SECOND[1], width)
+
+    level = lengths >= 8
+    lat += np.where(level, digits[:, 6] * _THIRD[0], 0)
+    lon += np.where(level, digits[:, 7] * _THIRD[1], 0)
+    height = np.where(level, _THIRD[0], height)
+    width = np.where(level, _THIRD[1], width)
+
+    # 分割地域メッシュ: 1=南西, 2=南東, 3=北西, 4=北東
+    for position in (8, 9, 10):
+        level = lengths > position
+        quadrant = np.maximum(digits[:, position] - 1, 0)
+        height = np.where(level, height / 2, height)
+        width = np.where(level, width / 2, width)
+        lat += np.where(level, (quadrant // 2) * height, 0)
+        lon += np.where(level, (quadrant % 2) * width, 0)
+
+    return lat + height / 2, lon + width / 2, height, width
+
+
+def haversine_km(lat1: Union[float, np.ndarray],
+                 lon1: Union[float, np.ndarray],
+                 lat2: np.ndarray,
+                 lon2: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km from one point to many, or between paired points."""
+    lat1, lon1 = np.radians(lat1), np.radians(lon1)
+    lat2, lon2 = np.radians(lat2), np.radians(lon2)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class PointGrid:
+    """Uniform lat/lon grid over weighted points for fast radius sums.
+
+    Points are sorted by grid cell so that each row of cells within a
+    query's bounding box is one contiguous slice; only those candidates
+    are checked with the exact haversine distance. Queries are processed
+    in blocks: the slices of a block are expanded into one candidate
+    array and summed per query with ``np.bincount``.
+    """
+
+    QUERY_BLOCK = 1024  # 一度に候補を展開する検索点の数（メモリ使用量の上限）
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, values: np.ndarray, cell_deg: float = 0.05):
+        self.cell_deg = cell_deg
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        values = np.nan_to_num(np.asarray(values, dtype=np.float64))
+        rows = np.floor(lat / cell_deg).astype(np.int64)
+        cols = np.floor(lon / cell_deg).astype(np.int64)
+        self._col_min = int(cols.min()) if len(cols) else 0
+        self._cols = int(cols.max()) - self._col_min + 1 if len(cols) else 1
+        keys = rows * self._cols + (cols - self._col_min)
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+        self.values = values[order]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _candidates(self, lat: np.ndarray, lon: np.ndarray, radius_km: float) -> Tuple[np.ndarray, np.ndarray]:
+        """(query index, point index) pairs for the grid cells overlapping each query's bounding box."""
+        dlat = radius_km / KM_PER_DEGREE_LAT
+        cos_lat = np.maximum(np.cos(np.radians(np.minimum(np.abs(lat) + dlat, 89.0))), 1e-6)
+        dlon = radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+        col_lo = np.maximum(np.floor((lon - dlon) / self.cell_deg).astype(np.int64) - self._col_min, 0)
+        col_hi = np.minimum(np.floor((lon + dlon) / self.cell_deg).astype(np.int64) - self._col_min, self._cols - 1)
+        row_lo = np.floor((lat - dlat) / self.cell_deg).astype(np.int64)
+        row_counts = np.floor((lat + dlat) / self.cell_deg).astype(np.int64) - row_lo + 1
+        row_counts[col_lo > col_hi] = 0
+
+        # 検索点ごとのセル行を (検索点, 行) の組に展開し、行ごとの連続区間を二分探索で求める
+        row_query = np.repeat(np.arange(len(lat)), row_counts)
+        row_offsets = np.arange(len(row_query)) - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+        rows = row_lo[row_query] + row_offsets
+        starts = np.searchsorted(self.keys, rows * self._cols + col_lo[row_query], side='left')
+        ends = np.searchsorted(self.keys, rows * self._cols + col_hi[row_query], side='right')
+
+        # 区間を点のインデックスに展開
+        lengths = ends - starts
+        slice_index = np.repeat(np.arange(len(starts)), lengths)
+        points = starts[slice_index] + np.arange(len(slice_index)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return row_query[slice_index], points
+
+    def sum_within(self, lat: Sequence[float], lon: Sequence[float], radius_km: float) -> np.ndarray:
+        """Sum of point values within radius_km of each query point.
+
+        NaN where lat/lon is missing or no grid cell with points overlaps
+        the query's bounding box (outside the mesh coverage).
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        result = np.full(len(lat), np.nan)
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+        for block_start in range(0, len(valid), self.QUERY_BLOCK):
+            block = valid[block_start:block_start + self.QUERY_BLOCK]
+            queries, points = self._candidates(lat[block], lon[block], radius_km)
+            distances = haversine_km(lat[block][queries], lon[block][queries], self.lat[points], self.lon[points])
+            sums = np.bincount(queries, weights=np.where(distances <= radius_km, self.values[points], 0.0),
+                               minlength=len(block))
+            covered = np.bincount(queries, minlength=len(block)) > 0
+            result[block[covered]] = sums[covered]
+        return result
+
+
+def _read_mesh_file(path: Path, value_column: str) -> pd.DataFrame:
+    """Read one mesh CSV (UTF-8 or Shift_JIS) into mesh_code / value columns."""
+    for encoding in ('utf-8', 'cp932'):
+        try:
+            frame = pd.read_csv(path, dtype=str, encoding=encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError(f"Could not decode mesh file {path} as UTF-8 or Shift_JIS")
+
+    code_column = next((column for column in MESH_CODE_COLUMNS if column in frame.columns), None)
+    if code_column is None or value_column not in frame.columns:
+        raise ValueError(
+            f"Mesh file {path} needs a code column {MESH_CODE_COLUMNS} and the value column "
+            f"{value_column!r}; found {list(frame.columns)[:10]}"
+        )
+    frame = frame[[code_column, value_column]].set_axis(['mesh_code', 'value'], axis=1)
+    # 統計GIS 形式の2行目（項目名）を除外し、秘匿値（*）・該当なし（-）は欠損として扱う
+    frame = frame[frame['mesh_code'].str.fullmatch(r'\d+', na=False)]
+    frame['value'] = pd.to_numeric(frame['value'], errors='coerce')
+    return frame
+
+
+def load_mesh_grid(paths: Union[str, Sequence[str]], value_column: str = 'population') -> PointGrid:
+    """Load mesh population files (comma-separated paths) into a PointGrid of cell centers."""
+    if isinstance(paths, str):
+        paths = paths.split(',')
+    frames: List[pd.DataFrame] = [
+        _read_mesh_file(Path(str(path).strip()), value_column) for path in paths if str(path).strip()
+    ]
+    if not frames:
+        raise ValueError("At least one mesh data file is required")
+    mesh = pd.concat(frames, ignore_index=True).drop_duplicates('mesh_code', keep='last')
+    lat, lon, _, _ = mesh_to_latlon(mesh['mesh_code'])
+    return PointGrid(lat, lon, mesh['value'].to_numpy())
+
+
+def parse_radii(radii: Union[None, float, str, Iterable]) -> List[float]:
+    """--catchment_km の値（5 / '3,5,10' / タプル）を半径（km）のリストに変換"""
+    if radii is None or radii == '':
+        return []
+    if isinstance(radii, (int, float)):
+        radii = [radii]
+    elif isinstance(radii, str):
+        radii = radii.split(',')
+    values = sorted({float(str(radius).strip()) for radius in radii if str(radius).strip()})
+    if any(radius <= 0 for radius in values):
+        raise ValueError(f"Catchment radii must be positive, got {values}")
+    return values
+
+
+def catchment_columns(radius_km: float) -> Tuple[str, str]:
+    """Return the (population, density) output column names for a radius."""
+    return f"catchment_population_{radius_km:g}km", f"catchment_density_km2_{radius_km:g}km"
@@ -0,0 +1,94 @@
+"""Lightweight per-stage timing and counters for commands."""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Any, Dict, Iterator, List, Optional
+
+
+class Metrics:
+    """Thread-safe spans, counters and gauges collected during a command run.
+
+    ``span(name)`` accumulates wall time per stage; spans entered from
+    worker threads (e.g. page parsing) add up, so their total can exceed
+    the elapsed time of the enclosing stage. When ``sink`` is given, every
+    finished span and the final report are written to it as JSON lines.
+    """
+
+    def __init__(self, sink: Optional[IO[str]] = None):
+        self.sink = sink
+        self.started = time.perf_counter()
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[None]:
+        """Time the enclosed block under name."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            with self._lock:
+                span = self.spans.setdefault(name, {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+                span['count'] += 1
+                span['seconds'] += seconds
+                span['max_seconds'] = max(span['max_seconds'], seconds)
+            self._emit({'event': 'span', 'name': name, 'seconds': seconds, **attributes})
+
+    def incr(self, name: str, value: float = 1) -> None:
+        """Add value to a counter (e.g. bytes_downloaded, cells_parsed)."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: Any) -> None:
+        """Record a point-in-time value (e.g. cache_hit_rate)."""
+        with self._lock:
+            self.gauges[name] = value
+
+    def rate(self, counter: str, span: str) -> Optional[float]:
+        """Return counter per second of span time, or None if either is missing."""
+        seconds = self.spans.get(span, {}).get('seconds')
+        if not seconds or counter not in self.counters:
+            return None
+        return self.counters[counter] / seconds
+
+    def report(self) -> Dict[str, Any]:
+        """Return all metrics as a JSON-serializable dict."""
+        with self._lock:
+            return {
+                'elapsed_seconds': time.perf_counter() - self.started,
+                'spans': {name: dict(span) for name, span in self.spans.items()},
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+            }
+
+    def summary(self) -> List[str]:
+        """Format the report as lines for a --profile summary."""
+        report = self.report()
+        lines = [f"elapsed: {report['elapsed_seconds']:.3f}s"]
+        for name, span in report['spans'].items():
+            calls = f" ({span['count']} calls, max {span['max_seconds']:.3f}s)" if span['count'] > 1 else ''
+            lines.append(f"  {name:<18} {span['seconds']:9.3f}s{calls}")
+        for name, value in {**report['counters'], **report['gauges']}.items():
+            if isinstance(value, float):
+                value = f"{value:,.2f}"
+            elif isinstance(value, int):
+                value = f"{value:,}"
+            lines.append(f"  {name:<18} {value}")
+        return lines
+
+    def close(self) -> None:
+        """Write the final report to the sink."""
+        self._emit({'event': 'report', **self.report()})
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        if self.sink is None:
+            return
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            self.sink.write(line + '\n')
+            self.sink.flush()
@@ -0,0 +1,494 @@
+"""Municipality code index built from e-Stat getMetaInfo area classes."""
+
+import bisect
+import json
+import re
+import unicodedata
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Union
+
+from .cache import default_cache_dir
+
+INDEX_FORMAT_VERSION = 1
+INDEX_FILE_NAME = 'municipality_index.json'
+BUNDLED_INDEX_PATH = Path(__file__).parent.parent / 'data' / INDEX_FILE_NAME
+SEED_INDEX_VERSION = 'seed'          # version of the bundled partial index (stations only)
+INDEX_STATS_DATA_ID = '0000020201'   # SSDS table whose area classes list every municipality
+ALIASES_FORMAT_VERSION = 1
+BUNDLED_ALIASES_PATH = Path(__file__).parent.parent / 'data' / 'municipality_aliases.json'
+
+# あいまい検索: 置き換える文字数の上限（語幹の長さが閾値以下なら 1、それより長ければ 2）
+# 2文字の語幹は1文字違いでも別の実在自治体になりやすい（府中市 / 安中市）ためあいまい一致しない
+FUZZY_SHORT_NAME = 4
+FUZZY_MIN_STEM = 3
+TYPE_SUFFIXES = '市区町村'
+MAX_PREFIX_CANDIDATES = 20
+RESOLVE_CACHE_SIZE = 65536  # 正規化済みの (名前, 都道府県) ごとの解決結果を保持する上限
+
+PREFECTURES = (
+    '北海道', '青森県', '岩手県', '宮城県', '秋田県', '山形県', '福島県',
+    '茨城県', '栃木県', '群馬県', '埼玉県', '千葉県', '東京都', '神奈川県',
+    '新潟県', '富山県', '石川県', '福井県', '山梨県', '長野県', '岐阜県',
+    '静岡県', '愛知県', '三重県', '滋賀県', '京都府', '大阪府', '兵庫県',
+    '奈良県', '和歌山県', '鳥取県', '島根県', '岡山県', '広島県', '山口県',
+    '徳島県', '香川県', '愛媛県', '高知県', '福岡県', '佐賀県', '長崎県',
+    '熊本県', '大分県', '宮崎県', '鹿児島県', '沖縄県',
+)
+
+_PREFECTURE_CODES = {prefecture: i + 1 for i, prefecture in enumerate(PREFECTURES)}
+_PREFECTURE_SHORT_CODES = {'東京': 13, '大阪': 27, '京都': 26}
+
+# 表記ゆれ（小書き・異体字・カタカナ）の正規化テーブル
+_VARIANT_CHARS = str.maketrans({
+    'ヶ': 'ケ', 'ヵ': 'カ', 'ゖ': 'ケ', 'ゕ': 'カ',
+    '﨑': '崎', '嵜': '崎', '髙': '高', '邊': '辺', '邉': '辺',
+    '澤': '沢', '濱': '浜', '齋': '斎', '齊': '斉', '龍': '竜', '檜': '桧',
+})
+_KATAKANA_TO_HIRAGANA = str.maketrans({chr(code): chr(code - 0x60) for code in range(0x30A1, 0x30F5)})
+_WARD_PATTERN = re.compile(r'^(.+?市)(.+区)$')
+_DISTRICT_PATTERN = re.compile(r'^.+?郡(.+[町村])$')
+_SPACES = re.compile(r'\s+')
+
+
+def normalize_name(name: str) -> str:
+    """Normalize a municipality name for lookup (NFKC, spacing, variant kanji/kana)."""
+    name = unicodedata.normalize('NFKC', name)
+    name = _SPACES.sub('', name)
+    return name.translate(_VARIANT_CHARS).translate(_KATAKANA_TO_HIRAGANA)
+
+
+def split_type(name: str) -> Tuple[str, str]:
+    """Split a normalized name into its stem and type suffix (市/区/町/村, '' if none)."""
+    if len(name) > 1 and name[-1] in TYPE_SUFFIXES:
+        return name[:-1], name[-1]
+    return name, ''
+
+
+def fuzzy_limit(stem: str) -> int:
+    """Number of characters of a stem that may differ in a fuzzy match (0: no fuzzy matching)."""
+    if len(stem) < FUZZY_MIN_STEM:
+        return 0
+    return 1 if len(stem) <= FUZZY_SHORT_NAME else 2
+
+
+@lru_cache(maxsize=None)
+def _stem_parts(length: int, limit: int) -> Tuple[Tuple[int, int], ...]:
+    """Split a stem of length into limit + 1 (start, end) parts.
+
+    Two stems that differ in at most limit characters agree on at least
+    one whole part (pigeonhole), so the parts serve as exact index keys.
+    """
+    bounds = [length * i // (limit + 1) for i in range(limit + 2)]
+    return tuple((bounds[i], bounds[i + 1]) for i in range(limit + 1) if bounds[i] < bounds[i + 1])
+
+
+def prefecture_codes(prefectures: Iterable[Optional[str]]) -> List[int]:
+    """Return the 2-digit prefecture code of each name as an int (0 if unknown).
+
+    The 都/道/府/県 suffix may be omitted (静岡 → 22).
+    """
+    codes: Dict[Any, int] = {}
+    result = []
+    for prefecture in prefectures:
+        code = codes.get(prefecture)
+        if code is None:
+            code = codes[prefecture] = _prefecture_code(normalize_name(prefecture) if isinstance(prefecture, str) else '')
+        result.append(code)
+    return result
+
+
+def _prefecture_code(name: str) -> int:
+    """Return the prefecture code of a normalized name, with or without the 都/道/府/県 suffix (0 if unknown)."""
+    return _PREFECTURE_CODES.get(name) or _PREFECTURE_CODES.get(name + '県') or _PREFECTURE_SHORT_CODES.get(name, 0)
+
+
+def canonical_prefecture(prefecture: Optional[str]) -> Optional[str]:
+    """Return the normalized full prefecture name (静岡 → 静岡県), None if missing.
+
+    Unknown names are returned normalized but otherwise unchanged.
+    """
+    if not isinstance(prefecture, str):
+        return None
+    name = normalize_name(prefecture)
+    if not name:
+        return None
+    code = _prefecture_code(name)
+    return normalize_name(PREFECTURES[code - 1]) if code else name
+
+
+def prefecture_from_code(code: str) -> Optional[str]:
+    """Return the prefecture name for a 5-digit JIS X 0402 code."""
+    try:
+        return PREFECTURES[int(code[:2]) - 1]
+    except (ValueError, IndexError):
+        return None
+
+
+class Resolution(NamedTuple):
+    """Result of resolving one municipality name.
+
+    ``method`` is 'exact', 'alias' (old name of a merged municipality),
+    'ward' (ward of a designated city resolved to the city), 'prefix' or
+    'fuzzy' (edit distance), or None when unresolved. ``candidates`` lists
+    the codes that matched equally well when the name is ambiguous.
+    """
+    code: Optional[str]
+    method: Optional[str] = None
+    matched: Optional[str] = None
+    candidates: Tuple[str, ...] = ()
+
+    @property
+    def ambiguous(self) -> bool:
+        return self.code is None and len(self.candidates) > 1
+
+
+class MunicipalityIndex:
+    """Frozen (prefecture, municipality) -> area code mapping with normalized lookup.
+
+    Besides exact lookups of normalized names, ``resolve`` tries the old
+    names of merged municipalities (``aliases``), then a prefix search over
+    the sorted name list and finally a fuzzy match against an index of the
+    name stems split into ``fuzzy_limit`` + 1 parts, so a fuzzy lookup is
+    a few dict lookups plus a character comparison per candidate. Both
+    indexes are built once here.
+    """
+
+    def __init__(self,
+                 entries: List[Dict[str, str]],
+                 version: str = '',
+                 source: str = '',
+                 aliases: Optional[List[Dict[str, Any]]] = None):
+        self.version = version
+        self.source = source
+        by_key: Dict[Tuple[str, str], str] = {}
+        by_name: Dict[str, List[str]] = {}
+        display: Dict[str, str] = {}
+        for entry in entries:
+            prefecture = normalize_name(entry['prefecture'])
+            display.setdefault(entry['code'], f"{entry['prefecture']}{entry['name']}")
+            for name in self._name_variants(entry['name']):
+                by_key.setdefault((prefecture, name), entry['code'])
+                codes = by_name.setdefault(name, [])
+                if entry['code'] not in codes:
+                    codes.append(entry['code'])
+        self.codes: Mapping[Tuple[str, str], str] = MappingProxyType(by_key)
+        self._by_name: Mapping[str, Tuple[str, ...]] = MappingProxyType(
+            {name: tuple(codes) for name, codes in by_name.items()}
+        )
+        self.size = len(entries)
+
+        # 合併前の旧市町村名（現在の名前と重なる場合は現在の名前を優先）
+        alias_by_key: Dict[Tuple[str, str], str] = {}
+        alias_by_name: Dict[str, List[str]] = {}
+        for alias in aliases or ():
+            prefecture = normalize_name(alias['prefecture'])
+            display.setdefault(alias['code'], f"{alias['prefecture']}{alias.get('current', '')}")
+            for name in self._name_variants(alias['name']):
+                if (prefecture, name) in by_key:
+                    continue
+                alias_by_key.setdefault((prefecture, name), alias['code'])
+                codes = alias_by_name.setdefault(name, [])
+                if alias['code'] not in codes:
+                    codes.append(alias['code'])
+        self._alias_codes: Mapping[Tuple[str, str], str] = MappingProxyType(alias_by_key)
+        self._alias_by_name: Mapping[str, Tuple[str, ...]] = MappingProxyType(
+            {name: tuple(codes) for name, codes in alias_by_name.items()}
+        )
+        self.display: Mapping[str, str] = MappingProxyType(display)
+
+        # 前方一致用のソート済み名前リストと、あいまい一致用の語幹の部分文字列索引
+        self._names: List[str] = sorted(set(by_name) | set(alias_by_name))
+        self._name_codes: Dict[str, Tuple[str, ...]] = {
+            name: tuple(dict.fromkeys(by_name.get(name, []) + alias_by_name.get(name, [])))
+            for name in self._names
+        }
+        stem_index: Dict[Tuple[int, int, str], List[Tuple[str, str, str]]] = {}
+        for name in self._names:
+            stem, suffix = split_type(name)
+            limit = fuzzy_limit(stem)
+            if not limit:
+                continue
+            for part, (start, end) in enumerate(_stem_parts(len(stem), limit)):
+                stem_index.setdefault((len(stem), part, stem[start:end]), []).append((name, stem, suffix))
+        self._stem_index = stem_index
+        self._prefecture_heads = frozenset(normalize_name(prefecture)[:2] for prefecture in PREFECTURES)
+        self._prefecture_prefix = re.compile(
+            '(' + '|'.join(re.escape(normalize_name(prefecture)) for prefecture in PREFECTURES) + ')'
+        )
+        self._resolve_normalized = lru_cache(maxsize=RESOLVE_CACHE_SIZE)(self._resolve)
+
+    @staticmethod
+    def _name_variants(name: str) -> Iterator[str]:
+        """Yield the normalized name and its form without the 郡 prefix."""
+        normalized = normalize_name(name)
+        yield normalized
+        match = _DISTRICT_PATTERN.match(normalized)
+        if match:
+            yield match.group(1)
+
+    def _find(self,
+              name: str,
+              prefecture: Optional[str],
+              by_key: Optional[Mapping[Tuple[str, str], str]] = None,
+              by_name: Optional[Mapping[str, Tuple[str, ...]]] = None) -> Optional[str]:
+        by_key = self.codes if by_key is None else by_key
+        by_name = self._by_name if by_name is None else by_name
+        if prefecture:
+            code = by_key.get((prefecture, name))
+            if code:
+                return code
+        codes = by_name.get(name, ())
+        if len(codes) == 1 and (not prefecture or prefecture_from_code(codes[0]) == prefecture):
+            return codes[0]
+        return None
+
+    def _in_prefecture(self, codes: Iterable[str], prefecture: Optional[str]) -> Tuple[str, ...]:
+        codes = tuple(dict.fromkeys(codes))
+        if not prefecture:
+            return codes
+        return tuple(code for code in codes if prefecture_from_code(code) == prefecture)
+
+    def _prefix_candidates(self, name: str, prefecture: Optional[str]) -> Tuple[List[str], Tuple[str, ...]]:
+        """Names starting with name (e.g. 静岡 → 静岡市) and their codes."""
+        names: List[str] = []
+        position = bisect.bisect_left(self._names, name)
+        while position < len(self._names) and self._names[position].startswith(name):
+            names.append(self._names[position])
+            position += 1
+            if len(names) > MAX_PREFIX_CANDIDATES:
+                break
+        if not names:
+            return names, ()
+        codes = self._in_prefecture((code for match in names for code in self._name_codes[match]), prefecture)
+        return names, codes
+
+    def _fuzzy_candidates(self, name: str, prefecture: Optional[str]) -> Tuple[List[str], Tuple[str, ...]]:
+        """The closest names whose stem differs from name's in at most fuzzy_limit characters.
+
+        Only names of the same stem length and the same type (市/区/町/村, any
+        type if name has none) are considered, so a name is never matched to a
+        municipality with a longer or shorter stem (富士宮市 is not 富士市).
+        """
+        stem, suffix = split_type(name)
+        limit = fuzzy_limit(stem)
+        if not limit:
+            return [], ()
+        distances: Dict[str, int] = {}
+        seen = set()
+        for part, (start, end) in enumerate(_stem_parts(len(stem), limit)):
+            for candidate, candidate_stem, candidate_suffix in self._stem_index.get((len(stem), part, stem[start:end]), ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if suffix and candidate_suffix != suffix:
+                    continue
+                distance = sum(a != b for a, b in zip(stem, candidate_stem))
+                if distance > limit:
+                    continue
+                if prefecture and not self._in_prefecture(self._name_codes[candidate], prefecture):
+                    continue
+                distances[candidate] = distance
+        if not distances:
+            return [], ()
+        best = min(distances.values())
+        matches = sorted(candidate for candidate, distance in distances.items() if distance == best)
+        codes = self._in_prefecture((code for match in matches for code in self._name_codes[match]), prefecture)
+        return matches, codes
+
+    def resolve(self, municipality: str, prefecture: Optional[str] = None, fuzzy: bool = True) -> Resolution:
+        """Resolve municipality (optionally within prefecture) to an area code.
+
+        Tried in order: normalized exact match (also without the 郡 prefix or
+        a leading prefecture name), old names of merged municipalities, the
+        city of a ward-level name (e.g. 横浜市港北区), then with fuzzy=True a
+        unique prefix match and the closest names differing in a few stem
+        characters (see ``_fuzzy_candidates``). A name that exists in the
+        index (in another prefecture) is never fuzzy-matched to a different
+        municipality. prefecture may omit the 都/道/府/県 suffix (静岡). Results
+        are cached per normalized (name, prefecture) in a bounded LRU cache.
+        """
+        # 欠損値（NaN など）は未指定として扱う
+        name = normalize_name(municipality) if isinstance(municipality, str) else ''
+        return self._resolve_normalized(name, canonical_prefecture(prefecture), fuzzy)
+
+    def _resolve(self, name: str, prefecture: Optional[str], fuzzy: bool) -> Resolution:
+        """Resolve a normalized name within a canonical prefecture name (see ``resolve``)."""
+        if not name:
+            return Resolution(None)
+        # 「静岡県静岡市」のように都道府県名が前に付いている場合
+        match = self._prefecture_prefix.match(name) if name[:2] in self._prefecture_heads else None
+        if match and len(name) > match.end() and (not prefecture or match.group(1) == prefecture):
+            prefecture = match.group(1)
+            name = name[match.end():]
+
+        variants = (name,)
+        match = _DISTRICT_PATTERN.match(name) if '郡' in name else None
+        if match:
+            variants = (name, match.group(1))
+        for candidate in variants:
+            code = self._find(candidate, prefecture)
+            if code:
+                return Resolution(code, 'exact', candidate)
+        for candidate in variants:
+            code = self._find(candidate, prefecture, self._alias_codes, self._alias_by_name)
+            if code:
+                return Resolution(code, 'alias', candidate)
+        match = _WARD_PATTERN.match(name) if name.endswith('区') else None
+        if match:
+            code = self._find(match.group(1), prefecture)
+            if code:
+                return Resolution(code, 'ward', match.group(1))
+
+        # 同名の自治体が複数ある（都道府県の指定が無い・一致しない）
+        exact = self._name_codes.get(name)
+        if exact and len(exact) > 1:
+            exact = self._in_prefecture(exact, prefecture)
+        if exact and len(exact) > 1:
+            return Resolution(None, 'exact', name, exact)
+        # 実在する自治体名（別の都道府県にある）は、あいまい一致で別の自治体に置き換えない
+        if not fuzzy or len(name) < 2 or name in self._name_codes:
+            return Resolution(None)
+
+        method = 'prefix'
+        names, codes = self._prefix_candidates(name, prefecture)
+        if not codes:
+            method = 'fuzzy'
+            names, codes = self._fuzzy_candidates(name, prefecture)
+        if len(codes) == 1:
+            return Resolution(codes[0], method, names[0])
+        if codes:
+            return Resolution(None, method, None, codes)
+        return Resolution(None)
+
+    def resolve_many(self,
+                     municipalities: Sequence[str],
+                     prefectures: Optional[Sequence[Optional[str]]] = None,
+                     fuzzy: bool = True) -> List[Resolution]:
+        """Resolve a batch of names; repeated (name, prefecture) pairs are resolved once."""
+        if prefectures is None:
+            prefectures = [None] * len(municipalities)
+        # 入力の表記のままの重複はこの呼び出しの中だけで使い回す（正規化も省く）
+        batch: Dict[Tuple[Any, Any], Resolution] = {}
+        resolutions = []
+        for municipality, prefecture in zip(municipalities, prefectures):
+            key = (municipality, prefecture if isinstance(prefecture, str) else None)
+            resolution = batch.get(key)
+            if resolution is None:
+                resolution = batch[key] = self.resolve(municipality, key[1], fuzzy)
+            resolutions.append(resolution)
+        return resolutions
+
+    def lookup(self, municipality: str, prefecture: Optional[str] = None, fuzzy: bool = True) -> Optional[str]:
+        """Return the area code for municipality, or None if it cannot be resolved (or is ambiguous)."""
+        return self.resolve(municipality, prefecture, fuzzy).code
+
+    def describe(self, code: str) -> str:
+        """Return '都道府県 + 自治体名 (code)' for reports."""
+        return f"{self.display.get(code, '')}({code})"
+
+    def __len__(self) -> int:
+        return self.size
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def build_index_entries(meta_info: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Extract municipality entries from a getMetaInfo response.
+
+    Uses the CLASS_OBJ whose @id is "area". Names such as "北海道 札幌市" are
+    split into prefecture and municipality; otherwise the prefecture is
+    derived from the code. National and prefecture-level codes are skipped.
+    """
+    class_objs = _as_list(meta_info["GET_META_INFO"]["METADATA_INF"]["CLASS_INF"]["CLASS_OBJ"])
+    area_obj = next((obj for obj in class_objs if obj.get("@id") == "area"), None)
+    if area_obj is None:
+        raise ValueError("getMetaInfo response has no area class")
+
+    entries = []
+    for item in _as_list(area_obj.get("CLASS")):
+        code = item.get("@code", "")
+        raw_name = unicodedata.normalize('NFKC', item.get("@name", "")).strip()
+        if len(code) != 5 or code.endswith("000"):
+            continue
+        prefecture = prefecture_from_code(code)
+        name = raw_name
+        parts = raw_name.split(maxsplit=1)
+        if len(parts) == 2 and parts[0] in PREFECTURES:
+            prefecture, name = parts
+        elif prefecture and raw_name.startswith(prefecture):
+            name = raw_name[len(prefecture):]
+        if not prefecture or not name:
+            continue
+        entries.append({"code": code, "prefecture": prefecture, "name": name})
+    entries.sort(key=lambda entry: entry["code"])
+    return entries
+
+
+def write_index(entries: List[Dict[str, str]],
+                path: Union[str, Path],
+                source: str,
+                version: Optional[str] = None) -> Path:
+    """Write entries as a versioned index file (one entry per line)."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    header = {
+        "format_version": INDEX_FORMAT_VERSION,
+        "version": version or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'),
+        "source": source,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{\n')
+        for key, value in header.items():
+            f.write(f' {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n')
+        f.write(' "entries": [\n')
+        f.write(',\n'.join(f'  {json.dumps(entry, ensure_ascii=False)}' for entry in entries))
+        f.write('\n ]\n}\n')
+    return path
+
+
+def generated_index_path(cache_dir: Union[None, str, Path] = None) -> Path:
+    """Return where build-index writes the full index for cache_dir (default: the default cache dir)."""
+    return (Path(cache_dir).expanduser() if cache_dir else default_cache_dir()) / INDEX_FILE_NAME
+
+
+def default_index_path(cache_dir: Union[None, str, Path] = None) -> Path:
+    """Return the index path: a generated index in the cache dir, else the bundled one."""
+    generated = generated_index_path(cache_dir)
+    return generated if generated.exists() else BUNDLED_INDEX_PATH
+
+
+def load_aliases(path: Union[str, Path] = BUNDLED_ALIASES_PATH) -> List[Dict[str, Any]]:
+    """Load the table of old municipality names (mergers) -> current area codes."""
+    with open(path, 'r', encoding='utf-8') as f:
+        document = json.load(f)
+    if document.get("format_version") != ALIASES_FORMAT_VERSION:
+        raise ValueError(f"Unsupported municipality alias format {document.get('format_version')!r} in {path}")
+    return document["aliases"]
+
+
+@lru_cache(maxsize=None)
+def load_municipality_index(path: Optional[str] = None, cache_dir: Optional[str] = None) -> MunicipalityIndex:
+    """Load an index file (with the bundled merger aliases) once per process.
+
+    Without path, the index generated in cache_dir is used if it exists, else the bundled one.
+    """
+    index_path = Path(path) if path else default_index_path(cache_dir)
+    with open(index_path, 'r', encoding='utf-8') as f:
+        document = json.load(f)
+    if document.get("format_version") != INDEX_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported municipality index format {document.get('format_version')!r} in {index_path}"
+        )
+    return MunicipalityIndex(
+        document["entries"],
+        version=document.get("version", ""),
+        source=document.get("source", ""),
+        aliases=load_aliases()
+    )
@@ -0,0 +1,136 @@
+"""DataFrame writers with output format detection from file extensions."""
+
+import gzip
+from pathlib import Path
+from typing import Any, List, Optional, Sequence, Union
+
+import pandas as pd
+
+# 拡張子 → 出力形式（長い拡張子を先に判定する）
+OUTPUT_FORMATS = (
+    ('.csv.gz', 'csv.gz'),
+    ('.parquet', 'parquet'),
+    ('.feather', 'feather'),
+    ('.jsonl', 'jsonl'),
+    ('.csv', 'csv'),
+)
+DEFAULT_FORMAT = 'csv'
+
+
+def detect_format(path: Union[str, Path]) -> Optional[str]:
+    """Return the output format for path, or None if the extension is unknown."""
+    name = str(path).lower()
+    for suffix, fmt in OUTPUT_FORMATS:
+        if name.endswith(suffix):
+            return fmt
+    return None
+
+
+def split_outputs(output: Union[str, Sequence[str]]) -> List[str]:
+    """Split a comma-separated output argument into individual paths."""
+    if isinstance(output, str):
+        output = output.split(',')
+    return [str(path).strip() for path in output if str(path).strip()]
+
+
+def _columnar_error(fmt: str) -> ImportError:
+    return ImportError(
+        f"Writing {fmt} requires pyarrow. Install it with: pip install 'allinn-tools[columnar]'"
+    )
+
+
+def write_frame(df: pd.DataFrame, path: Union[str, Path], fmt: Optional[str] = None) -> str:
+    """Write df to path in fmt (detected from the extension when omitted)."""
+    fmt = fmt or detect_format(path) or DEFAULT_FORMAT
+    path = str(path)
+    if fmt == 'csv':
+        df.to_csv(path, index=False, encoding='utf-8')
+    elif fmt == 'csv.gz':
+        df.to_csv(path, index=False, encoding='utf-8', compression='gzip')
+    elif fmt == 'jsonl':
+        df.to_json(path, orient='records', lines=True, force_ascii=False)
+    elif fmt in ('parquet', 'feather'):
+        try:
+            if fmt == 'parquet':
+                df.to_parquet(path, index=False)
+            else:
+                df.reset_index(drop=True).to_feather(path)
+        except ImportError as e:
+            raise _columnar_error(fmt) from e
+    else:
+        raise ValueError(f"Unsupported output format: {fmt}")
+    return path
+
+
+class FrameWriter:
+    """Append DataFrame chunks to one output file.
+
+    The CSV header and the Parquet / Feather schema are taken from the
+    first chunk; later chunks are cast to that schema. Feather files are
+    written as Arrow IPC batches with categories decoded to plain strings,
+    since the IPC file format cannot change dictionaries between batches.
+    """
+
+    def __init__(self, path: Union[str, Path], fmt: Optional[str] = None):
+        self.fmt = fmt or detect_format(path) or DEFAULT_FORMAT
+        self.path = str(path)
+        self.rows = 0
+        self._handle: Any = None
+        self._writer: Any = None
+        self._schema: Any = None
+        if self.fmt not in ('csv', 'csv.gz', 'jsonl', 'parquet', 'feather'):
+            raise ValueError(f"Unsupported output format: {self.fmt}")
+
+    def write(self, df: pd.DataFrame) -> None:
+        """Append df to the file."""
+        if self.fmt in ('parquet', 'feather'):
+            self._write_arrow(df)
+        else:
+            header = self._handle is None
+            if header:
+                if self.fmt == 'csv.gz':
+                    self._handle = gzip.open(self.path, 'wt', encoding='utf-8', newline='')
+                else:
+                    self._handle = open(self.path, 'w', encoding='utf-8', newline='')
+            if self.fmt != 'jsonl':
+                df.to_csv(self._handle, index=False, header=header)
+            elif len(df):
+                text = df.to_json(orient='records', lines=True, force_ascii=False)
+                self._handle.write(text if text.endswith('\n') else text + '\n')
+        self.rows += len(df)
+
+    def _write_arrow(self, df: pd.DataFrame) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.ipc as ipc
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise _columnar_error(self.fmt) from e
+        if self.fmt == 'feather':
+            categories = df.select_dtypes('category').columns
+            df = df.astype({column: object for column in categories})
+        table = pa.Table.from_pandas(df.reset_index(drop=True), preserve_index=False)
+        if self._writer is None:
+            self._schema = table.schema
+            if self.fmt == 'parquet':
+                self._writer = pq.ParquetWriter(self.path, self._schema)
+            else:
+                self._writer = ipc.new_file(self.path, self._schema)
+        elif not table.schema.equals(self._schema, check_metadata=False):
+            table = table.cast(self._schema)
+        self._writer.write_table(table)
+
+    def close(self) -> None:
+        """Flush and close the file."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def __enter__(self) -> 'FrameWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,200 @@
+"""Chunked readers for station / POI input files with route filter pushdown."""
+
+import json
+import re
+import sys
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+STATION_COLUMNS = ('route', 'station', 'municipality', 'prefecture')
+OPTIONAL_COLUMNS = ('lat', 'lon')
+STDIN_PATH = '-'
+DEFAULT_CHUNK_SIZE = 100000
+
+# 拡張子 → 入力形式（長い拡張子を先に判定する）
+INPUT_FORMATS = (
+    ('.csv.gz', 'csv'),
+    ('.jsonl', 'jsonl'),
+    ('.ndjson', 'jsonl'),
+    ('.json', 'json'),
+    ('.parquet', 'parquet'),
+    ('.csv', 'csv'),
+)
+STDIN_FORMAT = 'jsonl'
+
+_READ_SIZE = 64 * 1024
+_SEPARATOR = re.compile(r'[\s,]*')
+
+
+def detect_input_format(path: Union[str, Path]) -> Optional[str]:
+    """Return the input format for path, or None if the extension is unknown."""
+    name = str(path).lower()
+    for suffix, fmt in INPUT_FORMATS:
+        if name.endswith(suffix):
+            return fmt
+    return None
+
+
+def route_mask(routes: Union[pd.Series, Sequence[str]], route_filters: Optional[Sequence[str]]) -> np.ndarray:
+    """Boolean mask of routes containing any of route_filters (case-insensitive substring)."""
+    routes = pd.Series(routes, dtype='object')
+    if not route_filters:
+        return np.ones(len(routes), dtype=bool)
+    pattern = '|'.join(re.escape(route_filter) for route_filter in route_filters)
+    return routes.str.contains(pattern, case=False, regex=True, na=False).to_numpy(dtype=bool)
+
+
+def iter_json_array(stream: IO[str]) -> Iterator[Any]:
+    """Yield the items of a top-level JSON array one at a time."""
+    decoder = json.JSONDecoder()
+    buf = stream.read(_READ_SIZE)
+    eof = not buf
+    pos = _SEPARATOR.match(buf).end()
+    while pos >= len(buf) and not eof:
+        chunk = stream.read(_READ_SIZE)
+        eof = not chunk
+        buf += chunk
+        pos = _SEPARATOR.match(buf).end()
+    if pos >= len(buf) or buf[pos] != '[':
+        raise ValueError("JSON station input must be an array of objects")
+    pos += 1
+    while True:
+        pos = _SEPARATOR.match(buf, pos).end()
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # 要素が読み込み済みの範囲を跨いでいる場合は続きを読む
+            if eof:
+                raise
+            chunk = stream.read(_READ_SIZE)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+
+
+def _check_columns(columns: Sequence[str], source: str) -> None:
+    missing = [column for column in STATION_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"Station input {source} is missing columns {missing}; found {list(columns)[:10]}")
+
+
+def _select(frame: pd.DataFrame, route_filters: Optional[Sequence[str]]) -> pd.DataFrame:
+    """Keep the station / coordinate columns and the rows of the requested routes."""
+    columns = list(STATION_COLUMNS) + [column for column in OPTIONAL_COLUMNS if column in frame.columns]
+    frame = frame[columns]
+    if route_filters:
+        frame = frame[route_mask(frame['route'], route_filters)]
+    return frame.reset_index(drop=True)
+
+
+def _batched(items: Iterator[Dict], chunk_size: int) -> Iterator[List[Dict]]:
+    batch: List[Dict] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= chunk_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _read_records(stream: IO[str], fmt: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Read JSON / JSON Lines records in chunks of chunk_size rows."""
+    if fmt == 'json':
+        items = iter_json_array(stream)
+    else:
+        items = (json.loads(line) for line in stream if line.strip())
+    for batch in _batched(items, chunk_size):
+        yield pd.DataFrame.from_records(batch)
+
+
+def _read_parquet(path: str, route_filters: Optional[Sequence[str]], chunk_size: int) -> Iterator[pd.DataFrame]:
+    """Read only the needed columns of a Parquet file, filtering routes inside pyarrow."""
+    try:
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+    except ImportError as e:
+        raise ImportError(
+            "Reading parquet requires pyarrow. Install it with: pip install 'allinn-tools[columnar]'"
+        ) from e
+    dataset = ds.dataset(path, format='parquet')
+    names = dataset.schema.names
+    _check_columns(names, path)
+    columns = list(STATION_COLUMNS) + [column for column in OPTIONAL_COLUMNS if column in names]
+    condition = None
+    for route_filter in route_filters or ():
+        matched = pc.match_substring(ds.field('route'), route_filter, ignore_case=True)
+        condition = matched if condition is None else condition | matched
+    for batch in dataset.to_batches(columns=columns, filter=condition, batch_size=chunk_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def read_station_chunks(path: Union[str, Path],
+                        fmt: Optional[str] = None,
+                        route_filters: Optional[Sequence[str]] = None,
+                        chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        stdin: Optional[IO[str]] = None) -> Iterator[pd.DataFrame]:
+    """Yield station DataFrames of at most chunk_size rows from path ('-' for stdin).
+
+    Each chunk has the columns route / station / municipality / prefecture
+    (plus lat / lon when present) and only the rows whose route contains
+    one of route_filters; other columns are dropped while reading.
+    """
+    path = str(path)
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+    fmt = fmt or (STDIN_FORMAT if path == STDIN_PATH else detect_input_format(path))
+    if fmt is None:
+        raise ValueError(f"Unknown station input format for {path}; use .json / .jsonl / .csv / .csv.gz / .parquet")
+
+    if fmt == 'parquet':
+        if path == STDIN_PATH:
+            raise ValueError("Parquet station input cannot be read from stdin")
+        yield from (_select(frame, route_filters) for frame in _read_parquet(path, route_filters, chunk_size))
+        return
+    if fmt not in ('csv', 'json', 'jsonl'):
+        raise ValueError(f"Unsupported station input format: {fmt}")
+
+    stream = None
+    if path == STDIN_PATH:
+        source = stdin or sys.stdin
+    elif fmt == 'csv':
+        source = path
+    else:
+        source = stream = open(path, 'r', encoding='utf-8')
+    if fmt == 'csv':
+        frames = pd.read_csv(source, dtype={column: str for column in STATION_COLUMNS},
+                             chunksize=chunk_size, encoding='utf-8')
+    else:
+        frames = _read_records(source, fmt, chunk_size)
+    try:
+        for frame in frames:
+            _check_columns(frame.columns, path)
+            selected = _select(frame, route_filters)
+            if len(selected):
+                yield selected
+    finally:
+        frames.close()
+        if stream is not None:
+            stream.close()
+
+
+def load_stations(path: Union[str, Path],
+                  fmt: Optional[str] = None,
+                  route_filters: Optional[Sequence[str]] = None,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Dict]:
+    """Read a whole station file (route filter applied while reading) as a list of dicts."""
+    frames = list(read_station_chunks(path, fmt, route_filters, chunk_size))
+    if not frames:
+        return []
+    frame = pd.concat(frames, ignore_index=True)
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
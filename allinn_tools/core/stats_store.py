@@ -0,0 +1,197 @@
+"""Array-backed store of area x indicator x year statistics."""
+
+import json
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from .cache import StatsRow
+
+STORE_FORMAT_VERSION = 1
+FLOAT32_DIGITS = 9  # 9 significant digits always round-trip a float32
+
+
+def _area_keys(area_codes: Iterable[Optional[str]]) -> np.ndarray:
+    """Convert area codes to integer keys (-1 for missing or non-numeric codes)."""
+    return np.fromiter(
+        (int(code) if isinstance(code, str) and code.isdigit() else -1 for code in area_codes),
+        dtype=np.int64
+    )
+
+
+def decimal_float64(values: np.ndarray) -> np.ndarray:
+    """Widen float32 values to float64 through their shortest decimal form.
+
+    A plain cast exposes float32 rounding error (1302.52 becomes
+    1302.5200195312). Each value is rounded to the fewest significant
+    digits (at most FLOAT32_DIGITS) that still round-trip to the same
+    float32, which gives the same result as formatting it with repr.
+    """
+    values = np.asarray(values, dtype=np.float32)
+    wide = values.astype(np.float64)
+    result = wide.copy()
+    pending = np.flatnonzero(np.isfinite(wide) & (wide != 0))
+    exponent = np.floor(np.log10(np.abs(wide[pending])))
+    # 10 のべき乗は 1e22 まで float64 で正確なので、丸めた整数との乗除で最も近い float64 になる。
+    # それを超える桁（ごく小さい・大きい値）だけは10進文字列を経由する
+    extreme = (exponent < FLOAT32_DIGITS - 23) | (exponent > 22)
+    result[pending[extreme]] = values[pending[extreme]].astype(str).astype(np.float64)
+    pending, exponent, target = pending[~extreme], exponent[~extreme], values[pending[~extreme]]
+    x = wide[pending]
+
+    def rounded(digits: np.ndarray) -> np.ndarray:
+        shift = digits - 1 - exponent
+        up, down = 10.0 ** np.maximum(shift, 0), 10.0 ** np.maximum(-shift, 0)
+        return np.round(x * up / down) * down / up
+
+    # 桁数を増やすと元の float32 に戻る値は戻り続けるので、戻る最小の桁数を二分探索する
+    low = np.ones(len(pending))
+    high = np.full(len(pending), float(FLOAT32_DIGITS))
+    while (low < high).any():
+        searching = low < high
+        middle = np.floor((low + high) / 2)
+        exact = rounded(middle).astype(np.float32) == target
+        high = np.where(searching & exact, middle, high)
+        low = np.where(searching & ~exact, middle + 1, low)
+    result[pending] = rounded(low)
+    return result
+
+
+def widen_float32_columns(frame: pd.DataFrame) -> pd.DataFrame:
+    """Return a DataFrame whose float32 columns are widened with ``decimal_float64``."""
+    columns = [column for column in frame.columns if frame[column].dtype == np.float32]
+    if not columns:
+        return frame
+    return frame.assign(**{column: decimal_float64(frame[column].to_numpy()) for column in columns})
+
+
+class StatsStore:
+    """Dense (area, indicator, year) matrix with NaN for missing values.
+
+    Area codes are kept as a sorted integer array and looked up with
+    binary search. ``save`` writes plain .npy files, so ``load`` can
+    memory-map one copy that several worker processes share.
+    """
+
+    AREA_CODES_FILE = 'area_codes.npy'
+    VALUES_FILE = 'values.npy'
+    META_FILE = 'meta.json'
+
+    def __init__(self,
+                 area_codes: np.ndarray,
+                 indicators: Sequence[str],
+                 years: Sequence[int],
+                 values: np.ndarray):
+        if values.shape != (len(area_codes), len(indicators), len(years)):
+            raise ValueError(
+                f"values shape {values.shape} does not match "
+                f"({len(area_codes)}, {len(indicators)}, {len(years)})"
+            )
+        self.area_codes = area_codes
+        self.indicators = list(indicators)
+        self.years = [int(year) for year in years]
+        self.values = values
+        self._indicator_positions = {code: i for i, code in enumerate(self.indicators)}
+        self._year_positions = {year: i for i, year in enumerate(self.years)}
+
+    @classmethod
+    def from_rows(cls,
+                  rows: Iterable[StatsRow],
+                  indicators: Sequence[str],
+                  years: Sequence[int],
+                  dtype: str = 'float64') -> 'StatsStore':
+        """Build a store from (area_code, cat01, time, value) rows.
+
+        Rows of other indicators or years are ignored; when a cell occurs
+        more than once the last row wins.
+        """
+        indicator_positions = {code: i for i, code in enumerate(indicators)}
+        year_positions = {int(year): i for i, year in enumerate(years)}
+        cells = [
+            (int(area_code), indicator_positions[cat01], year_positions[int(time_code[:4])], value)
+            for area_code, cat01, time_code, value in rows
+            if area_code.isdigit() and cat01 in indicator_positions and time_code[:4].isdigit()
+            and int(time_code[:4]) in year_positions
+        ]
+        area = np.array([cell[0] for cell in cells], dtype=np.int64)
+        area_codes = np.unique(area).astype(np.int32)
+        values = np.full((len(area_codes), len(indicators), len(years)), np.nan, dtype=dtype)
+        if cells:
+            values[
+                np.searchsorted(area_codes, area),
+                np.array([cell[1] for cell in cells]),
+                np.array([cell[2] for cell in cells]),
+            ] = np.array([np.nan if cell[3] is None else cell[3] for cell in cells], dtype=dtype)
+        return cls(area_codes, indicators, years, values)
+
+    def __len__(self) -> int:
+        return len(self.area_codes)
+
+    @property
+    def nbytes(self) -> int:
+        return self.area_codes.nbytes + self.values.nbytes
+
+    def area_code_strings(self) -> List[str]:
+        """Return the area codes as 5-digit strings."""
+        return [f"{code:05d}" for code in self.area_codes]
+
+    def positions(self, area_codes: Iterable[Optional[str]]) -> np.ndarray:
+        """Return the row of each area code (-1 if the store has no such area)."""
+        keys = _area_keys(area_codes)
+        if len(self.area_codes) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.area_codes, keys), len(self.area_codes) - 1)
+        return np.where(self.area_codes[positions] == keys, positions, -1)
+
+    def take(self,
+             area_codes: Iterable[Optional[str]],
+             indicators: Optional[Sequence[str]] = None,
+             years: Optional[Sequence[int]] = None) -> np.ndarray:
+        """Return an (areas, indicators, years) array, NaN for unknown areas or indicators."""
+        indicators = self.indicators if indicators is None else list(indicators)
+        years = self.years if years is None else [int(year) for year in years]
+        positions = self.positions(area_codes)
+
+        indicator_index = np.array([self._indicator_positions.get(code, -1) for code in indicators], dtype=np.int64)
+        year_index = np.array([self._year_positions.get(year, -1) for year in years], dtype=np.int64)
+        result = np.full((len(positions), len(indicators), len(years)), np.nan, dtype=self.values.dtype)
+
+        rows = positions >= 0
+        columns = indicator_index >= 0
+        times = year_index >= 0
+        if rows.any() and columns.any() and times.any():
+            selected = self.values[np.ix_(positions[rows], indicator_index[columns], year_index[times])]
+            result[np.ix_(rows, columns, times)] = selected
+        return result
+
+    def save(self, directory: Union[str, Path]) -> Path:
+        """Write the store as .npy files plus a small JSON header."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / self.AREA_CODES_FILE, self.area_codes)
+        np.save(directory / self.VALUES_FILE, self.values)
+        with open(directory / self.META_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                "format_version": STORE_FORMAT_VERSION,
+                "indicators": self.indicators,
+                "years": self.years,
+            }, f)
+        return directory
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> 'StatsStore':
+        """Load a saved store; with mmap=True the arrays are memory-mapped read-only."""
+        directory = Path(directory)
+        with open(directory / cls.META_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("format_version") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported stats store format {meta.get('format_version')!r} in {directory}")
+        mmap_mode = 'r' if mmap else None
+        return cls(
+            np.load(directory / cls.AREA_CODES_FILE, mmap_mode=mmap_mode),
+            meta["indicators"],
+            meta["years"],
+            np.load(directory / cls.VALUES_FILE, mmap_mode=mmap_mode)
+        )
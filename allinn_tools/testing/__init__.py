@@ -0,0 +1 @@
+"""Test and benchmark helpers for AllInn Tools (not used by the production commands)."""
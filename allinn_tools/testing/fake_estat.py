@@ -0,0 +1,217 @@
+"""Local stand-in for the e-Stat API serving synthetic or recorded tables."""
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+from ..core.municipality_index import BUNDLED_INDEX_PATH, PREFECTURES
+
+DEFAULT_UPDATED_DATE = '2023-06-30'
+MAX_EXTRA_AREAS = len(PREFECTURES) * 900  # 合成コードは各都道府県の 100〜999
+_DEFAULT_CAT01 = 'A1101'
+_DEFAULT_TIME = '2020100000'
+
+
+def _synthetic_value(cat01: str, area: str, time_code: str) -> str:
+    """Deterministic, plausible-looking value for a cell."""
+    seed = sum(ord(ch) * (i + 1) for i, ch in enumerate(cat01 + area + time_code))
+    if cat01.startswith('B'):
+        return f"{50 + seed % 1500}.{seed % 100:02d}"
+    return str(1000 + (seed * 7919) % 400000)
+
+
+class FakeEStatServer:
+    """Threaded HTTP server answering getStatsData and getMetaInfo like e-Stat.
+
+    Synthetic tables cover every municipality of the bundled index plus
+    ``extra_areas`` generated codes, for any cdCat01 / cdTime requested, so
+    the number of cells scales as areas x indicators x years. Cells are
+    generated per page, which keeps multi-million-cell tables cheap.
+    Recorded getStatsData responses (``<statsDataId>.json`` in
+    ``recordings``) replace the synthetic values of that table.
+    ``error_rate`` answers that fraction of requests with HTTP 503 to
+    exercise retries; requests without appId get RESULT.STATUS 100.
+    ``overrides`` maps (cat01, area, time) to a value, e.g. to simulate a
+    table revision together with a new ``updated_date``.
+    """
+
+    def __init__(self,
+                 extra_areas: int = 0,
+                 latency: float = 0.0,
+                 recordings: Optional[Union[str, Path]] = None,
+                 updated_date: str = DEFAULT_UPDATED_DATE,
+                 error_rate: float = 0.0,
+                 seed: int = 0,
+                 host: str = '127.0.0.1',
+                 port: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self.updated_date = updated_date
+        self.overrides: Dict[Tuple[str, str, str], str] = {}
+        self.requests: List[Tuple[str, Dict[str, str]]] = []
+        self._lock = threading.Lock()
+
+        with open(BUNDLED_INDEX_PATH, 'r', encoding='utf-8') as f:
+            entries = json.load(f)["entries"]
+        self.areas: Dict[str, str] = {
+            entry["code"]: f"{entry['prefecture']} {entry['name']}" for entry in entries
+        }
+        if extra_areas > MAX_EXTRA_AREAS:
+            raise ValueError(f"extra_areas must be at most {MAX_EXTRA_AREAS}, got {extra_areas}")
+        for i in range(extra_areas):
+            prefecture = i % len(PREFECTURES)
+            code = f"{prefecture + 1:02d}{999 - i // len(PREFECTURES):03d}"
+            self.areas.setdefault(code, f"{PREFECTURES[prefecture]} 合成{i}市")
+        self.area_codes = sorted(self.areas)
+
+        self.recorded: Dict[str, List[Dict[str, str]]] = {}
+        if recordings:
+            for path in Path(recordings).glob('*.json'):
+                with open(path, 'r', encoding='utf-8') as f:
+                    document = json.load(f)
+                values = document["GET_STATS_DATA"]["STATISTICAL_DATA"]["DATA_INF"]["VALUE"]
+                self.recorded[path.stem] = values if isinstance(values, list) else [values]
+
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeEStatServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeEStatServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                endpoint = parsed.path.rsplit('/', 1)[-1]
+                with server._lock:
+                    server.requests.append((endpoint, params))
+                    failed = server._random.random() < server.error_rate
+                if server.latency > 0:
+                    time.sleep(server.latency)
+
+                if failed:
+                    self.send_error(503)
+                    return
+                if 'appId' not in params:
+                    root = 'GET_META_INFO' if endpoint == 'getMetaInfo' else 'GET_STATS_DATA'
+                    body = {root: {"RESULT": server._result(100, '認証に失敗しました。'), "PARAMETER": params}}
+                elif endpoint == 'getStatsData':
+                    body = server.stats_data(params)
+                elif endpoint == 'getMetaInfo':
+                    body = server.meta_info(params)
+                else:
+                    self.send_error(404)
+                    return
+                payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+    @staticmethod
+    def _result(status: int = 0, message: str = '正常に終了しました。') -> Dict[str, Any]:
+        return {"STATUS": status, "ERROR_MSG": message}
+
+    def _cells(self, params: Dict[str, str]) -> Tuple[int, Any]:
+        """Return (cell count, cell(i) accessor) for the requested filters."""
+        stats_data_id = params.get('statsDataId', '')
+        cats = params.get('cdCat01', _DEFAULT_CAT01).split(',')
+        times = params.get('cdTime', _DEFAULT_TIME).split(',')
+        areas = self.area_codes
+        if 'cdArea' in params:
+            wanted = set(params['cdArea'].split(','))
+            areas = [code for code in areas if code in wanted]
+
+        if stats_data_id in self.recorded:
+            cat_set, time_set, area_set = set(cats), set(times), set(areas)
+            values = [
+                item for item in self.recorded[stats_data_id]
+                if item.get('@cat01') in cat_set and item.get('@time') in time_set
+                and item.get('@area') in area_set
+            ]
+            return len(values), values.__getitem__
+
+        per_cat = len(times) * len(areas)
+
+        def cell(i: int) -> Dict[str, str]:
+            cat01 = cats[i // per_cat]
+            time_code = times[i % per_cat // len(areas)]
+            area = areas[i % len(areas)]
+            return {"@tab": "00001", "@cat01": cat01, "@area": area, "@time": time_code,
+                    "@unit": "人",
+                    "$": self.overrides.get((cat01, area, time_code)) or _synthetic_value(cat01, area, time_code)}
+
+        return len(cats) * per_cat, cell
+
+    def stats_data(self, params: Dict[str, str]) -> Dict[str, Any]:
+        """Build a getStatsData response page (startPosition / limit / NEXT_KEY)."""
+        total, cell = self._cells(params)
+        start = int(params.get('startPosition', 1))
+        limit = int(params.get('limit', 100000))
+        end = min(total, start - 1 + limit)
+        if total == 0:
+            return {"GET_STATS_DATA": {
+                "RESULT": self._result(1, '正常に終了しましたが、該当データはありませんでした。'),
+                "PARAMETER": params,
+            }}
+
+        result_inf: Dict[str, Any] = {"TOTAL_NUMBER": total, "FROM_NUMBER": start, "TO_NUMBER": end}
+        if end < total:
+            result_inf["NEXT_KEY"] = end + 1
+        return {"GET_STATS_DATA": {
+            "RESULT": self._result(),
+            "PARAMETER": params,
+            "STATISTICAL_DATA": {
+                "RESULT_INF": result_inf,
+                "TABLE_INF": {"@id": params.get('statsDataId', ''), "UPDATED_DATE": self.updated_date},
+                "DATA_INF": {"VALUE": [cell(i) for i in range(start - 1, end)]},
+            },
+        }}
+
+    def meta_info(self, params: Dict[str, str]) -> Dict[str, Any]:
+        """Build a getMetaInfo response listing the served area codes."""
+        area_class = [{"@code": code, "@name": name, "@level": "3"} for code, name in self.areas.items()]
+        return {"GET_META_INFO": {
+            "RESULT": self._result(),
+            "PARAMETER": params,
+            "METADATA_INF": {
+                "TABLE_INF": {"@id": params.get('statsDataId', ''), "UPDATED_DATE": self.updated_date},
+                "CLASS_INF": {"CLASS_OBJ": [
+                    {"@id": "cat01", "@name": "指標", "CLASS": [{"@code": _DEFAULT_CAT01, "@name": "総人口"}]},
+                    {"@id": "area", "@name": "地域", "CLASS": area_class},
+                ]},
+            },
+        }}
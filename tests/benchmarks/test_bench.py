@@ -0,0 +1,74 @@
+"""pytest-benchmark suite for the fetch / join / resolve / catchment hot paths.
+
+Run with ``pytest tests/benchmarks --benchmark-autosave`` and compare runs
+with ``--benchmark-compare --benchmark-compare-fail=mean:20%``. Skipped
+when pytest-benchmark is not installed; ``allinn bench`` covers the
+end-to-end and startup measurements in separate processes.
+"""
+
+import logging
+
+import numpy as np
+import pytest
+
+from allinn_tools.commands.shinkansen import EStatAPIClient, ShinkansenCommand
+from allinn_tools.testing.fake_estat import FakeEStatServer
+from allinn_tools.core.mesh import PointGrid
+from allinn_tools.core.municipality_index import BUNDLED_INDEX_PATH, load_municipality_index
+
+pytest.importorskip('pytest_benchmark')
+
+LOGGER = logging.getLogger(__name__)
+EXTRA_AREAS = 2000
+YEARS = [2010, 2015, 2020]
+
+
+@pytest.fixture(scope='module')
+def fake_estat_large():
+    with FakeEStatServer(extra_areas=EXTRA_AREAS) as server:
+        yield server
+
+
+def _client(server: FakeEStatServer) -> EStatAPIClient:
+    return EStatAPIClient(api_key='bench', sleep_time=0, fetch_mode='full', years=YEARS, base_url=server.url)
+
+
+def test_fetch(benchmark, fake_estat_large):
+    def fetch():
+        client = _client(fake_estat_large)
+        assert client._fetch_all_data(LOGGER)
+        return client
+
+    client = benchmark(fetch)
+    benchmark.extra_info['cells'] = int(np.count_nonzero(~np.isnan(client.store.values)))
+
+
+def test_join(benchmark, fake_estat_large):
+    client = _client(fake_estat_large)
+    assert client._fetch_all_data(LOGGER)
+    command = ShinkansenCommand()
+    stations = command._load_station_data() * 100
+
+    benchmark(command._create_csv, stations, client)
+
+
+def test_resolve_distinct_names(benchmark):
+    index = load_municipality_index(str(BUNDLED_INDEX_PATH))
+    rng = np.random.default_rng(0)
+    alphabet = list('静岡市川崎横浜大町田中山上下東西南北')
+    names = sorted({''.join(rng.choice(alphabet, size=rng.integers(2, 7))) for _ in range(20000)})
+
+    def resolve():
+        index._memo.clear()
+        return index.resolve_many(names, fuzzy=True)
+
+    benchmark(resolve)
+    benchmark.extra_info['names'] = len(names)
+
+
+def test_catchment_sum(benchmark):
+    rng = np.random.default_rng(0)
+    grid = PointGrid(rng.uniform(33, 37, 400000), rng.uniform(130, 140, 400000), rng.uniform(0, 100, 400000))
+    lat, lon = rng.uniform(33, 37, 5000), rng.uniform(130, 140, 5000)
+
+    benchmark(grid.sum_within, lat, lon, 5.0)
@@ -0,0 +1,62 @@
+"""Shared fixtures: a local e-Stat stand-in and helpers to run against it."""
+
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import pandas as pd
+import pytest
+
+from allinn_tools.commands.shinkansen import EStatAPIClient, ShinkansenCommand
+from allinn_tools.core.cache import StatsCache
+from allinn_tools.testing.fake_estat import FakeEStatServer
+
+
+@pytest.fixture
+def fake_estat() -> Iterator[FakeEStatServer]:
+    with FakeEStatServer() as server:
+        yield server
+
+
+@pytest.fixture
+def cache_dir(tmp_path: Path) -> Path:
+    return tmp_path / 'cache'
+
+
+@pytest.fixture
+def make_client(cache_dir: Path) -> Callable[..., EStatAPIClient]:
+    """Build an EStatAPIClient for a server with no request spacing and a short retry backoff."""
+    def make(server: FakeEStatServer, **options: Any) -> EStatAPIClient:
+        client = EStatAPIClient(
+            api_key='test',
+            sleep_time=0,
+            stats_cache=StatsCache(cache_dir=options.pop('cache_dir', cache_dir)),
+            base_url=server.url,
+            **options
+        )
+        client.retry_policy.backoff = 0.01
+        return client
+    return make
+
+
+@pytest.fixture
+def run_shinkansen(tmp_path: Path, cache_dir: Path) -> Callable[..., pd.DataFrame]:
+    """Run the shinkansen command against a server and read back its CSV output."""
+    runs = iter(range(1_000_000))
+
+    def run(server: FakeEStatServer, **options: Any) -> pd.DataFrame:
+        output = tmp_path / f"output_{next(runs)}.csv"
+        options.setdefault('cache_dir', str(cache_dir))
+        ShinkansenCommand().run(output=str(output), api_key='test', sleep=0, base_url=server.url, **options)
+        return pd.read_csv(output)
+    return run
+
+
+def sort_rows(frame: pd.DataFrame) -> pd.DataFrame:
+    """Order rows by station (and year) so outputs written in different orders compare equal."""
+    keys = [column for column in ('route', 'station', 'municipality', 'prefecture', 'year') if column in frame.columns]
+    return frame.sort_values(keys).reset_index(drop=True)
+
+
+@pytest.fixture
+def sorted_rows() -> Callable[[pd.DataFrame], pd.DataFrame]:
+    return sort_rows
@@ -0,0 +1,54 @@
+"""Materialized route / prefecture / national aggregates."""
+
+import json
+
+import pandas as pd
+import pytest
+
+from allinn_tools.commands.shinkansen import STATIONS_PATH
+from allinn_tools.core.aggregates import ROLLUP_LEVELS, STATION_COLUMNS, AggregateStore
+
+
+@pytest.fixture
+def stations():
+    with open(STATIONS_PATH, 'r', encoding='utf-8') as f:
+        frame = pd.DataFrame(json.load(f), columns=['route', 'station', 'municipality', 'prefecture'])
+    codes = frame.groupby(['prefecture', 'municipality']).ngroup()
+    return frame.assign(
+        year=2020,
+        population=(codes + 1) * 1000.0,
+        area_km2=(codes % 7 + 1) * 10.0,
+    ).assign(population_density_km2=lambda df: df['population'] / df['area_km2'])
+
+
+def _station_rows(store: AggregateStore, key: str) -> pd.DataFrame:
+    return store._station_rows(key).sort_values(['route', 'station', 'year']).reset_index(drop=True)
+
+
+def test_materialize_is_fresh_when_values_do_not_change(tmp_path, stations):
+    store = AggregateStore(tmp_path)
+    key, status, _ = store.materialize(stations)
+    assert status == 'built'
+    assert store.materialize(stations.sample(frac=1, random_state=0)) == (key, 'fresh', {})
+
+
+def test_incremental_update_equals_full_build(tmp_path, stations):
+    store = AggregateStore(tmp_path / 'incremental')
+    store.materialize(stations)
+    changed = stations.copy()
+    mask = changed['municipality'] == '静岡市'
+    changed.loc[mask, 'population'] *= 3
+    changed['population_density_km2'] = changed['population'] / changed['area_km2']
+
+    key, status, counts = store.materialize(changed)
+    assert status == 'updated'
+    assert counts['municipalities_changed'] == 1
+    assert counts['station_rows_written'] < len(changed)
+
+    full = AggregateStore(tmp_path / 'full')
+    full_key, _, _ = full.materialize(changed)
+    assert full_key == key
+    for level in ROLLUP_LEVELS:
+        pd.testing.assert_frame_equal(store.rollups(key, level), full.rollups(key, level))
+    pd.testing.assert_frame_equal(_station_rows(store, key), _station_rows(full, key))
+    assert list(_station_rows(store, key).columns) == STATION_COLUMNS
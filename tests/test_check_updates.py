@@ -0,0 +1,45 @@
+"""--check_updates: table versions recorded per cache entry (against FakeEStatServer)."""
+
+SHIZUOKA_2020 = ('A1101', '22100', '2020100000')
+
+
+def _population(frame, municipality='静岡市'):
+    return frame.loc[frame['municipality'] == municipality, 'population'].unique().tolist()
+
+
+def test_renew_never_revives_entries_of_an_older_table_version(fake_estat, run_shinkansen):
+    options = {'check_updates': True, 'route_filter': ['東海道']}
+    first = run_shinkansen(fake_estat, **options)
+    assert _population(first) != [1]
+
+    # 統計表が更新され、2020年の静岡市の総人口が変わる
+    fake_estat.updated_date = '2030-01-01'
+    fake_estat.overrides[SHIZUOKA_2020] = '1'
+    # 2015年だけを取得すると、統計表の新しい更新日が記録される
+    run_shinkansen(fake_estat, years='2015', **options)
+
+    # 2020年のキャッシュは古い更新日で取得したものなので、有効期限を延長せず再取得する
+    third = run_shinkansen(fake_estat, years='2020', **options)
+    assert _population(third) == [1]
+
+
+def test_unchanged_table_is_served_from_cache(fake_estat, run_shinkansen):
+    options = {'check_updates': True, 'route_filter': ['東海道']}
+    first = run_shinkansen(fake_estat, **options)
+    stats_requests = sum(endpoint == 'getStatsData' for endpoint, _ in fake_estat.requests)
+
+    second = run_shinkansen(fake_estat, **options)
+
+    assert sum(endpoint == 'getStatsData' for endpoint, _ in fake_estat.requests) == stats_requests
+    assert second.equals(first)
+
+
+def test_updated_table_is_refetched(fake_estat, run_shinkansen):
+    options = {'check_updates': True, 'route_filter': ['東海道']}
+    run_shinkansen(fake_estat, **options)
+
+    fake_estat.updated_date = '2030-01-01'
+    fake_estat.overrides[SHIZUOKA_2020] = '1'
+    updated = run_shinkansen(fake_estat, **options)
+
+    assert _population(updated) == [1]
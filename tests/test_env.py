@@ -0,0 +1,27 @@
+"""API key lookup shared by the commands that call e-Stat."""
+
+import pytest
+
+from allinn_tools.commands.build_index import BuildIndexCommand
+from allinn_tools.core import env
+from allinn_tools.core.env import resolve_api_key
+
+
+@pytest.fixture(autouse=True)
+def no_api_key(monkeypatch):
+    monkeypatch.setattr(env, '_loaded', True)  # .env を読まない
+    monkeypatch.delenv('ESTAT_API_KEY', raising=False)
+
+
+def test_resolve_api_key(monkeypatch):
+    assert resolve_api_key('argument') == 'argument'
+    assert resolve_api_key(None, offline=True) is None
+    with pytest.raises(ValueError, match='ESTAT_API_KEY'):
+        resolve_api_key(None)
+    monkeypatch.setenv('ESTAT_API_KEY', 'from-env')
+    assert resolve_api_key(None) == 'from-env'
+
+
+def test_build_index_requires_api_key(tmp_path):
+    with pytest.raises(ValueError, match='ESTAT_API_KEY'):
+        BuildIndexCommand().run(cache_dir=str(tmp_path))
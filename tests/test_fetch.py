@@ -0,0 +1,60 @@
+"""Fetching from e-Stat: pagination, retries and the persistent cache (against FakeEStatServer)."""
+
+import logging
+
+import numpy as np
+import pytest
+
+from allinn_tools.testing.fake_estat import FakeEStatServer
+
+LOGGER = logging.getLogger(__name__)
+
+
+def _stats_requests(server: FakeEStatServer) -> int:
+    return sum(endpoint == 'getStatsData' for endpoint, _ in server.requests)
+
+
+@pytest.mark.parametrize('fetch_mode', ['full', 'targeted'])
+def test_paginated_fetch_equals_unpaginated(fake_estat, make_client, tmp_path, fetch_mode):
+    area_codes = ['13101', '22100', '27100', '40130']
+    options = {'fetch_mode': fetch_mode, 'years': [2015, 2020], 'indicators': 'A1301'}
+    whole = make_client(fake_estat, cache_dir=tmp_path / 'whole', **options)
+    assert whole._fetch_all_data(LOGGER, area_codes=area_codes)
+    unpaginated = _stats_requests(fake_estat)
+
+    paged = make_client(fake_estat, cache_dir=tmp_path / 'paged', page_size=7, **options)
+    assert paged._fetch_all_data(LOGGER, area_codes=area_codes)
+
+    assert _stats_requests(fake_estat) - unpaginated > unpaginated
+    np.testing.assert_array_equal(paged.get_timeseries_values(area_codes), whole.get_timeseries_values(area_codes))
+
+
+def test_fetch_retries_injected_errors(make_client, tmp_path):
+    options = {'fetch_mode': 'full', 'page_size': 50, 'retries': 10}
+    with FakeEStatServer() as clean:
+        expected = make_client(clean, cache_dir=tmp_path / 'clean', **options)
+        assert expected._fetch_all_data(LOGGER)
+        clean_requests = len(clean.requests)
+
+    with FakeEStatServer(error_rate=0.3, seed=3) as flaky:
+        client = make_client(flaky, cache_dir=tmp_path / 'flaky', **options)
+        assert client._fetch_all_data(LOGGER)
+        assert len(flaky.requests) > clean_requests
+
+    codes = expected.store.area_code_strings()
+    np.testing.assert_array_equal(client.get_timeseries_values(codes), expected.get_timeseries_values(codes))
+
+
+def test_offline_mode_reads_cache(fake_estat, run_shinkansen, sorted_rows):
+    online = run_shinkansen(fake_estat, route_filter=['東海道'])
+    requests = len(fake_estat.requests)
+
+    offline = run_shinkansen(fake_estat, route_filter=['東海道'], offline=True)
+
+    assert len(fake_estat.requests) == requests
+    assert sorted_rows(offline).equals(sorted_rows(online))
+
+
+def test_offline_mode_without_cache_fails(fake_estat, run_shinkansen):
+    with pytest.raises(Exception):
+        run_shinkansen(fake_estat, route_filter=['東海道'], offline=True)
@@ -0,0 +1,41 @@
+"""Indicator specs and derived metrics."""
+
+import pandas as pd
+import pytest
+
+from allinn_tools.core.indicators import evaluate_derived, group_by_table, parse_indicators, resolve_indicators
+
+
+def test_resolve_indicators_adds_base_indicators_once():
+    codes = [indicator.code for indicator in resolve_indicators(['A1301', 'A1101', 'A1301'])]
+    assert codes == ['A1101', 'B1101', 'A1301']
+
+
+def test_table_override_of_base_indicator_is_honoured():
+    indicators = {indicator.code: indicator for indicator in resolve_indicators(['0000099999:A1101'])}
+    assert indicators['A1101'].stats_data_id == '0000099999'
+    assert indicators['A1101'].column == 'population'
+    assert '0000099999' in group_by_table(indicators.values())
+
+
+def test_conflicting_tables_are_rejected():
+    with pytest.raises(ValueError, match='A1301'):
+        resolve_indicators(['0000099999:A1301', 'A1301'])
+
+
+def test_unknown_indicator_needs_table():
+    with pytest.raises(ValueError):
+        resolve_indicators(['Z9999'])
+    assert resolve_indicators(['0000012345:Z9999'])[-1].stats_data_id == '0000012345'
+
+
+def test_parse_indicators():
+    assert parse_indicators(' A1301, ,A6108') == ['A1301', 'A6108']
+    assert parse_indicators(None) == []
+
+
+def test_evaluate_derived_division_by_zero_is_nan():
+    df = pd.DataFrame({'population': [100.0, 50.0], 'area_km2': [4.0, 0.0]})
+    assert 'population_density_km2' in evaluate_derived(df)
+    assert df['population_density_km2'].iloc[0] == 25.0
+    assert pd.isna(df['population_density_km2'].iloc[1])
@@ -0,0 +1,66 @@
+"""JIS X 0410 mesh decoding and PointGrid radius sums."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from allinn_tools.core.mesh import PointGrid, haversine_km, mesh_to_latlon, parse_radii
+
+
+def test_mesh_to_latlon_levels():
+    # 5339: 東京付近の1次メッシュ（南西端 北緯 35度40分・東経 139度）
+    lat, lon, height, width = mesh_to_latlon(['5339', '533945', '53394599', '533945994'])
+    np.testing.assert_allclose(lat - height / 2, [53 / 1.5, 53 / 1.5 + 4 / 12, 53 / 1.5 + 4 / 12 + 9 / 120,
+                                                 53 / 1.5 + 4 / 12 + 9 / 120 + 1 / 240])
+    np.testing.assert_allclose(lon - width / 2, [139.0, 139.625, 139.625 + 9 / 80, 139.625 + 9 / 80 + 1 / 160])
+    np.testing.assert_allclose(height, [2 / 3, 1 / 12, 1 / 120, 1 / 240])
+
+
+def test_mesh_to_latlon_rejects_invalid_codes():
+    with pytest.raises(ValueError):
+        mesh_to_latlon(['53394'])
+
+
+def test_sum_within_matches_brute_force():
+    rng = np.random.default_rng(0)
+    lat, lon = rng.uniform(34, 36, 20000), rng.uniform(135, 140, 20000)
+    values = rng.uniform(0, 100, 20000)
+    grid = PointGrid(lat, lon, values)
+
+    query_lat, query_lon = rng.uniform(34, 36, 200), rng.uniform(135, 140, 200)
+    expected = [values[haversine_km(a, b, lat, lon) <= 7.5].sum() for a, b in zip(query_lat, query_lon)]
+    np.testing.assert_allclose(grid.sum_within(query_lat, query_lon, 7.5), expected)
+
+
+def test_sum_within_missing_and_outside_coverage():
+    grid = PointGrid(np.array([35.0, 35.01]), np.array([139.0, 139.01]), np.array([10.0, 5.0]))
+    result = grid.sum_within([35.0, np.nan, 45.0, 35.045], [139.0, 139.0, 139.0, 139.0], 3)
+    assert result[0] == 15.0
+    assert np.isnan(result[1])   # 緯度経度が欠損
+    assert np.isnan(result[2])   # メッシュの範囲外
+    assert result[3] == 0.0      # 範囲内だが半径内にメッシュが無い
+
+
+def test_parse_radii():
+    assert parse_radii('10,3, 5') == [3.0, 5.0, 10.0]
+    with pytest.raises(ValueError):
+        parse_radii('-1')
+
+
+def test_catchment_per_row_for_duplicate_names(fake_estat, run_shinkansen, tmp_path):
+    # 同じ自治体に同名の地点が3つ（別々のメッシュ上）あっても、行ごとに駅勢圏を計算する
+    codes, populations = ['52382500', '52383500', '52384500'], [100, 20, 3]
+    lat, lon, _, _ = mesh_to_latlon(codes)
+    stations = tmp_path / 'stations.csv'
+    pd.DataFrame({'route': '東海道新幹線', 'station': 'コンビニ', 'municipality': '静岡市', 'prefecture': '静岡県',
+                  'lat': lat, 'lon': lon}).to_csv(stations, index=False)
+    mesh = tmp_path / 'mesh.csv'
+    pd.DataFrame({'mesh_code': codes, 'population': populations}).to_csv(mesh, index=False)
+
+    options = {'stations': str(stations), 'catchment_km': 0.5, 'mesh_data': str(mesh)}
+    latest = run_shinkansen(fake_estat, **options)
+    assert sorted(latest['catchment_population_0.5km']) == sorted(populations)
+
+    long = run_shinkansen(fake_estat, years='2015,2020', layout='long', **options)
+    assert sorted(long['catchment_population_0.5km']) == sorted(populations * 2)
+    assert long.groupby('year')['catchment_population_0.5km'].apply(sorted).tolist() == [sorted(populations)] * 2
@@ -0,0 +1,117 @@
+"""Municipality name resolution against the bundled index."""
+
+import pandas as pd
+import pytest
+
+from allinn_tools.commands.resolve import ResolveCommand
+from allinn_tools.core.municipality_index import (
+    BUNDLED_INDEX_PATH,
+    canonical_prefecture,
+    generated_index_path,
+    load_municipality_index,
+    split_type,
+    write_index,
+)
+
+
+@pytest.fixture(scope='module')
+def index():
+    return load_municipality_index(str(BUNDLED_INDEX_PATH))
+
+
+@pytest.mark.parametrize('name, prefecture, code, method', [
+    ('静岡市', '静岡県', '22100', 'exact'),
+    ('静岡県静岡市', None, '22100', 'exact'),
+    ('東京都千代田区', None, '13101', 'exact'),
+    ('横浜市港北区', None, '14100', 'ward'),
+    ('清水市', '静岡県', '22100', 'alias'),
+    ('静岡', '静岡県', '22100', 'prefix'),
+    ('さいだま市', None, '11100', 'fuzzy'),
+])
+def test_resolve(index, name, prefecture, code, method):
+    resolution = index.resolve(name, prefecture)
+    assert (resolution.code, resolution.method) == (code, method)
+
+
+@pytest.mark.parametrize('name, prefecture', [
+    # 富士宮市はシード版に無いが、実在の自治体名なので富士市に置き換えない
+    ('富士宮市', '静岡県'),
+    ('富士宮市', None),
+    # 語幹が2文字の名前はあいまい一致しない（府中市 → 安中市 にしない）
+    ('府中市', None),
+    # 種別（市・町）が違う名前は候補にしない
+    ('富士町', '静岡県'),
+])
+def test_no_substitution_by_another_municipality(index, name, prefecture):
+    resolution = index.resolve(name, prefecture)
+    assert resolution.code is None
+    assert resolution.method not in ('prefix', 'fuzzy') or resolution.ambiguous
+
+
+def test_existing_name_in_another_prefecture_is_not_fuzzy_matched(index):
+    # 静岡市は静岡県にしかないため、別の都道府県を指定しても近い名前に置き換えない
+    resolution = index.resolve('静岡市', '山梨県')
+    assert resolution.code is None
+    assert resolution.method is None
+
+
+def test_fuzzy_is_opt_in(index):
+    assert index.resolve('さいだま市', fuzzy=False).code is None
+    assert index.resolve('静岡', '静岡県', fuzzy=False).code is None
+    assert index.resolve('清水市', '静岡県', fuzzy=False).code == '22100'
+
+
+def test_resolve_many_matches_resolve(index):
+    names = ['静岡市', '清水市', 'さいだま市', '富士宮市', '静岡市', None]
+    prefectures = ['静岡県', None, None, '静岡県', '静岡県', None]
+    assert index.resolve_many(names, prefectures) == [
+        index.resolve(name, prefecture) for name, prefecture in zip(names, prefectures)
+    ]
+
+
+@pytest.mark.parametrize('name, prefecture, code', [
+    ('静岡市', '静岡', '22100'),
+    ('大阪市北区', '大阪', '27100'),
+    ('千代田区', '東京', '13101'),
+    ('静岡県静岡市', '静岡', '22100'),
+])
+def test_prefecture_without_suffix(index, name, prefecture, code):
+    assert index.resolve(name, prefecture).code == code
+    assert index.resolve_many([name], [prefecture])[0].code == code
+
+
+def test_canonical_prefecture():
+    assert canonical_prefecture('静岡') == '静岡県'
+    assert canonical_prefecture('東京') == '東京都'
+    assert canonical_prefecture('北海道') == '北海道'
+    assert canonical_prefecture('') is None
+    assert canonical_prefecture(None) is None
+
+
+def test_resolve_cache_is_keyed_on_normalized_names(index):
+    index.resolve('静岡市', '静岡県')
+    hits = index._resolve_normalized.cache_info().hits
+    assert index.resolve('静岡市 ', '静岡').code == '22100'
+    assert index._resolve_normalized.cache_info().hits == hits + 1
+    assert index._resolve_normalized.cache_info().maxsize is not None
+
+
+def test_split_type():
+    assert split_type('富士宮市') == ('富士宮', '市')
+    assert split_type('市') == ('市', '')
+    assert split_type('さいたま') == ('さいたま', '')
+
+
+def test_resolve_command_uses_cache_dir_index(tmp_path):
+    # build-index の生成物にだけある自治体を、同じ --cache_dir で名寄せできる
+    cache_dir = tmp_path / 'cache'
+    write_index([{'code': '22210', 'name': '富士宮市', 'prefecture': '静岡県'}], generated_index_path(cache_dir),
+                source='test')
+    names = tmp_path / 'names.csv'
+    pd.DataFrame({'municipality': ['富士宮市', 'さいだま市'], 'prefecture': ['静岡', None]}).to_csv(names, index=False)
+    output = tmp_path / 'resolved.csv'
+    ResolveCommand().run(input=str(names), output=str(output), cache_dir=str(cache_dir))
+
+    resolved = pd.read_csv(output, dtype=str)
+    assert resolved['area_code'].tolist()[0] == '22210'
+    assert pd.isna(resolved['area_code'].tolist()[1])  # あいまい一致は既定で無効
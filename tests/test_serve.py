@@ -0,0 +1,33 @@
+"""serve: POST /refresh and the periodic refresh re-fetch from e-Stat (against FakeEStatServer)."""
+
+from allinn_tools.commands.serve import ServeCommand
+
+SHIZUOKA_2020 = ('A1101', '22100', '2020100000')
+
+
+def _population(service):
+    stations = service.snapshot.stations
+    return stations.loc[stations['municipality'] == '静岡市', 'population'].unique().tolist()
+
+
+def test_refresh_bypasses_the_cache_and_closes_the_old_session(fake_estat, cache_dir):
+    server, service = ServeCommand().create_server(port=0, sleep=0, api_key='test', cache_dir=str(cache_dir),
+                                                   base_url=fake_estat.url)
+    try:
+        first = service.snapshot
+        assert _population(service) != [1]
+        closed = []
+        first.client.session.close = lambda: closed.append(True)
+
+        # キャッシュの有効期限内でも、再取得では e-Stat の新しい値を読む
+        fake_estat.overrides[SHIZUOKA_2020] = '1'
+        assert service.load(refresh=True)
+        assert _population(service) == [1]
+        assert closed == [True]
+
+        # 通常の読み込み（起動時）はキャッシュを使う
+        stats_requests = sum(endpoint == 'getStatsData' for endpoint, _ in fake_estat.requests)
+        assert service.load()
+        assert sum(endpoint == 'getStatsData' for endpoint, _ in fake_estat.requests) == stats_requests
+    finally:
+        server.server_close()
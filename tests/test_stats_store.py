@@ -0,0 +1,27 @@
+"""Widening float32 output columns to float64 without float32 rounding noise."""
+
+import numpy as np
+import pandas as pd
+
+from allinn_tools.core.stats_store import decimal_float64, widen_float32_columns
+
+
+def test_decimal_float64_matches_shortest_repr():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([
+        rng.uniform(0, 20000, 5000),
+        np.round(rng.uniform(0, 5000, 5000), 2),
+        10 ** rng.uniform(-30, 30, 5000) * rng.choice([-1, 1], 5000),
+        [0, -0.0, np.nan, np.inf, -np.inf, 16777216, 1302.52, 3.4e38, 1.4e-45],
+    ]).astype(np.float32)
+    expected = values.astype(str).astype(np.float64)
+    np.testing.assert_array_equal(decimal_float64(values), expected)
+    assert decimal_float64(np.array([1302.52], dtype=np.float32))[0] == 1302.52
+
+
+def test_widen_float32_columns():
+    frame = pd.DataFrame({'density': np.array([1302.52, np.nan], dtype=np.float32), 'population': [1, 2]})
+    widened = widen_float32_columns(frame)
+    assert widened['density'].dtype == np.float64
+    assert widened['density'].tolist()[0] == 1302.52
+    assert widened['population'].tolist() == [1, 2]
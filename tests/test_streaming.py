@@ -0,0 +1,88 @@
+"""Streaming (--chunk_size) and prefecture-sharded (--workers) output must match the in-memory output."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from allinn_tools.commands.shinkansen import STATIONS_PATH
+from allinn_tools.core.mesh import load_mesh_grid
+
+
+@pytest.fixture
+def stations_csv(tmp_path):
+    with open(STATIONS_PATH, 'r', encoding='utf-8') as f:
+        stations = json.load(f)
+    path = tmp_path / 'stations.csv'
+    # 同じ駅を複数回含め、チャンク・分割の境界をまたぐようにする
+    pd.DataFrame([dict(station, copy=i) for i in range(3) for station in stations]).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'years': '2015,2020', 'layout': 'long'},
+    {'years': '2015,2020', 'layout': 'wide'},
+], ids=['latest', 'long', 'wide'])
+@pytest.mark.parametrize('mode', [{'chunk_size': 97}, {'workers': 2, 'chunk_size': 150}], ids=['streaming', 'sharded'])
+def test_chunked_output_equals_in_memory(fake_estat, run_shinkansen, sorted_rows, stations_csv, options, mode):
+    in_memory = run_shinkansen(fake_estat, stations=stations_csv, **options)
+    chunked = run_shinkansen(fake_estat, stations=stations_csv, **options, **mode)
+
+    assert list(chunked.columns) == list(in_memory.columns)
+    assert len(chunked) == len(in_memory)
+    pd.testing.assert_frame_equal(sorted_rows(chunked), sorted_rows(in_memory))
+
+
+def test_streaming_keeps_input_order(fake_estat, run_shinkansen, stations_csv):
+    streamed = run_shinkansen(fake_estat, stations=stations_csv, chunk_size=97)
+
+    stations = pd.read_csv(stations_csv)
+    assert streamed['station'].tolist() == stations['station'].tolist()
+
+
+def mesh_code(lat: float, lon: float) -> str:
+    """Return the 3rd-level (1km) mesh code containing a point."""
+    p, a = divmod(lat * 1.5, 1)
+    u, b = divmod(lon - 100, 1)
+    q, a = divmod(a * 8, 1)
+    v, b = divmod(b * 8, 1)
+    return f"{int(p)}{int(u):02d}{int(q)}{int(v)}{int(a * 10)}{int(b * 10)}"
+
+
+@pytest.fixture
+def catchment_inputs(tmp_path):
+    with open(STATIONS_PATH, 'r', encoding='utf-8') as f:
+        stations = json.load(f)
+    # 同名の駅を別々の位置に3回ずつ置き、各位置のメッシュに異なる人口を入れる
+    rows = [dict(station, lat=station['lat'] + 0.2 * i) for i in range(3) for station in stations]
+    stations_path = tmp_path / 'stations_latlon.csv'
+    pd.DataFrame(rows).to_csv(stations_path, index=False)
+    codes = sorted({mesh_code(row['lat'], row['lon']) for row in rows})
+    mesh_path = tmp_path / 'mesh.csv'
+    pd.DataFrame({'mesh_code': codes, 'population': np.arange(len(codes)) * 10 + 1}).to_csv(mesh_path, index=False)
+    return str(stations_path), str(mesh_path)
+
+
+@pytest.mark.parametrize('options', [{}, {'years': '2015,2020', 'layout': 'long'}], ids=['latest', 'long'])
+def test_catchment_with_repeated_station_names(fake_estat, run_shinkansen, catchment_inputs, options):
+    stations_path, mesh_path = catchment_inputs
+    options = dict(options, stations=stations_path, catchment_km=1, mesh_data=mesh_path)
+    stations = pd.read_csv(stations_path)
+    expected = load_mesh_grid(mesh_path).sum_within(stations['lat'].to_numpy(), stations['lon'].to_numpy(), 1)
+    if 'years' in options:
+        expected = np.repeat(expected, 2)
+
+    def sort_with_catchment(frame):
+        keys = [column for column in ('route', 'station', 'municipality', 'prefecture', 'year') if column in frame.columns]
+        return frame.sort_values(keys + ['catchment_population_1km']).reset_index(drop=True)
+
+    # ストリーミングは入力順に書くので、行ごとの期待値と位置で比較できる
+    streamed = run_shinkansen(fake_estat, chunk_size=97, **options)
+    np.testing.assert_array_equal(streamed['catchment_population_1km'].to_numpy(dtype='float64'), expected)
+
+    in_memory = run_shinkansen(fake_estat, **options)
+    sharded = run_shinkansen(fake_estat, workers=2, chunk_size=150, **options)
+    pd.testing.assert_frame_equal(sort_with_catchment(streamed), sort_with_catchment(in_memory))
+    pd.testing.assert_frame_equal(sort_with_catchment(sharded), sort_with_catchment(in_memory))